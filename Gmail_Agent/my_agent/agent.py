@@ -4,8 +4,12 @@ from my_agent.utils.nodes import check_for_new_emails, classify_email, generate_
 from my_agent.utils.nodes import send_email_response, flag_email, new_email_router
 from my_agent.utils.nodes import classification_router, agent, research, memory_injection
 from my_agent.utils.nodes import evaluate_response_quality, response_evaluation_router
-from my_agent.utils.nodes import email_polling_router
+from my_agent.utils.nodes import email_polling_router, reuse_approved_draft, draft_reuse_router
 from my_agent.utils.state import AgentState
+from my_agent.utils.checkpoints import get_checkpointer, run_graph
+from my_agent.utils.deadline import start_deadline
+from my_agent.utils.metrics import start_metrics_server
+import os
 import json
 
 workflow = StateGraph(AgentState)
@@ -16,6 +20,7 @@ workflow.add_node('classify_email', classify_email)
 workflow.add_node('memory_injection', memory_injection)
 workflow.add_node('generate_response', generate_response)
 workflow.add_node('evaluate', evaluate_response_quality)
+workflow.add_node('reuse_draft', reuse_approved_draft)
 workflow.add_node('research', research)
 workflow.add_node('send_response', send_email_response)
 workflow.add_node('flag_email', flag_email)
@@ -27,12 +32,18 @@ workflow.add_conditional_edges('check_emails', email_polling_router, {
 })
 
 workflow.add_conditional_edges('classify_email', classification_router, {
-    'research': 'research',
+    'research': 'reuse_draft',
     'flag_email': 'flag_email'
 })
 
+workflow.add_conditional_edges('reuse_draft', draft_reuse_router, {
+    'research': 'research',
+    'send_response': 'send_response'
+})
+
 workflow.add_conditional_edges('generate_response', response_evaluation_router, {
     'evaluate': 'evaluate',
+    'research': 'research',
     'send_response': 'send_response'
 })
 
@@ -49,5 +60,76 @@ workflow.add_edge('send_response', 'flag_email')
 workflow.add_edge('flag_email', 'check_emails') 
 workflow.set_entry_point('agent')
 
+# Served by langgraph.json; the LangGraph server supplies its own persistence.
 graph = workflow.compile()
 
+# The same polling graph with a SQLite checkpointer, for running the poller standalone.
+poller_graph = workflow.compile(checkpointer=get_checkpointer())
+
+# Draft-only graph used by the API: classify, reuse/research, generate and evaluate,
+# then label the email instead of sending it. Non-insurance emails end after classify.
+draft_workflow = StateGraph(AgentState)
+
+draft_workflow.add_node('classify_email', classify_email)
+draft_workflow.add_node('reuse_draft', reuse_approved_draft)
+draft_workflow.add_node('research', research)
+draft_workflow.add_node('memory_injection', memory_injection)
+draft_workflow.add_node('generate_response', generate_response)
+draft_workflow.add_node('evaluate', evaluate_response_quality)
+draft_workflow.add_node('flag_email', flag_email)
+
+draft_workflow.add_conditional_edges('classify_email', classification_router, {
+    'research': 'reuse_draft',
+    'flag_email': END
+})
+
+draft_workflow.add_conditional_edges('reuse_draft', draft_reuse_router, {
+    'research': 'research',
+    'send_response': END
+})
+
+draft_workflow.add_conditional_edges('generate_response', response_evaluation_router, {
+    'evaluate': 'evaluate',
+    'research': 'research',
+    'send_response': 'flag_email'
+})
+
+draft_workflow.add_conditional_edges('evaluate', response_evaluation_router, {
+    'evaluate': 'evaluate',
+    'research': 'research',
+    'send_response': 'flag_email'
+})
+
+draft_workflow.add_edge('research', 'memory_injection')
+draft_workflow.add_edge('memory_injection', 'generate_response')
+draft_workflow.add_edge('flag_email', END)
+draft_workflow.set_entry_point('classify_email')
+
+draft_graph = draft_workflow.compile(checkpointer=get_checkpointer())
+
+
+def run_poller(thread_id: str = None):
+    """Run one polling session on the checkpointed graph, resuming an interrupted one."""
+    thread_id = thread_id or os.getenv("POLLER_THREAD_ID", "gmail-poller")
+    start_metrics_server()
+    try:
+        return run_graph(
+            poller_graph,
+            thread_id,
+            {"initialized": False, "messages": []},
+            on_resume=lambda values: {"deadline": start_deadline({})["deadline"]},
+            recursion_limit=int(os.getenv("POLLER_RECURSION_LIMIT", "1000"))
+        )
+    finally:
+        # Queue workers are daemon threads: send approved replies and store memories
+        # before the process exits instead of leaving them for the next start.
+        from my_agent.utils.outbox import drain_outbox
+        from my_agent.utils.memory_jobs import memory_queue
+        drain_outbox()
+        if memory_queue.stats()["running"]:
+            memory_queue.drain(float(os.getenv("MEMORY_DRAIN_SECONDS", "60")))
+
+
+if __name__ == "__main__":
+    run_poller()
+
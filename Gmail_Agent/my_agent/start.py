@@ -1,21 +1,22 @@
-from fastapi import FastAPI, Query, HTTPException
+from fastapi import FastAPI, Query, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Dict, Any, Optional
+from fastapi.responses import StreamingResponse, JSONResponse, Response
+from typing import List, Dict, Any, Optional, Callable
 import json
 import os
 import sys
+import asyncio
 import datetime
+import time
 import uuid
 import traceback
 import logging
 from pydantic import BaseModel
-from qdrant_client import QdrantClient
-from qdrant_client.models import VectorParams, Distance
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import Qdrant
 from langchain_core.documents import Document
 from dotenv import load_dotenv
 from openai import OpenAI
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import asynccontextmanager
 
 logging.basicConfig(
     level=logging.INFO,
@@ -53,7 +54,15 @@ except ImportError:
     except ImportError:
         print("WARNING: Could not import AgentState. Will try again at runtime.")
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm-up runs in the background so /health answers immediately; /ready waits for it.
+    if os.getenv("WARMUP_ON_STARTUP", "true").strip().lower() in ("1", "true", "yes", "on"):
+        from my_agent.utils.warmup import start_warmup
+        start_warmup()
+    yield
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -64,40 +73,23 @@ app.add_middleware(
 )
 
 
-vectorstore = None
-api_db_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "qdrant_db")
-
 try:
-    logger.info(f"Initializing vector database at {api_db_path}")
-    openai_api_key = os.getenv("OPENAI_API_KEY")
-    if openai_api_key:
-        logger.info("OpenAI API key found, initializing embeddings")
-        embeddings = OpenAIEmbeddings(api_key=openai_api_key)
-        client = QdrantClient(path=api_db_path)
-        collections = client.get_collections()
-        collection_names = [c.name for c in collections.collections]
-        logger.info(f"Found collections: {collection_names}")
-        
-        if not "insurance_research" in collection_names:
-            logger.info("Creating 'insurance_research' collection")
-            client.recreate_collection(
-                collection_name="insurance_research",
-                vectors_config=VectorParams(size=1536, distance=Distance.COSINE)
-            )
-        vectorstore = Qdrant(
-            client=client,
-            collection_name="insurance_research",
-            embeddings=embeddings,
-        )
-        logger.info("Vector database initialized successfully")
+    from my_agent.utils.memory_service import get_vectorstore, get_qdrant_client, memory_service_status, connection_settings
+    from my_agent.utils.llm_cache import llm_cache_stats
+    logger.info(f"Memory store: {connection_settings()['mode']} mode, connecting on first use")
 except Exception as e:
-    logger.error(f"Failed to initialize vector database: {e}")
-    print(f"Failed to initialize vector database: {e}")
+    logger.error(f"Failed to import memory service: {e}")
+    print(f"Failed to import memory service: {e}")
+
+from my_agent.utils.single_flight import SingleFlight, email_request_key
+from my_agent.utils.retrieval_batcher import RetrievalBatcher, batched_retrieval
+from my_agent.utils.generation_jobs import register_pipeline, submit_generation, get_generation_job, get_generation_queue_status, QueueFullError
 
 class MemoryResponse(BaseModel):
     memories: List[Dict[str, Any]]
     count: int
     formatted_output: Optional[str] = None
+    next_cursor: Optional[str] = None
     status: str
 
 class CreateMemoryResponse(BaseModel):
@@ -105,24 +97,82 @@ class CreateMemoryResponse(BaseModel):
     message: str
     memory_ids: List[str]
 
+GENERATE_DEADLINE_SECONDS = float(os.getenv("GENERATE_DEADLINE_SECONDS", "60"))
+GRAPH_RESUME_ATTEMPTS = int(os.getenv("GRAPH_RESUME_ATTEMPTS", "1"))
+
 class EmailInput(BaseModel):
     email: dict
+    latency_budget_seconds: Optional[float] = None
+    deadline_seconds: Optional[float] = None
 
 class ResponseOutput(BaseModel):
     draft: str
+    skipped_for_deadline: List[str] = []
+
+
+def build_email_object(email: dict) -> dict:
+    """Shape an API email payload like a Gmail API message so the graph nodes can read it."""
+    email_obj = {
+        'id': email.get('id', 'api_email_id'),
+        'threadId': email.get('threadId', 'api_thread_id'),
+        'payload': {
+            'headers': [
+                {'name': 'Subject', 'value': email.get('subject', 'No Subject')},
+                {'name': 'From', 'value': email.get('sender', 'sender@example.com')}
+            ],
+            'body': {'data': ''},
+            'parts': [{'mimeType': 'text/plain', 'body': {'data': ''}}]
+        }
+    }
+    
+    if email.get('body'):
+        import base64
+        body_b64 = base64.b64encode(email.get('body', '').encode('utf-8')).decode('utf-8')
+        email_obj['payload']['parts'][0]['body']['data'] = body_b64
+    return email_obj
+
+FALLBACK_SYSTEM_PROMPT = "You are an AI assistant specializing in insurance matters."
+
+def fallback_draft(email: dict, latency_budget: Optional[float] = None) -> str:
+    """Single direct OpenAI call used when the node pipeline cannot run; cached and routed like the graph's LLM calls."""
+    from my_agent.utils.llm_cache import cached_chat_completion
+    from my_agent.utils.model_router import route_for_email
+    prompt = f"""Generate a professional response to this insurance-related email:
+Subject: {email.get('subject', 'No Subject')}
+From: {email.get('sender', 'Unknown')}
+Body: {email.get('body', '')}"""
+    route = route_for_email(prompt, "fallback", email_id=email.get('id'), default_model="gpt-4o", latency_budget=latency_budget)
+    return cached_chat_completion(
+        OpenAI(api_key=os.getenv("OPENAI_API_KEY")),
+        route["model"],
+        [
+            {"role": "system", "content": FALLBACK_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.7,
+        max_tokens=route["max_tokens"] or 1000
+    ).strip()
+
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "8"))
+PIPELINE_MAX_PENDING = int(os.getenv("PIPELINE_MAX_PENDING", str(PIPELINE_WORKERS * 4)))
+pipeline_executor = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix="pipeline")
+_pipeline_slots = asyncio.Semaphore(PIPELINE_MAX_PENDING)
+generation_flights = SingleFlight()
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
 
 @app.get("/status")
-async def status():
+def status():
     """
     Return the status of the system and database connections.
     """
     logger.info("Status endpoint called")
     return {
-        "vector_database": {
-            "available": vectorstore is not None,
-            "type": f"Qdrant (local at {api_db_path})" if vectorstore else "Not connected"
-        },
+        "vector_database": memory_service_status(),
+        "llm_cache": llm_cache_stats(),
+        "generate_single_flight": generation_flights.stats(),
         "openai_api": {
             "available": os.getenv("OPENAI_API_KEY") is not None,
         }
@@ -139,78 +189,90 @@ async def health():
         "message": "API is running"
     }
 
+@app.get("/ready")
+def ready():
+    """
+    Readiness probe: 503 until the pipeline modules, vector store, embeddings and LLM are warmed up.
+    """
+    from my_agent.utils.warmup import readiness
+    state = readiness()
+    return JSONResponse(status_code=200 if state["ready"] else 503, content=state)
+
+@app.get("/metrics")
+def metrics():
+    """
+    Prometheus text-format metrics: per-node and per-dependency latency, LLM tokens, cache and queue depth.
+    """
+    from my_agent.utils.metrics import render_metrics, CONTENT_TYPE
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE)
+
 @app.get("/memories", response_model=MemoryResponse)
-async def get_memories(
-    query: str = Query(None, description="Search query string"),
-    limit: int = Query(10, description="Maximum number of results"),
-    formatted: bool = Query(False, description="Return formatted memory context")
+def get_memories(
+    query: str = Query(None, description="Search query string; omit to page through all memories"),
+    limit: int = Query(10, description="Maximum number of results (page size when listing)"),
+    formatted: bool = Query(False, description="Return formatted memory context"),
+    sender: str = Query(None, description="Only return memories from this sender"),
+    claim_id: str = Query(None, description="Only return memories mentioning this claim identifier"),
+    source: str = Query(None, description="Only return memories from this source (e.g. web_search, email_exchange)"),
+    since: str = Query(None, description="Only return memories stored at or after this ISO-8601 time"),
+    until: str = Query(None, description="Only return memories stored before this ISO-8601 time"),
+    cursor: str = Query(None, description="Cursor from a previous page's next_cursor (listing only)")
 ):
     """
     Get memories from the vector database.
     
     Parameters:
-    - query: Search query string
+    - query: Search query string. Without it, memories are listed page by page
+      using Qdrant scroll; pass next_cursor back as cursor to get the next page.
     - limit: Maximum number of results to return
     - formatted: If true, return a formatted context string suitable for LLM prompts
+    - sender, claim_id, source, since, until: Optional metadata filters evaluated server-side by Qdrant
     """
-    logger.info(f"Memories endpoint called with query='{query}', limit={limit}, formatted={formatted}")
+    logger.info(f"Memories endpoint called with query='{query}', limit={limit}, formatted={formatted}, cursor={cursor}")
     try:
-        def search_memory(query: str, limit: int = 3) -> List[Dict]:
-            if not vectorstore:
-                logger.warning("Vector store not available for memory search")
-                return []
-            
+        from my_agent.utils.memory_schema import build_memory_filter
+        memory_filter = build_memory_filter(
+            sender=sender,
+            claim_ids=[claim_id.upper()] if claim_id else None,
+            source=source,
+            since=since,
+            until=until
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        from my_agent.utils.tools import search_memory, format_memories
+        if not get_vectorstore():
+            logger.warning("Vector store not available for memory search")
+
+        if not query:
+            from my_agent.utils.memory_export import list_memories
             try:
-                logger.info(f"Searching for '{query}' with limit {limit}")
-                results = vectorstore.similarity_search_with_score(query, k=limit)
-                logger.info(f"Found {len(results)} results")
-                
-                memory_results = []
-                for doc, score in results:
-                    memory_results.append({
-                        "content": doc.page_content,
-                        "metadata": doc.metadata,
-                        "relevance_score": float(score)
-                    })
-                
-                return memory_results
-            except Exception as e:
-                logger.error(f"Error searching memory: {e}")
-                print(f"Error searching memory: {e}")
-                return []
-                
-        def get_relevant_memories(query: str, limit: int = 5) -> str:
-            logger.info(f"Formatting relevant memories for '{query}'")
-            memories = search_memory(query, limit=limit)
-            
-            if not memories:
-                return ""
-            formatted_memories = "RELEVANT PAST INFORMATION:\n\n"
-            for i, memory in enumerate(memories, 1):
-                formatted_memories += f"{i}. {memory['content']}\n"
-                if memory.get('metadata', {}).get('timestamp'):
-                    try:
-                        timestamp = datetime.datetime.fromisoformat(memory['metadata']['timestamp'])
-                        formatted_time = timestamp.strftime("%Y-%m-%d")
-                        formatted_memories += f"   (Recorded on: {formatted_time})\n"
-                    except:
-                        pass
-                formatted_memories += "\n"
-            
-            return formatted_memories
-        
-        memories = search_memory(query or "insurance policy claim denial appeal", limit=limit)
+                page = list_memories(get_qdrant_client(), limit=limit, cursor=cursor, memory_filter=memory_filter)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            logger.info(f"Returning page of {len(page['memories'])} memories")
+            return {
+                "memories": page["memories"],
+                "count": len(page["memories"]),
+                "next_cursor": page["next_cursor"],
+                "status": "success"
+            }
+
+        memories = search_memory(query, limit=limit, memory_filter=memory_filter)
         logger.info(f"Returning {len(memories)} memories")
         response = {
             "memories": memories,
             "count": len(memories),
             "status": "success"
         }
-        if formatted and query:
+        if formatted:
             logger.info("Adding formatted output to response")
-            response["formatted_output"] = get_relevant_memories(query, limit=limit)
+            response["formatted_output"] = format_memories(memories)
         
         return response
+    except HTTPException:
+        raise
     except Exception as e:
         error_detail = f"Error retrieving memories: {str(e)}\n{traceback.format_exc()}"
         logger.error(error_detail)
@@ -222,210 +284,551 @@ async def get_memories(
             "status": f"error: {str(e)}"
         }
 
+@app.get("/memories/export")
+def export_memories(
+    sender: str = Query(None, description="Only export memories from this sender"),
+    claim_id: str = Query(None, description="Only export memories mentioning this claim identifier"),
+    source: str = Query(None, description="Only export memories from this source"),
+    since: str = Query(None, description="Only export memories stored at or after this ISO-8601 time"),
+    until: str = Query(None, description="Only export memories stored before this ISO-8601 time"),
+    cursor: str = Query(None, description="Resume an export from a resume_cursor or next_cursor"),
+    include_vectors: bool = Query(False, description="Include stored vectors (for migrating to another store)")
+):
+    """
+    Stream matching memories as NDJSON, one memory per line, followed by a summary line.
+    """
+    logger.info(f"Memory export called with source={source}, since={since}, until={until}, include_vectors={include_vectors}")
+    from my_agent.utils.memory_schema import build_memory_filter
+    from my_agent.utils.memory_export import export_memories_ndjson, decode_cursor
+    try:
+        memory_filter = build_memory_filter(
+            sender=sender,
+            claim_ids=[claim_id.upper()] if claim_id else None,
+            source=source,
+            since=since,
+            until=until
+        )
+        decode_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not get_vectorstore():
+        raise HTTPException(status_code=503, detail="Vector database not available")
+    return StreamingResponse(
+        export_memories_ndjson(get_qdrant_client(), memory_filter=memory_filter, cursor=cursor, with_vectors=include_vectors),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": "attachment; filename=memories.ndjson"}
+    )
+
+@app.get("/memory-jobs")
+def memory_jobs(limit: int = Query(20, description="Number of recent jobs to include")):
+    """
+    Return the status of the background memory extraction queue.
+    """
+    logger.info("Memory jobs endpoint called")
+    from my_agent.utils.memory_jobs import get_memory_queue_status
+    return get_memory_queue_status(limit=limit)
+
+@app.get("/memory-jobs/{job_id}")
+def memory_job(job_id: str):
+    """
+    Return a single memory extraction job, including attempts and last error.
+    """
+    from my_agent.utils.memory_jobs import get_memory_job
+    job = get_memory_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Memory job {job_id} not found")
+    return job
+
+@app.get("/outbox")
+def outbox(limit: int = Query(20, description="Number of recent replies to include")):
+    """
+    Return the status of the outgoing reply queue (pending, sent, failed) and recent replies.
+    """
+    from my_agent.utils.outbox import get_outbox_status
+    return get_outbox_status(limit=limit)
+
+@app.get("/memory-compaction")
+def memory_compaction_status():
+    """
+    Return the last compaction report and any in-progress (resumable) run.
+    """
+    from my_agent.utils.memory_compaction import load_compaction_state
+    state = load_compaction_state()
+    return {
+        "last_report": state.get("last_report"),
+        "current_run": state.get("current_run"),
+        "watermark": state.get("watermark")
+    }
+
+@app.post("/memory-compaction")
+def memory_compaction(
+    max_pages: int = Query(20, description="Maximum pages to process before checkpointing"),
+    dry_run: bool = Query(False, description="Report reclaimable points without deleting anything")
+):
+    """
+    Run or resume a bounded compaction pass: expire stale web searches and merge near-duplicate memories.
+    """
+    logger.info(f"Memory compaction endpoint called with max_pages={max_pages}, dry_run={dry_run}")
+    vectorstore = get_vectorstore()
+    if not vectorstore:
+        raise HTTPException(status_code=503, detail="Vector database not available")
+    from my_agent.utils.memory_compaction import run_compaction
+    return run_compaction(client=vectorstore.client, max_pages=max_pages, dry_run=dry_run)
+
+class ApprovedDraftInput(BaseModel):
+    email: dict
+    draft: str
+
+@app.post("/approved-drafts")
+def approved_drafts(approved: ApprovedDraftInput):
+    """
+    Register a reply a reviewer approved and sent, so similar future emails can reuse it.
+    """
+    from my_agent.utils.draft_reuse import store_approved_draft
+    email = approved.email
+    email_content = f"From: {email.get('sender', '')}\nSubject: {email.get('subject', '')}\n\n{email.get('body', '')}"
+    draft_id = store_approved_draft(
+        email_content,
+        approved.draft,
+        "review_ui",
+        email_id=email.get('id'),
+        sender=email.get('sender'),
+        thread_id=email.get('threadId')
+    )
+    if not draft_id:
+        raise HTTPException(status_code=503, detail="Could not store approved draft")
+    return {"id": draft_id}
+
+@app.get("/draft-reuse")
+def draft_reuse():
+    """
+    Hit rate and estimated latency savings of approved-draft reuse.
+    """
+    from my_agent.utils.draft_reuse import draft_reuse_stats
+    return draft_reuse_stats()
+
 @app.post("/generate-response", response_model=ResponseOutput)
 async def generate_response(email_input: EmailInput):
     """
     Generate a response to an insurance-related email using the complete Gmail Agent workflow.
+    
+    The run has a deadline (deadline_seconds, default GENERATE_DEADLINE_SECONDS); optional
+    steps that no longer fit are skipped and listed in skipped_for_deadline.
+    
+    The nodes are blocking (LangChain, OpenAI, Qdrant, Gmail), so the pipeline runs on a
+    pool of PIPELINE_WORKERS threads and the event loop stays free for other requests.
+    When PIPELINE_MAX_PENDING runs are already in flight the request is rejected with 503.
+    
+    Duplicate calls for the same email (id and content) while a run is in flight share
+    that run, and its result is reused for SINGLE_FLIGHT_RESULT_TTL_SECONDS afterwards.
     """
     logger.info("Generate response endpoint called")
+    return await generation_flights.run(email_request_key(email_input.email), lambda: _run_pipeline(email_input))
+
+async def _run_pipeline(email_input: EmailInput) -> Dict[str, Any]:
+    if _pipeline_slots.locked():
+        raise HTTPException(status_code=503, detail="Response pipeline is at capacity, retry shortly", headers={"Retry-After": "5"})
+    async with _pipeline_slots:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(pipeline_executor, run_generate_pipeline, email_input)
+
+NON_INSURANCE_DRAFT = "This email does not appear to be insurance-related. A standard response would be appropriate."
+
+def draft_graph_stages(node: str, update: Dict[str, Any]) -> List[tuple]:
+    """(stage, details) progress events for one completed draft graph node."""
+    cycle = update.get('research_cycles', 0)
+    stages = []
+    if node == 'classify_email':
+        classification = update.get('email_classification')
+        route = 'flag_email' if str(classification).lower() == 'no' else 'research'
+        stages.append(("classified", {"classification": classification, "route": route}))
+    elif node == 'reuse_draft' and update.get('reused_draft'):
+        stages.append(("draft_reused", update['reused_draft']))
+    elif node == 'research':
+        if cycle > 0:
+            stages.append(("revising", {"additional_queries": update.get('additional_queries', [])}))
+        stages.append(("research_done", {"results": len(update.get('research_results', []))}))
+    elif node == 'memory_injection':
+        stages.append(("memory_found", {"found": bool(update.get('memory_context'))}))
+    elif node == 'generate_response':
+        stages.append(("generated", {"cycle": cycle + 1} if cycle else {}))
+        if update.get('self_assessed'):
+            stages.append(("evaluated", {"needs_more_research": bool(update.get('needs_more_research'))}))
+    elif node == 'evaluate':
+        stages.append(("evaluated", {"needs_more_research": bool(update.get('needs_more_research'))}))
+    return stages
+
+def draft_graph_result(final_state: Dict[str, Any]) -> Dict[str, Any]:
+    """The /generate-response body for a finished draft graph run."""
+    from my_agent.utils.draft_reuse import record_full_generation
+    
+    if str(final_state.get('email_classification')).lower() == 'no':
+        logger.info("Email flagged as non-insurance related")
+        return {"draft": NON_INSURANCE_DRAFT}
+    
+    if final_state.get('reused_draft'):
+        logger.info(f"Adapted approved draft {final_state['reused_draft']['id']} instead of regenerating")
+        return {"draft": final_state['llm_output']}
+    
+    if final_state.get('generation_started_at'):
+        record_full_generation(time.time() - final_state['generation_started_at'])
+    debug = final_state.get('debug', {})
+    skipped = debug.get('deadline_skipped', [])
+    result = {"draft": final_state.get('llm_output', ''), "skipped_for_deadline": skipped}
+    if skipped:
+        logger.info(f"Skipped for deadline: {skipped}")
+    if debug.get('deadline_skipped_queries'):
+        result["skipped_queries"] = debug['deadline_skipped_queries']
+    return result
+
+def draft_initial_state(email_input: EmailInput) -> Dict[str, Any]:
+    from my_agent.utils.deadline import start_deadline
+    from my_agent.utils.state import AgentState
+    
+    state = AgentState(
+        new_email=build_email_object(email_input.email),
+        initialized=True,
+        messages=[],
+        email_classification=None,
+        latency_budget_seconds=email_input.latency_budget_seconds
+    )
+    start_deadline(state, email_input.deadline_seconds or GENERATE_DEADLINE_SECONDS)
+    return state
+
+def fresh_deadline(email_input: EmailInput) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    """on_resume hook: a resumed run gets a fresh deadline rather than the one that already expired."""
+    from my_agent.utils.deadline import start_deadline
+    budget = email_input.deadline_seconds or GENERATE_DEADLINE_SECONDS
+    return lambda values: {"deadline": start_deadline({}, budget)["deadline"]}
+
+def run_generate_pipeline(email_input: EmailInput, progress: Optional[Callable[..., None]] = None) -> Dict[str, Any]:
+    """Run the compiled draft graph (classify, research, generate, evaluate) for one email.
+    
+    Every email gets its own SQLite checkpoint thread keyed by its id and content. If a
+    node fails, the run resumes from the last completed node (up to
+    GRAPH_RESUME_ATTEMPTS times), and a run left unfinished by a crash or a dropped
+    request resumes the next time the same email is submitted. `progress(stage, **details)`
+    is called after each step with the same stage names the streaming endpoint emits.
+    """
+    report = progress or (lambda stage, **details: None)
     try:
         openai_api_key = os.getenv("OPENAI_API_KEY")
         if not openai_api_key:
             logger.error("OpenAI API key not configured")
             raise HTTPException(status_code=500, detail="OpenAI API key not configured")
         
-        logger.info("Importing processing nodes")
+        logger.info("Loading draft graph")
         try:
-            from my_agent.utils.nodes import classify_email as classify_email_node
-            from my_agent.utils.nodes import research as research_node
-            from my_agent.utils.nodes import memory_injection as memory_injection_node
-            from my_agent.utils.nodes import generate_response as generate_response_node
-            from my_agent.utils.nodes import evaluate_response_quality as evaluate_response_node
-            from my_agent.utils.nodes import flag_email as flag_email_node
-            from my_agent.utils.state import AgentState
-            from my_agent.utils.nodes import classification_router
-            logger.info("Successfully imported nodes from my_agent.utils")
-        except ImportError:
-            logger.warning("Import from my_agent.utils failed, trying direct imports")
-            try:
-                from utils.nodes import classify_email as classify_email_node
-                from utils.nodes import research as research_node
-                from utils.nodes import memory_injection as memory_injection_node
-                from utils.nodes import generate_response as generate_response_node
-                from utils.nodes import evaluate_response_quality as evaluate_response_node
-                from utils.nodes import flag_email as flag_email_node
-                from utils.state import AgentState
-                from utils.nodes import classification_router
-                logger.info("Successfully imported nodes from utils")
-            except ImportError as e2:
-                logger.error(f"Failed to import processing nodes: {e2}")
-                logger.info("Using fallback OpenAI direct response")
-                fallback_client = OpenAI(api_key=openai_api_key)
-                prompt = f"""
-                Generate a professional response to this insurance-related email:
-                Subject: {email_input.email.get('subject', 'No Subject')}
-                From: {email_input.email.get('sender', 'Unknown')}
-                Body: {email_input.email.get('body', '')}
-                """
-                response = fallback_client.chat.completions.create(
-                    model="gpt-4o",
-                    messages=[
-                        {"role": "system", "content": "You are an AI assistant specializing in insurance matters."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.7,
-                    max_tokens=1000
-                )
-                draft = response.choices[0].message.content.strip()
-                return {"draft": draft}
-        
-        logger.info("Preparing email object")
-        email_obj = {
-            'id': email_input.email.get('id', 'api_email_id'),
-            'threadId': email_input.email.get('threadId', 'api_thread_id'),
-            'payload': {
-                'headers': [
-                    {'name': 'Subject', 'value': email_input.email.get('subject', 'No Subject')},
-                    {'name': 'From', 'value': email_input.email.get('sender', 'sender@example.com')}
-                ],
-                'body': {'data': ''},
-                'parts': [{'mimeType': 'text/plain', 'body': {'data': ''}}]
-            }
-        }
-        
-        if email_input.email.get('body'):
-            import base64
-            body_b64 = base64.b64encode(email_input.email.get('body', '').encode('utf-8')).decode('utf-8')
-            email_obj['payload']['parts'][0]['body']['data'] = body_b64
+            from my_agent.agent import draft_graph
+            from my_agent.utils.checkpoints import run_graph
+        except ImportError as e:
+            logger.error(f"Failed to import draft graph: {e}")
+            logger.info("Using fallback OpenAI direct response")
+            draft = fallback_draft(email_input.email, email_input.latency_budget_seconds)
+            return {"draft": draft}
         
         logger.info("Initializing agent state")
-        state = AgentState(
-            new_email=email_obj,
-            initialized=True,
-            messages=[],
-            email_classification=None
-        )
-        
-        try:
-            logger.info("Running email classification")
-            state = classify_email_node(state)
-            route = classification_router(state)
-            logger.info(f"Email classified as: {state.get('email_classification', 'unknown')}, route: {route}")
-            
-            if route == 'flag_email':
-                logger.info("Email flagged as non-insurance related")
-                return {"draft": "This email does not appear to be insurance-related. A standard response would be appropriate."}
-        except Exception as e:
-            logger.error(f"Classification failed: {e}")
-            pass
-        
-        try:
-            logger.info("Running research node")
-            state = research_node(state)
-            logger.info(f"Research complete, found {len(state.get('research_results', []))} results")
-        except Exception as e:
-            logger.error(f"Research failed: {e}")
-            state['research_results'] = []
+        state = draft_initial_state(email_input)
         
-        try:
-            logger.info("Running memory injection")
-            state = memory_injection_node(state)
-            memory_length = len(state.get('memory_context', ''))
-            logger.info(f"Memory injection complete, context length: {memory_length}")
-        except Exception as e:
-            logger.error(f"Memory injection failed: {e}")
-            state['memory_context'] = ''
+        def on_update(node: str, update: Dict[str, Any]):
+            logger.info(f"Draft graph completed node '{node}'")
+            for stage, details in draft_graph_stages(node, update):
+                report(stage, **details)
         
-        try:
-            logger.info("Generating initial response")
-            state = generate_response_node(state)
-            initial_response = state.get('llm_output', '')
-            logger.info("Initial response generated")
-        except Exception as e:
-            logger.error(f"Response generation failed: {e}")
-            logger.info("Using fallback response generation")
-            client = OpenAI(api_key=openai_api_key)
-            prompt = f"""
-            Generate a professional response to this insurance-related email:
-            Subject: {email_input.email.get('subject', 'No Subject')}
-            From: {email_input.email.get('sender', 'Unknown')}
-            Body: {email_input.email.get('body', '')}
-            """
-            response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "You are an AI assistant specializing in insurance matters."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=1000
-            )
-            initial_response = response.choices[0].message.content.strip()
-            state['llm_output'] = initial_response
-        
-        try:
-            logger.info("Evaluating response quality")
-            state = evaluate_response_node(state)
-            needs_more_research = state.get('needs_more_research', False)
-            logger.info(f"Evaluation complete, needs more research: {needs_more_research}")
-        except Exception as e:
-            logger.error(f"Response evaluation failed: {e}")
-            needs_more_research = False
-        
-        final_response = initial_response
-        if needs_more_research:
-            logger.info("Additional research needed, running second research phase")
+        thread_id = f"draft:{email_request_key(email_input.email)}"
+        attempt = 0
+        while True:
             try:
-                state = research_node(state)
-                logger.info("Second research phase complete")
-                state = memory_injection_node(state)
-                logger.info("Second memory injection complete")
-                state = generate_response_node(state)
-                logger.info("Second response generation complete")
-                state = evaluate_response_node(state)
-                logger.info("Second evaluation complete")
-                final_response = state.get('llm_output', initial_response)
+                final_state = run_graph(draft_graph, thread_id, state, on_update=on_update, on_resume=fresh_deadline(email_input))
+                break
             except Exception as e:
-                logger.error(f"Second research phase failed: {e}")
-                final_response = initial_response
-        
-        try:
-            logger.info("Running final email flagging check")
-            state = flag_email_node(state)
-            logger.info(f"Email flagging complete: {state.get('flagged', False)}")
-        except Exception as e:
-            logger.error(f"Email flagging failed: {e}")
-            pass
+                attempt += 1
+                if attempt > GRAPH_RESUME_ATTEMPTS:
+                    raise
+                logger.warning(f"Draft graph failed ({e}), resuming from the last checkpoint (attempt {attempt})")
         
         logger.info("Returning final response")
-        return {"draft": final_response}
+        return draft_graph_result(final_state)
             
     except Exception as e:
         logger.error(f"Overall process failed with error: {e}")
         try:
             logger.info("Using final fallback response")
-            client = OpenAI(api_key=openai_api_key)
-            prompt = f"""
-            Generate a professional response to this insurance-related email:
-            Subject: {email_input.email.get('subject', 'No Subject')}
-            From: {email_input.email.get('sender', 'Unknown')}
-            Body: {email_input.email.get('body', '')}
-            """
-            response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "You are an AI assistant specializing in insurance matters."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=1000
-            )
-            fallback_response = response.choices[0].message.content.strip()
+            fallback_response = fallback_draft(email_input.email, email_input.latency_budget_seconds)
             return {"draft": fallback_response}
         except Exception as fallback_error:
             logger.error(f"Final fallback also failed: {fallback_error}")
             raise HTTPException(status_code=500, detail=f"Error generating response: {str(e)}")
 
+@app.post("/generate-response/stream")
+def generate_response_stream(email_input: EmailInput):
+    """
+    Stream draft generation as Server-Sent Events.
+    
+    Runs the same checkpointed draft graph, on the same thread, as /generate-response,
+    so a dropped stream or a failed node resumes from the last completed node.
+    
+    Events, in order:
+    - stage: {"stage": "classified" | "draft_reused" | "research_done" | "memory_found" | "generated" | "evaluated" | "revising", ...}
+    - token: {"text": ...} chunks of the draft as the LLM produces them (not sent when the
+      draft comes from the self-assessing structured call)
+    - reset: {} sent before a revised or resumed draft is streamed; discard earlier tokens
+    - draft: {"draft": ...} the final cleaned draft (same body /generate-response returns)
+    - error: {"detail": ...}
+    - done: {}
+    """
+    logger.info("Streaming generate response endpoint called")
+    if not os.getenv("OPENAI_API_KEY"):
+        raise HTTPException(status_code=500, detail="OpenAI API key not configured")
+    
+    from my_agent.agent import draft_graph
+    from my_agent.utils.checkpoints import stream_graph
+    from my_agent.utils.nodes import DraftStreamCleaner, DRAFT_TOKENS_TAG
+    
+    def events():
+        state = draft_initial_state(email_input)
+        thread_id = f"draft:{email_request_key(email_input.email)}"
+        attempt = 0
+        try:
+            while True:
+                cleaner = DraftStreamCleaner()
+                chunks = stream_graph(
+                    draft_graph, thread_id, state,
+                    on_resume=fresh_deadline(email_input),
+                    stream_mode=["updates", "messages"]
+                )
+                try:
+                    while True:
+                        mode, chunk = next(chunks)
+                        if mode == "messages":
+                            message, metadata = chunk
+                            if DRAFT_TOKENS_TAG in (metadata.get("tags") or []) and isinstance(message.content, str):
+                                text = cleaner.feed(message.content)
+                                if text:
+                                    yield sse_event("token", {"text": text})
+                            continue
+                        for node, update in chunk.items():
+                            if not isinstance(update, dict):
+                                continue
+                            if node == 'generate_response':
+                                text = cleaner.finish()
+                                if text:
+                                    yield sse_event("token", {"text": text})
+                                cleaner = DraftStreamCleaner()
+                            for stage, details in draft_graph_stages(node, update):
+                                yield sse_event("stage", {"stage": stage, **details})
+                                if stage == "revising":
+                                    yield sse_event("reset", {})
+                except StopIteration as finished:
+                    final_state = finished.value
+                    break
+                except Exception as e:
+                    attempt += 1
+                    if attempt > GRAPH_RESUME_ATTEMPTS:
+                        raise
+                    logger.warning(f"Draft graph failed ({e}), resuming from the last checkpoint (attempt {attempt})")
+                    if cleaner.raw:
+                        yield sse_event("reset", {})
+            
+            yield sse_event("draft", draft_graph_result(final_state))
+        except Exception as e:
+            logger.error(f"Streaming generation failed: {e}")
+            yield sse_event("error", {"detail": str(e)})
+        yield sse_event("done", {})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+BULK_DEFAULT_PARALLELISM = int(os.getenv("BULK_DEFAULT_PARALLELISM", "4"))
+BULK_MAX_PARALLELISM = int(os.getenv("BULK_MAX_PARALLELISM", "16"))
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", "1000"))
+
+def parse_bulk_items(raw: bytes, content_type: str):
+    """(items, parallelism) from a JSON body {"emails": [...], "parallelism": n} or NDJSON lines.
+    
+    Each item is EmailInput-shaped ({"email": {...}, ...}) or a bare email dict. Lines that
+    are not valid JSON are kept as ValueError items so they fail individually.
+    """
+    parallelism = None
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        items = []
+        for line in raw.decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                items.append(ValueError(f"Invalid JSON line: {e}"))
+    else:
+        try:
+            body = json.loads(raw or b"{}")
+        except json.JSONDecodeError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON body: {e}")
+        items = body if isinstance(body, list) else body.get("emails", [])
+        if isinstance(body, dict):
+            parallelism = body.get("parallelism")
+    return items, parallelism
+
+def _bulk_item(index: int, item, batcher: RetrievalBatcher) -> Dict[str, Any]:
+    started = time.perf_counter()
+    email_id = None
+    try:
+        if isinstance(item, Exception):
+            raise item
+        email_input = EmailInput(**item) if isinstance(item, dict) and "email" in item else EmailInput(email=item)
+        email_id = email_input.email.get("id")
+        with batched_retrieval(batcher):
+            result = run_generate_pipeline(email_input)
+        return {"index": index, "id": email_id, "status": "ok", **result, "seconds": round(time.perf_counter() - started, 2)}
+    except Exception as e:
+        logger.error(f"Bulk item {index} failed: {e}")
+        detail = e.detail if isinstance(e, HTTPException) else str(e)
+        return {"index": index, "id": email_id, "status": "error", "error": detail, "seconds": round(time.perf_counter() - started, 2)}
+
+@app.post("/generate-response/bulk")
+async def generate_response_bulk(
+    request: Request,
+    parallelism: Optional[int] = Query(None, description="Emails processed concurrently (capped at BULK_MAX_PARALLELISM)")
+):
+    """
+    Generate drafts for many emails; results stream back as NDJSON in completion order.
+    
+    Body: JSON {"emails": [...], "parallelism": n} (or a JSON list), or NDJSON with one
+    email per line (Content-Type: application/x-ndjson). Each email is an EmailInput
+    ({"email": {...}, "deadline_seconds": ...}) or a bare email dict.
+    
+    Output lines: {"index", "id", "status": "ok", "draft", ...} or {"index", "id",
+    "status": "error", "error"}; a failing email does not affect the others. The last
+    line is {"summary": {...}}. Memory searches of concurrently running emails are
+    merged into shared embedding/Qdrant batches.
+    """
+    if not os.getenv("OPENAI_API_KEY"):
+        raise HTTPException(status_code=500, detail="OpenAI API key not configured")
+    items, body_parallelism = parse_bulk_items(await request.body(), request.headers.get("content-type", ""))
+    if len(items) > BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_MAX_ITEMS} emails per bulk request")
+    workers = max(1, min(parallelism or body_parallelism or BULK_DEFAULT_PARALLELISM, BULK_MAX_PARALLELISM))
+    logger.info(f"Bulk generation of {len(items)} emails with parallelism {workers}")
+    
+    def results():
+        from my_agent.utils.tools import _search_memory_batch
+        batcher = RetrievalBatcher(_search_memory_batch)
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bulk")
+        started = time.perf_counter()
+        counts = {"ok": 0, "error": 0}
+        try:
+            futures = [executor.submit(_bulk_item, index, item, batcher) for index, item in enumerate(items)]
+            for future in as_completed(futures):
+                result = future.result()
+                counts[result["status"]] += 1
+                yield json.dumps(result) + "\n"
+            yield json.dumps({"summary": {
+                "total": len(items),
+                **counts,
+                "parallelism": workers,
+                "seconds": round(time.perf_counter() - started, 2),
+                "retrieval": batcher.stats()
+            }}) + "\n"
+        finally:
+            # Client went away or we finished: drop emails that have not started yet.
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+register_pipeline(lambda payload, progress=None: run_generate_pipeline(EmailInput(**payload), progress))
+
+JOB_EVENTS_POLL_SECONDS = float(os.getenv("JOB_EVENTS_POLL_SECONDS", "0.5"))
+JOB_EVENTS_KEEPALIVE_SECONDS = 15
+
+@app.post("/jobs", status_code=202)
+def submit_job(email_input: EmailInput):
+    """
+    Queue draft generation and return a job id immediately.
+    
+    Jobs run on a pool of GENERATION_WORKERS threads and are stored in the local SQLite
+    job store, so bursts queue up (503 beyond GENERATION_MAX_PENDING) and pending jobs
+    survive restarts. Poll GET /jobs/{id} or subscribe to GET /jobs/{id}/events.
+    """
+    if not os.getenv("OPENAI_API_KEY"):
+        raise HTTPException(status_code=500, detail="OpenAI API key not configured")
+    try:
+        job_id = submit_generation(email_input.model_dump())
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    return {
+        "job_id": job_id,
+        "status": "pending",
+        "status_url": f"/jobs/{job_id}",
+        "events_url": f"/jobs/{job_id}/events"
+    }
+
+@app.get("/jobs")
+def list_jobs(limit: int = Query(20, description="Number of recent jobs to include")):
+    """
+    Return generation queue counts and the most recent jobs.
+    """
+    return get_generation_queue_status(limit=limit)
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """
+    Return a generation job: status, current stage, stage history, and the draft or error.
+    """
+    job = get_generation_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+@app.get("/jobs/{job_id}/events")
+def job_events(job_id: str):
+    """
+    Follow a generation job as Server-Sent Events.
+    
+    Events: stage (one per progress entry, including ones recorded before subscribing;
+    a "retrying" stage marks the start of a retry attempt, whose stages follow),
+    then draft (the job result) or error, then done. Comment lines are sent as
+    keep-alives while a stage is running.
+    """
+    if not get_generation_job(job_id):
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    
+    def events():
+        sent = 0
+        attempts = None
+        last_write = time.time()
+        while True:
+            job = get_generation_job(job_id)
+            if attempts is not None and job["attempts"] != attempts:
+                # Each attempt starts with empty progress; follow the new attempt from its first stage.
+                sent = 0
+                if job["attempts"] > 1:
+                    yield sse_event("stage", {"stage": "retrying", "attempt": job["attempts"]})
+            attempts = job["attempts"]
+            for event in job["progress"][sent:]:
+                yield sse_event("stage", event)
+                last_write = time.time()
+            sent = len(job["progress"])
+            if job["status"] == "done":
+                yield sse_event("draft", job["result"] or {})
+                break
+            if job["status"] == "failed":
+                yield sse_event("error", {"detail": job["error"]})
+                break
+            if time.time() - last_write >= JOB_EVENTS_KEEPALIVE_SECONDS:
+                yield ": keep-alive\n\n"
+                last_write = time.time()
+            time.sleep(JOB_EVENTS_POLL_SECONDS)
+        yield sse_event("done", {})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.environ.get("PORT", 10000))
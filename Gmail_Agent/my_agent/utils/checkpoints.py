@@ -0,0 +1,111 @@
+import os
+import sqlite3
+import threading
+from typing import Any, Callable, Dict, Generator, List, Optional, Union
+
+CHECKPOINT_DB = os.getenv(
+    "AGENT_CHECKPOINT_DB",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "agent_checkpoints.db")
+)
+# Completed runs are only useful for debugging; by default their checkpoints are dropped
+# so the database only holds runs that can still be resumed.
+KEEP_COMPLETED = os.getenv("CHECKPOINT_KEEP_COMPLETED", "false").strip().lower() in ("1", "true", "yes", "on")
+
+_lock = threading.Lock()
+_checkpointer = None
+# Striped locks: runs on the same thread id never interleave, and the pool stays bounded.
+_thread_locks = [threading.Lock() for _ in range(64)]
+
+
+def get_checkpointer():
+    """Process-wide SQLite checkpointer for compiled graphs, created on first use."""
+    global _checkpointer
+    if _checkpointer is None:
+        with _lock:
+            if _checkpointer is None:
+                from langgraph.checkpoint.sqlite import SqliteSaver
+                db_dir = os.path.dirname(CHECKPOINT_DB)
+                if db_dir:
+                    os.makedirs(db_dir, exist_ok=True)
+                # SqliteSaver serializes access to the connection with its own lock.
+                conn = sqlite3.connect(CHECKPOINT_DB, check_same_thread=False, timeout=30)
+                conn.execute("PRAGMA journal_mode=WAL")
+                _checkpointer = SqliteSaver(conn)
+                _checkpointer.setup()
+                print(f"[Checkpoints] Using SQLite checkpointer at {CHECKPOINT_DB}")
+    return _checkpointer
+
+
+def _thread_lock(thread_id: str) -> threading.Lock:
+    return _thread_locks[hash(thread_id) % len(_thread_locks)]
+
+
+def stream_graph(
+    graph,
+    thread_id: str,
+    initial_state: Dict[str, Any],
+    on_resume: Optional[Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]] = None,
+    recursion_limit: Optional[int] = None,
+    stream_mode: Union[str, List[str]] = "updates",
+) -> Generator[Any, None, Dict[str, Any]]:
+    """Run a checkpointed graph on `thread_id`, yielding its `graph.stream` chunks.
+
+    If the thread's last run stopped partway (a node raised, the process died, or a
+    streaming client went away), it resumes from the last completed node instead of
+    starting over; `on_resume(values)` may return state updates to apply first (e.g. a
+    fresh deadline). Otherwise the thread is cleared and the graph starts from
+    `initial_state`. The final state is the generator's return value. Runs on the same
+    thread id are serialized in-process.
+    """
+    from my_agent.utils.metrics import graph_runs
+
+    config = {"configurable": {"thread_id": thread_id}}
+    if recursion_limit:
+        config["recursion_limit"] = recursion_limit
+    checkpointer = graph.checkpointer
+    with _thread_lock(thread_id):
+        snapshot = graph.get_state(config)
+        if snapshot.next:
+            mode = "resumed"
+            print(f"[Checkpoints] Resuming thread {thread_id} at {', '.join(snapshot.next)}")
+            updates = on_resume(snapshot.values) if on_resume else None
+            if updates:
+                graph.update_state(config, updates)
+            graph_input = None
+        else:
+            mode = "fresh"
+            checkpointer.delete_thread(thread_id)
+            graph_input = initial_state
+        try:
+            yield from graph.stream(graph_input, config, stream_mode=stream_mode)
+        except Exception:
+            graph_runs.inc(mode=mode, outcome="error")
+            raise
+        graph_runs.inc(mode=mode, outcome="ok")
+        values = graph.get_state(config).values
+        if not KEEP_COMPLETED:
+            checkpointer.delete_thread(thread_id)
+        return values
+
+
+def run_graph(
+    graph,
+    thread_id: str,
+    initial_state: Dict[str, Any],
+    on_update: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    on_resume: Optional[Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]] = None,
+    recursion_limit: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Run a checkpointed graph to completion on `thread_id` and return its final state.
+
+    Resumes an unfinished run the same way stream_graph does. `on_update(node, state)`
+    is called after every node.
+    """
+    chunks = stream_graph(graph, thread_id, initial_state, on_resume=on_resume, recursion_limit=recursion_limit)
+    try:
+        while True:
+            for node, update in next(chunks).items():
+                if on_update and isinstance(update, dict):
+                    on_update(node, update)
+    except StopIteration as finished:
+        return finished.value
@@ -0,0 +1,51 @@
+import os
+import json
+import time
+from typing import Optional
+
+# Deadline for a whole graph run. The poller uses AGENT_DEADLINE_SECONDS (0 = none);
+# the API sets one per request from its SLA.
+AGENT_DEADLINE_SECONDS = float(os.getenv("AGENT_DEADLINE_SECONDS", "0") or 0)
+
+# Rough p90 wall time of each step, used to decide whether optional work still fits.
+STEP_SECONDS = {
+    "web_search": 10.0,
+    "research": 12.0,
+    "generate": 10.0,
+    "evaluate": 3.0,
+}
+if os.getenv("DEADLINE_STEP_SECONDS_JSON"):
+    STEP_SECONDS.update(json.loads(os.getenv("DEADLINE_STEP_SECONDS_JSON")))
+
+
+def start_deadline(state, budget_seconds: Optional[float] = None):
+    """Stamp an absolute deadline on the state; a falsy budget means the run is unbounded."""
+    budget_seconds = AGENT_DEADLINE_SECONDS if budget_seconds is None else budget_seconds
+    state['deadline'] = time.time() + budget_seconds if budget_seconds and budget_seconds > 0 else None
+    debug = state.setdefault('debug', {})
+    debug['deadline_skipped'] = []
+    debug['deadline_skipped_queries'] = []
+    return state
+
+
+def remaining_seconds(state) -> Optional[float]:
+    deadline = state.get('deadline')
+    if not deadline:
+        return None
+    return deadline - time.time()
+
+
+def has_time_for(state, *steps: str) -> bool:
+    """True if the estimated time for `steps` fits in what is left of the run's deadline."""
+    remaining = remaining_seconds(state)
+    if remaining is None:
+        return True
+    return remaining >= sum(STEP_SECONDS.get(step, 0.0) for step in steps)
+
+
+def skip_for_deadline(state, step: str):
+    remaining = remaining_seconds(state)
+    print(f"[Deadline] Skipping {step}, {max(remaining or 0.0, 0.0):.1f}s left")
+    skipped = state.setdefault('debug', {}).setdefault('deadline_skipped', [])
+    if step not in skipped:
+        skipped.append(step)
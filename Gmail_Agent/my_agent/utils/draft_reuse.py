@@ -0,0 +1,220 @@
+import os
+import re
+import uuid
+import datetime
+import threading
+from typing import Any, Dict, Optional
+
+from qdrant_client.http import models as rest
+
+from my_agent.utils.memory_service import get_vectorstore
+from my_agent.utils.embeddings import get_embedding_dimension, embedding_identity
+from my_agent.utils.memory_schema import check_collection_dimension, check_collection_embedding, record_embedding_identity
+from my_agent.utils.metrics import track, draft_reuse_lookups, draft_seconds
+
+DRAFT_COLLECTION = os.getenv("DRAFT_REUSE_COLLECTION", "approved_drafts")
+DRAFT_REUSE_ENABLED = os.getenv("DRAFT_REUSE", "true").strip().lower() in ("1", "true", "yes", "on")
+DRAFT_REUSE_THRESHOLD = float(os.getenv("DRAFT_REUSE_THRESHOLD", "0.95"))
+DRAFT_REUSE_MODEL = os.getenv("DRAFT_REUSE_MODEL", "gpt-4o-mini")
+
+# Checked in order; the first match is the email's type.
+EMAIL_TYPE_PATTERNS = [
+    ("prior_authorization", re.compile(r"prior auth|pre-?authori[sz]ation|precertification", re.I)),
+    ("appeal_status", re.compile(r"appeal", re.I)),
+    ("claim_denial", re.compile(r"den(?:ied|ial)|reject", re.I)),
+    ("billing_dispute", re.compile(r"\bbill(?:ed|ing)?\b|balance|invoice|collections?|overcharg", re.I)),
+    ("eob_question", re.compile(r"explanation of benefits|\bEOB\b", re.I)),
+    ("coverage_question", re.compile(r"cover(?:ed|age)|deductible|copay|out-of-pocket|in-network", re.I)),
+]
+
+ADAPT_SYSTEM_PROMPT = """You adapt an approved reply written for a similar insurance email so it answers a new email.
+
+Rules:
+- Keep the structure, arguments, tone and cited regulations of the approved reply
+- Replace names, claim and policy numbers, dates, amounts, codes and insurer names with the ones in the new email
+- Remove statements that do not apply to the new email; do not invent facts that are not in either email
+- Do not include a 'Subject:' line and do not use asterisks
+
+Return only the adapted email text."""
+
+_collection_lock = threading.Lock()
+# None until checked; False if the collection holds vectors from another embedding model.
+_collection_ready: Optional[bool] = None
+
+
+def classify_email_type(email_content: str) -> str:
+    for email_type, pattern in EMAIL_TYPE_PATTERNS:
+        if pattern.search(email_content or ""):
+            return email_type
+    return "other"
+
+
+def create_draft_collection(client, dimension: int, collection_name: str = DRAFT_COLLECTION):
+    print(f"Creating '{collection_name}' collection")
+    client.create_collection(
+        collection_name=collection_name,
+        vectors_config=rest.VectorParams(size=dimension, distance=rest.Distance.COSINE)
+    )
+    client.create_payload_index(collection_name, field_name="email_type", field_schema=rest.PayloadSchemaType.KEYWORD)
+
+
+def _ensure_collection(client, embeddings) -> bool:
+    """Create the collection on first use; False if its vectors came from another embedding model."""
+    global _collection_ready
+    if _collection_ready is not None:
+        return _collection_ready
+    with _collection_lock:
+        if _collection_ready is None:
+            dimension = get_embedding_dimension(embeddings)
+            identity = embedding_identity(embeddings)
+            if not client.collection_exists(DRAFT_COLLECTION):
+                create_draft_collection(client, dimension)
+                record_embedding_identity(client, identity, DRAFT_COLLECTION)
+                _collection_ready = True
+            else:
+                # Both checks print a warning pointing at memory_migration when they fail.
+                _collection_ready = (check_collection_dimension(client, dimension, DRAFT_COLLECTION)
+                                     and check_collection_embedding(client, identity, DRAFT_COLLECTION))
+    return _collection_ready
+
+
+def invalidate_draft_collection():
+    """Re-check the collection on next use (after a migration recreated it)."""
+    global _collection_ready
+    _collection_ready = None
+
+
+def store_approved_draft(
+    email_content: str,
+    draft: str,
+    source: str,
+    email_id: Optional[str] = None,
+    sender: Optional[str] = None,
+    thread_id: Optional[str] = None,
+) -> Optional[str]:
+    """Index a sent/approved reply by the embedding and type of the email it answered."""
+    vectorstore = get_vectorstore()
+    if not vectorstore or not email_content or not draft:
+        return None
+    try:
+        client = vectorstore.client
+        if not _ensure_collection(client, vectorstore.embeddings):
+            return None
+        point_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"{source}:{email_id}")) if email_id else str(uuid.uuid4())
+        email_type = classify_email_type(email_content)
+        client.upsert(
+            collection_name=DRAFT_COLLECTION,
+            points=[rest.PointStruct(
+                id=point_id,
+                vector=vectorstore.embeddings.embed_query(email_content),
+                payload={
+                    "email_content": email_content,
+                    "email_type": email_type,
+                    "draft": draft,
+                    "source": source,
+                    "email_id": email_id,
+                    "sender": sender,
+                    "thread_id": thread_id,
+                    "timestamp": datetime.datetime.now().isoformat()
+                }
+            )]
+        )
+        print(f"[DraftReuse] Stored approved '{email_type}' draft {point_id} from {source}")
+        return point_id
+    except Exception as e:
+        print(f"[DraftReuse] Could not store approved draft: {e}")
+        return None
+
+
+def find_reusable_draft(email_content: str) -> Optional[Dict[str, Any]]:
+    """Closest approved draft of the same email type, if its similarity clears DRAFT_REUSE_THRESHOLD."""
+    vectorstore = get_vectorstore()
+    if not DRAFT_REUSE_ENABLED or not vectorstore:
+        return None
+    client = vectorstore.client
+    if not _ensure_collection(client, vectorstore.embeddings):
+        return None
+    email_type = classify_email_type(email_content)
+    with track("embeddings", "embed_query"):
+        vector = vectorstore.embeddings.embed_query(email_content)
+    with track("qdrant", "query_points"):
+        points = client.query_points(
+            collection_name=DRAFT_COLLECTION,
+            query=vector,
+            query_filter=rest.Filter(must=[rest.FieldCondition(key="email_type", match=rest.MatchValue(value=email_type))]),
+            score_threshold=DRAFT_REUSE_THRESHOLD,
+            limit=1,
+            with_payload=True
+        ).points
+    if not points:
+        return None
+    return {"id": str(points[0].id), "score": float(points[0].score), **(points[0].payload or {})}
+
+
+def adapt_draft(match: Dict[str, Any], email_content: str) -> str:
+    """One cheap edit call that rewrites the approved draft for the new email."""
+    from my_agent.utils.tools import openai_client
+    from my_agent.utils.llm_cache import cached_chat_completion
+    if not openai_client:
+        raise RuntimeError("OpenAI client not initialized")
+    return cached_chat_completion(
+        openai_client,
+        DRAFT_REUSE_MODEL,
+        [
+            {"role": "system", "content": ADAPT_SYSTEM_PROMPT},
+            {"role": "user", "content": f"NEW EMAIL:\n{email_content}\n\nSIMILAR PAST EMAIL:\n{match['email_content']}\n\nAPPROVED REPLY TO THE PAST EMAIL:\n{match['draft']}"}
+        ],
+        temperature=0
+    )
+
+
+def store_sent_draft(payload: Dict[str, Any]):
+    """Index an outbox reply once Gmail has confirmed it was sent.
+
+    `payload["approved_draft"]` carries the email it answered; replies adapted from a
+    stored draft are enqueued without one, so they are never indexed a second time.
+    """
+    approved = payload.get("approved_draft")
+    if not approved:
+        return None
+    return store_approved_draft(
+        approved["email_content"],
+        payload["message_text"],
+        payload.get("source") or "outbox",
+        email_id=approved.get("email_id"),
+        sender=approved.get("sender"),
+        thread_id=payload.get("thread_id")
+    )
+
+
+def record_lookup(hit: bool, seconds: float):
+    """Count a reuse lookup; for hits `seconds` is lookup plus adaptation time."""
+    draft_reuse_lookups.inc(outcome="hit" if hit else "miss")
+    if hit:
+        draft_seconds.observe(seconds, path="reuse")
+
+
+def record_full_generation(seconds: float):
+    """Time from the reuse miss to a finished draft through research/generation/evaluation."""
+    draft_seconds.observe(seconds, path="full")
+
+
+def draft_reuse_stats() -> Dict[str, Any]:
+    """Hit rate and savings from this process's agent_draft_reuse_* / agent_draft_seconds metrics."""
+    hits = int(draft_reuse_lookups.value(outcome="hit"))
+    lookups = hits + int(draft_reuse_lookups.value(outcome="miss"))
+    _, hit_seconds = draft_seconds.count_and_sum(path="reuse")
+    full_generations, full_seconds = draft_seconds.count_and_sum(path="full")
+    avg_hit = hit_seconds / hits if hits else None
+    avg_full = full_seconds / full_generations if full_generations else None
+    saved = (avg_full - avg_hit) * hits if avg_hit is not None and avg_full is not None else None
+    return {
+        "enabled": DRAFT_REUSE_ENABLED,
+        "threshold": DRAFT_REUSE_THRESHOLD,
+        "lookups": lookups,
+        "hits": hits,
+        "hit_rate": round(hits / lookups, 3) if lookups else None,
+        "avg_reuse_seconds": round(avg_hit, 2) if avg_hit is not None else None,
+        "avg_full_pipeline_seconds": round(avg_full, 2) if avg_full is not None else None,
+        "estimated_seconds_saved": round(saved, 1) if saved is not None else None
+    }
@@ -0,0 +1,120 @@
+import os
+import threading
+from typing import Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+EMBEDDING_BACKEND = os.getenv("MEMORY_EMBEDDING_BACKEND", "openai").strip().lower()
+LOCAL_EMBEDDING_MODEL = os.getenv("MEMORY_EMBEDDING_MODEL", "BAAI/bge-small-en-v1.5")
+OPENAI_EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-ada-002")
+EMBEDDING_BATCH_SIZE = int(os.getenv("MEMORY_EMBEDDING_BATCH_SIZE", "32"))
+
+OPENAI_EMBEDDING_DIMENSIONS = {
+    "text-embedding-ada-002": 1536,
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+}
+
+
+class LocalSentenceTransformerEmbeddings(Embeddings):
+    """CPU sentence-transformer embeddings (BGE by default), loaded once and encoded in batches.
+
+    Same model family the Voice agent ships in backend_app/core/embeddings.py; vectors are
+    L2-normalized so cosine distance in Qdrant behaves the same as with OpenAI embeddings.
+    Requires the optional `sentence-transformers` package.
+    """
+
+    def __init__(self, model_name: str = LOCAL_EMBEDDING_MODEL, batch_size: int = EMBEDDING_BATCH_SIZE, device: str = "cpu"):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.device = device
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    try:
+                        from sentence_transformers import SentenceTransformer
+                    except ImportError as e:
+                        raise ImportError(
+                            "MEMORY_EMBEDDING_BACKEND=local requires `pip install sentence-transformers`"
+                        ) from e
+                    print(f"Loading local embedding model '{self.model_name}' on {self.device}")
+                    self._model = SentenceTransformer(self.model_name, device=self.device)
+        return self._model
+
+    @property
+    def dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        vectors = self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+_embeddings_cache: Dict[str, Embeddings] = {}
+_cache_lock = threading.Lock()
+
+
+def get_embeddings(backend: Optional[str] = None) -> Embeddings:
+    """Shared embeddings instance for `backend` ('openai' or 'local'), created on first use."""
+    backend = (backend or EMBEDDING_BACKEND).strip().lower()
+    with _cache_lock:
+        if backend not in _embeddings_cache:
+            if backend == "local":
+                _embeddings_cache[backend] = LocalSentenceTransformerEmbeddings()
+            elif backend == "openai":
+                from langchain_openai import OpenAIEmbeddings
+                _embeddings_cache[backend] = OpenAIEmbeddings(
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                    model=OPENAI_EMBEDDING_MODEL
+                )
+            else:
+                raise ValueError(f"Unsupported MEMORY_EMBEDDING_BACKEND value: {backend}")
+        return _embeddings_cache[backend]
+
+
+def get_embedding_dimension(embeddings: Embeddings) -> int:
+    """Vector size to create the memory collection with for this embeddings backend."""
+    if isinstance(embeddings, LocalSentenceTransformerEmbeddings):
+        return embeddings.dimension
+    model = getattr(embeddings, "model", None)
+    if getattr(embeddings, "dimensions", None):
+        return embeddings.dimensions
+    if model in OPENAI_EMBEDDING_DIMENSIONS:
+        return OPENAI_EMBEDDING_DIMENSIONS[model]
+    return len(embeddings.embed_query("dimension probe"))
+
+
+def embedding_identity(embeddings: Embeddings) -> str:
+    """'<backend>:<model>' that produced these vectors.
+
+    Two models can share a dimension without sharing an embedding space (ada-002 and
+    text-embedding-3-small are both 1536), so collections record this, not just a size.
+    """
+    if isinstance(embeddings, LocalSentenceTransformerEmbeddings):
+        return f"local:{embeddings.model_name}"
+    model = getattr(embeddings, "model", None)
+    if model:
+        dimensions = getattr(embeddings, "dimensions", None)
+        return f"openai:{model}" + (f"@{dimensions}" if dimensions else "")
+    return type(embeddings).__name__
+
+
+def embeddings_available(backend: Optional[str] = None) -> bool:
+    backend = (backend or EMBEDDING_BACKEND).strip().lower()
+    return backend == "local" or bool(os.getenv("OPENAI_API_KEY"))
@@ -0,0 +1,72 @@
+import os
+from typing import Any, Callable, Dict, Optional
+
+from my_agent.utils.job_queue import DurableJobQueue
+
+GENERATION_MAX_PENDING = int(os.getenv("GENERATION_MAX_PENDING", "500"))
+
+# Set by the API at import time: runs the draft pipeline for one EmailInput-shaped
+# payload, calling progress(stage, **details) as it goes.
+_pipeline: Optional[Callable[..., Dict[str, Any]]] = None
+
+
+def register_pipeline(pipeline: Callable[..., Dict[str, Any]]):
+    global _pipeline
+    _pipeline = pipeline
+
+
+def _run_generation(payload: Dict[str, Any]) -> Dict[str, Any]:
+    if _pipeline is None:
+        raise RuntimeError("No draft pipeline registered")
+    generation_queue.report_progress("started")
+    return _pipeline(payload, progress=generation_queue.report_progress)
+
+
+generation_queue = DurableJobQueue(
+    name="generation",
+    handler=_run_generation,
+    max_workers=int(os.getenv("GENERATION_WORKERS", "4")),
+    max_attempts=int(os.getenv("GENERATION_MAX_ATTEMPTS", "2")),
+    backoff_seconds=float(os.getenv("GENERATION_RETRY_BACKOFF_SECONDS", "5")),
+    poll_interval=0.5,
+)
+
+
+class QueueFullError(Exception):
+    pass
+
+
+def submit_generation(payload: Dict[str, Any]) -> str:
+    generation_queue.start()
+    if generation_queue.stats()["counts"]["pending"] >= GENERATION_MAX_PENDING:
+        raise QueueFullError(f"{GENERATION_MAX_PENDING} generation jobs already pending")
+    job_id = generation_queue.enqueue(payload)
+    print(f"[Jobs] Queued draft generation job {job_id}")
+    return job_id
+
+
+def job_view(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Public shape of a generation job: status, stage progress, result or error."""
+    return {
+        "id": job["id"],
+        "status": job["status"],
+        "stage": job["progress"][-1]["stage"] if job["progress"] else None,
+        "progress": job["progress"],
+        "result": job["result"],
+        "error": job["last_error"].splitlines()[0] if job["last_error"] else None,
+        "attempts": job["attempts"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"]
+    }
+
+
+def get_generation_job(job_id: str) -> Optional[Dict[str, Any]]:
+    job = generation_queue.get(job_id)
+    return job_view(job) if job else None
+
+
+def get_generation_queue_status(limit: int = 20) -> Dict[str, Any]:
+    status = generation_queue.stats()
+    status["max_pending"] = GENERATION_MAX_PENDING
+    status["recent_jobs"] = [job_view(job) for job in generation_queue.recent(limit=limit)]
+    return status
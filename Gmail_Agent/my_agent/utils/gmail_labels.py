@@ -0,0 +1,209 @@
+import os
+import time
+import atexit
+import threading
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+LABEL_CACHE_TTL_SECONDS = float(os.getenv("LABEL_CACHE_TTL_SECONDS", "3600"))
+LABEL_BATCH_SIZE = int(os.getenv("LABEL_BATCH_SIZE", "50"))
+LABEL_FLUSH_SECONDS = float(os.getenv("LABEL_FLUSH_SECONDS", "10"))
+LABEL_MAX_RETRIES = int(os.getenv("LABEL_MAX_RETRIES", "3"))
+
+# messages.batchModify accepts at most 1000 ids per call.
+BATCH_MODIFY_MAX_IDS = 1000
+
+_label_lock = threading.Lock()
+_label_ids: Dict[str, str] = {}
+# Every id -> name seen, kept across invalidations so stale ids can be looked up again by name.
+_label_names: Dict[str, str] = {}
+_labels_loaded_at = 0.0
+
+
+def _load_labels(service):
+    global _labels_loaded_at
+    labels = service.users().labels().list(userId='me').execute().get('labels', [])
+    _label_ids.clear()
+    _label_ids.update({label['name']: label['id'] for label in labels})
+    _label_names.update({label['id']: label['name'] for label in labels})
+    _labels_loaded_at = time.time()
+
+
+def get_label_id(service, label_name: str, create: bool = True) -> Optional[str]:
+    """Label id by name from a process-wide cache; one labels.list per TTL, create on miss."""
+    with _label_lock:
+        refreshed = False
+        if not _labels_loaded_at or time.time() - _labels_loaded_at > LABEL_CACHE_TTL_SECONDS:
+            _load_labels(service)
+            refreshed = True
+        if label_name in _label_ids:
+            return _label_ids[label_name]
+        if not refreshed:
+            # The label may have been created elsewhere since the last listing.
+            _load_labels(service)
+        if label_name in _label_ids or not create:
+            return _label_ids.get(label_name)
+        label = service.users().labels().create(userId='me', body={
+            'name': label_name,
+            'labellistVisibility': 'labelShow',
+            'messagelistVisibility': 'show',
+            'type': 'user'
+        }).execute()
+        _label_ids[label_name] = label['id']
+        _label_names[label['id']] = label_name
+        print(f"[Labels] Created label '{label_name}' ({label['id']})")
+        return label['id']
+
+
+def invalidate_label_cache(label_name: Optional[str] = None):
+    """Forget one label (e.g. after it was deleted or renamed) or, by default, all of them."""
+    global _labels_loaded_at
+    with _label_lock:
+        if label_name is None:
+            _label_ids.clear()
+            _labels_loaded_at = 0.0
+        else:
+            _label_ids.pop(label_name, None)
+
+
+def resolve_label_ids(service, label_ids: Iterable[str], create: bool = False) -> Set[str]:
+    """Current ids for `label_ids`, looked up again by name after the cache was invalidated.
+
+    System labels (UNREAD, INBOX, ...) use their name as id. Labels whose name is unknown,
+    or that no longer exist and are not created, are dropped.
+    """
+    resolved = set()
+    for label_id in label_ids:
+        with _label_lock:
+            name = _label_names.get(label_id)
+        name = name or (label_id if label_id.isupper() else None)
+        new_id = get_label_id(service, name, create=create) if name else None
+        if new_id:
+            resolved.add(new_id)
+        else:
+            print(f"[Labels] Dropping unknown label {label_id}")
+    return resolved
+
+
+class LabelMutationBuffer:
+    """Collects per-message label changes and applies them with messages.batchModify.
+
+    Changes for the same message are merged (a later add cancels a pending remove of the
+    same label and vice versa), then messages with identical add/remove sets share one
+    batchModify call. The buffer flushes when it holds LABEL_BATCH_SIZE messages, when
+    its oldest change is LABEL_FLUSH_SECONDS old, and at interpreter exit. A failed
+    call is retried on later flushes, up to LABEL_MAX_RETRIES times per message.
+    """
+
+    def __init__(self, batch_size: int = LABEL_BATCH_SIZE, flush_seconds: float = LABEL_FLUSH_SECONDS):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._pending: Dict[str, Tuple[Set[str], Set[str]]] = {}
+        self._retries: Dict[str, int] = {}
+        self._service = None
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self.api_calls = 0
+        self.messages_flushed = 0
+        self.failed_calls = 0
+
+    def queue(self, service, message_id: str, add: Iterable[str] = (), remove: Iterable[str] = ()):
+        with self._lock:
+            self._service = service
+            adds, removes = self._pending.setdefault(message_id, (set(), set()))
+            for label_id in add:
+                removes.discard(label_id)
+                adds.add(label_id)
+            for label_id in remove:
+                adds.discard(label_id)
+                removes.add(label_id)
+            full = len(self._pending) >= self.batch_size
+            if not full:
+                self._schedule_flush()
+        if full:
+            self.flush()
+
+    def _schedule_flush(self):
+        if self._timer is None and self.flush_seconds > 0:
+            self._timer = threading.Timer(self.flush_seconds, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _requeue(self, message_ids, adds, removes):
+        """Put a failed batch back for the next flush; newer changes to the same message win."""
+        with self._lock:
+            for message_id in message_ids:
+                retries = self._retries.get(message_id, 0) + 1
+                if retries > LABEL_MAX_RETRIES:
+                    self._retries.pop(message_id, None)
+                    print(f"[Labels] Giving up on label changes for message {message_id} after {LABEL_MAX_RETRIES} retries")
+                    continue
+                self._retries[message_id] = retries
+                self._pending.setdefault(message_id, (set(adds), set(removes)))
+            self._schedule_flush()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self) -> int:
+        """Apply all pending changes; returns the number of messages updated."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            service = self._service
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not pending or service is None:
+            return 0
+
+        groups: Dict[Tuple[frozenset, frozenset], list] = {}
+        for message_id, (adds, removes) in pending.items():
+            if adds or removes:
+                groups.setdefault((frozenset(adds), frozenset(removes)), []).append(message_id)
+
+        flushed = 0
+        for (adds, removes), message_ids in groups.items():
+            for offset in range(0, len(message_ids), BATCH_MODIFY_MAX_IDS):
+                chunk = message_ids[offset:offset + BATCH_MODIFY_MAX_IDS]
+                try:
+                    service.users().messages().batchModify(userId='me', body={
+                        'ids': chunk,
+                        'addLabelIds': sorted(adds),
+                        'removeLabelIds': sorted(removes)
+                    }).execute()
+                    self.api_calls += 1
+                    flushed += len(chunk)
+                    with self._lock:
+                        for message_id in chunk:
+                            self._retries.pop(message_id, None)
+                except Exception as e:
+                    self.failed_calls += 1
+                    print(f"[Labels] batchModify for {len(chunk)} messages failed: {e}")
+                    retry_adds, retry_removes = adds, removes
+                    if 'label' in str(e).lower():
+                        # A cached id may point at a label deleted or recreated in Gmail:
+                        # look the labels up again by name and retry with the current ids,
+                        # so the rest of the change (e.g. removing UNREAD) is not lost.
+                        invalidate_label_cache()
+                        try:
+                            retry_adds = resolve_label_ids(service, adds, create=True)
+                            retry_removes = resolve_label_ids(service, removes)
+                        except Exception as resolve_error:
+                            print(f"[Labels] Could not re-resolve labels, retrying with the old ids: {resolve_error}")
+                    if retry_adds or retry_removes:
+                        self._requeue(chunk, retry_adds, retry_removes)
+        self.messages_flushed += flushed
+        print(f"[Labels] Applied label changes to {flushed} messages in {len(groups)} batch call(s)")
+        return flushed
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": self.pending(),
+            "api_calls": self.api_calls,
+            "messages_flushed": self.messages_flushed,
+            "failed_calls": self.failed_calls
+        }
+
+
+label_buffer = LabelMutationBuffer()
+atexit.register(label_buffer.flush)
@@ -0,0 +1,333 @@
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import threading
+import traceback
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+DEFAULT_DB_PATH = os.getenv(
+    "AGENT_QUEUE_DB",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "agent_jobs.db")
+)
+# How long a claimed job stays owned by its worker without a heartbeat. Running jobs
+# renew their lease every third of this, so only jobs of dead processes expire.
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    queue TEXT NOT NULL,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    result TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    last_error TEXT,
+    progress TEXT,
+    owner TEXT,
+    lease_until REAL,
+    available_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_queue_status ON jobs (queue, status, available_at);
+"""
+
+
+class DurableJobQueue:
+    """SQLite-backed job queue drained by a bounded pool of worker threads.
+
+    Several processes (the API and the poller) may share one database. A worker
+    claims a job atomically and holds a lease on it, renewed by a heartbeat while the
+    job runs; a 'running' job is only taken over once its lease has expired, i.e. its
+    process died. Failed jobs are retried with exponential backoff until max_attempts
+    is reached, then marked 'failed'.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        handler: Callable[[Dict[str, Any]], Any],
+        db_path: str = DEFAULT_DB_PATH,
+        max_workers: int = 2,
+        max_attempts: int = 3,
+        backoff_seconds: float = 2.0,
+        poll_interval: float = 1.0,
+        lease_seconds: float = JOB_LEASE_SECONDS,
+    ):
+        self.name = name
+        self.handler = handler
+        self.db_path = db_path
+        self.max_workers = max(1, max_workers)
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_seconds = backoff_seconds
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._workers: List[threading.Thread] = []
+        self._current = threading.local()
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextmanager
+    def _db(self):
+        conn = self._connect()
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self):
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        with self._lock, self._db() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, kind in (("progress", "TEXT"), ("owner", "TEXT"), ("lease_until", "REAL")):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+
+    def start(self):
+        with self._lock:
+            if self._workers:
+                return
+            with self._db() as conn:
+                expired = conn.execute(
+                    "SELECT COUNT(*) AS n FROM jobs WHERE queue = ? AND status = 'running' "
+                    "AND (lease_until IS NULL OR lease_until < ?)",
+                    (self.name, time.time())
+                ).fetchone()["n"]
+            if expired:
+                print(f"[JobQueue:{self.name}] {expired} interrupted jobs will be retried")
+            self._stop.clear()
+            for i in range(self.max_workers):
+                worker = threading.Thread(
+                    target=self._worker_loop,
+                    name=f"{self.name}-worker-{i}",
+                    daemon=True
+                )
+                worker.start()
+                self._workers.append(worker)
+        print(f"[JobQueue:{self.name}] Started {self.max_workers} workers")
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._wakeup.set()
+        for worker in self._workers:
+            worker.join(timeout=timeout)
+        self._workers = []
+
+    def drain(self, timeout: float = 30.0) -> bool:
+        """Wait until no job is pending or running in this process, up to `timeout` seconds.
+
+        Jobs still waiting out a retry backoff count as pending. Returns True if the
+        queue drained in time.
+        """
+        deadline = time.time() + timeout
+        self._wakeup.set()
+        while True:
+            with self._db() as conn:
+                remaining = conn.execute(
+                    "SELECT COUNT(*) AS n FROM jobs WHERE queue = ? AND "
+                    "(status = 'pending' OR (status = 'running' AND owner = ?))",
+                    (self.name, self.owner)
+                ).fetchone()["n"]
+            if remaining == 0:
+                return True
+            if time.time() >= deadline:
+                print(f"[JobQueue:{self.name}] {remaining} jobs still queued after {timeout:.0f}s")
+                return False
+            time.sleep(min(self.poll_interval, 0.5))
+
+    def enqueue(self, payload: Dict[str, Any], job_id: Optional[str] = None) -> str:
+        job_id = job_id or str(uuid.uuid4())
+        now = time.time()
+        with self._lock, self._db() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, queue, status, payload, max_attempts, available_at, created_at, updated_at) "
+                "VALUES (?, ?, 'pending', ?, ?, ?, ?, ?)",
+                (job_id, self.name, json.dumps(payload, default=str), self.max_attempts, now, now, now)
+            )
+        self._wakeup.set()
+        return job_id
+
+    def enqueue_unique(self, payload: Dict[str, Any], job_id: str) -> bool:
+        """Enqueue under a caller-chosen id (an idempotency key); returns False if it already exists.
+
+        A job with that id that previously failed permanently is reset and retried.
+        """
+        now = time.time()
+        with self._lock, self._db() as conn:
+            created = conn.execute(
+                "INSERT OR IGNORE INTO jobs (id, queue, status, payload, max_attempts, available_at, created_at, updated_at) "
+                "VALUES (?, ?, 'pending', ?, ?, ?, ?, ?)",
+                (job_id, self.name, json.dumps(payload, default=str), self.max_attempts, now, now, now)
+            ).rowcount == 1
+            if not created:
+                created = conn.execute(
+                    "UPDATE jobs SET status = 'pending', attempts = 0, last_error = NULL, progress = NULL, owner = NULL, "
+                    "lease_until = NULL, available_at = ?, updated_at = ? "
+                    "WHERE id = ? AND queue = ? AND status = 'failed'",
+                    (now, now, job_id, self.name)
+                ).rowcount == 1
+        if created:
+            self._wakeup.set()
+        return created
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._db() as conn:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE id = ? AND queue = ?", (job_id, self.name)
+            ).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._db() as conn:
+            rows = conn.execute(
+                "SELECT status, COUNT(*) AS n FROM jobs WHERE queue = ? GROUP BY status", (self.name,)
+            ).fetchall()
+        counts = {status: 0 for status in ("pending", "running", "done", "failed")}
+        counts.update({row["status"]: row["n"] for row in rows})
+        return {
+            "queue": self.name,
+            "workers": self.max_workers,
+            "running": bool(self._workers),
+            "counts": counts
+        }
+
+    def recent(self, limit: int = 20, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        query = "SELECT * FROM jobs WHERE queue = ?"
+        params: List[Any] = [self.name]
+        if status:
+            query += " AND status = ?"
+            params.append(status)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        with self._db() as conn:
+            rows = conn.execute(query, params).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    def report_progress(self, stage: str, **details):
+        """Append a progress event to the job the calling worker thread is running (no-op elsewhere)."""
+        job_id = getattr(self._current, "job_id", None)
+        if not job_id:
+            return
+        event = {"stage": stage, "at": time.time(), **details}
+        with self._lock, self._db() as conn:
+            row = conn.execute(
+                "SELECT progress FROM jobs WHERE id = ? AND owner = ?", (job_id, self.owner)
+            ).fetchone()
+            if not row:
+                return
+            progress = json.loads(row["progress"]) if row["progress"] else []
+            progress.append(event)
+            conn.execute(
+                "UPDATE jobs SET progress = ?, updated_at = ? WHERE id = ? AND owner = ?",
+                (json.dumps(progress, default=str), time.time(), job_id, self.owner)
+            )
+
+    def _claim_next(self) -> Optional[sqlite3.Row]:
+        """Atomically claim the next due job, or a running job whose owner's lease expired.
+
+        The conditional UPDATE only succeeds if the row is still claimable, so two
+        workers (in this or another process) can never both win the same job.
+        Progress from an earlier attempt is cleared.
+        """
+        claimable = (
+            "queue = ? AND ((status = 'pending' AND available_at <= ?) "
+            "OR (status = 'running' AND (lease_until IS NULL OR lease_until < ?)))"
+        )
+        with self._lock, self._db() as conn:
+            while True:
+                now = time.time()
+                row = conn.execute(
+                    f"SELECT * FROM jobs WHERE {claimable} ORDER BY available_at LIMIT 1",
+                    (self.name, now, now)
+                ).fetchone()
+                if not row:
+                    return None
+                claimed = conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, owner = ?, lease_until = ?, "
+                    f"progress = NULL, updated_at = ? WHERE id = ? AND {claimable}",
+                    (self.owner, now + self.lease_seconds, now, row["id"], self.name, now, now)
+                ).rowcount == 1
+                if claimed:
+                    if row["status"] == "running":
+                        print(f"[JobQueue:{self.name}] Took over job {row['id']} after its lease expired")
+                    return row
+
+    def _heartbeat(self, job_id: str, stop: threading.Event):
+        while not stop.wait(self.lease_seconds / 3):
+            try:
+                with self._db() as conn:
+                    conn.execute(
+                        "UPDATE jobs SET lease_until = ? WHERE id = ? AND owner = ? AND status = 'running'",
+                        (time.time() + self.lease_seconds, job_id, self.owner)
+                    )
+            except Exception as e:
+                print(f"[JobQueue:{self.name}] Could not renew lease on job {job_id}: {e}")
+
+    def _worker_loop(self):
+        while not self._stop.is_set():
+            row = self._claim_next()
+            if row is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            self._run_job(row)
+
+    def _run_job(self, row: sqlite3.Row):
+        job_id = row["id"]
+        attempt = row["attempts"] + 1
+        self._current.job_id = job_id
+        stop_heartbeat = threading.Event()
+        threading.Thread(target=self._heartbeat, args=(job_id, stop_heartbeat), daemon=True).start()
+        try:
+            result = self.handler(json.loads(row["payload"]))
+            with self._lock, self._db() as conn:
+                conn.execute(
+                    "UPDATE jobs SET status = 'done', result = ?, last_error = NULL, lease_until = NULL, updated_at = ? "
+                    "WHERE id = ? AND owner = ?",
+                    (json.dumps(result, default=str), time.time(), job_id, self.owner)
+                )
+            print(f"[JobQueue:{self.name}] Job {job_id} completed on attempt {attempt}")
+        except Exception as e:
+            error = f"{e}\n{traceback.format_exc()}"
+            if attempt >= row["max_attempts"]:
+                status, available_at = "failed", time.time()
+                print(f"[JobQueue:{self.name}] Job {job_id} failed permanently after {attempt} attempts: {e}")
+            else:
+                status = "pending"
+                available_at = time.time() + self.backoff_seconds * (2 ** (attempt - 1))
+                print(f"[JobQueue:{self.name}] Job {job_id} attempt {attempt} failed, retrying: {e}")
+            with self._lock, self._db() as conn:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, last_error = ?, available_at = ?, lease_until = NULL, updated_at = ? "
+                    "WHERE id = ? AND owner = ?",
+                    (status, error, available_at, time.time(), job_id, self.owner)
+                )
+        finally:
+            stop_heartbeat.set()
+            self._current.job_id = None
+
+    @staticmethod
+    def _row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["progress"] = json.loads(job["progress"]) if job.get("progress") else []
+        return job
@@ -0,0 +1,174 @@
+import os
+import re
+import json
+import time
+import hashlib
+import textwrap
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+
+from my_agent.utils.metrics import track, record_openai_usage
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE", "true").strip().lower() in ("1", "true", "yes", "on")
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", "3600"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1000"))
+
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+
+
+def normalize_text(text: str) -> str:
+    """Whitespace-insensitive form of a prompt: dedented, trailing spaces and extra blank lines removed.
+
+    Several prompts are indented triple-quoted f-strings, so the same prompt built from
+    different call sites (or after a reformat) would otherwise hash differently.
+    """
+    text = textwrap.dedent(str(text or "")).replace("\r\n", "\n")
+    text = "\n".join(line.rstrip() for line in text.split("\n"))
+    return _BLANK_LINES_RE.sub("\n\n", text).strip()
+
+
+def normalize_messages(messages: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    return [
+        {"role": message.get("role", ""), "content": normalize_text(message.get("content", ""))}
+        for message in messages
+    ]
+
+
+def cache_key(model: str, params: Dict[str, Any], messages: List[Dict[str, Any]]) -> str:
+    raw = json.dumps(
+        {"model": model, "params": params, "messages": normalize_messages(messages)},
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """Thread-safe in-process LRU cache with a per-entry TTL."""
+
+    def __init__(self, ttl_seconds: float = LLM_CACHE_TTL_SECONDS, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": LLM_CACHE_ENABLED,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+
+
+llm_cache = LLMResponseCache()
+
+
+def _messages_from_langchain_prompt(prompt: str) -> List[Dict[str, Any]]:
+    """LangChain passes chat prompts to the cache as serialized messages; recover role/content pairs."""
+    try:
+        serialized = json.loads(prompt)
+        return [
+            {"role": item["kwargs"].get("type", item["id"][-1]), "content": item["kwargs"].get("content", "")}
+            for item in serialized
+        ]
+    except Exception:
+        return [{"role": "prompt", "content": prompt}]
+
+
+class LangChainLLMCache(BaseCache):
+    """LangChain cache backed by `llm_cache`; `llm_string` carries the model name and call parameters."""
+
+    def __init__(self, cache: LLMResponseCache = llm_cache):
+        self.cache = cache
+
+    def _key(self, prompt: str, llm_string: str) -> str:
+        return cache_key("langchain", {"llm": llm_string}, _messages_from_langchain_prompt(prompt))
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        return self.cache.get(self._key(prompt, llm_string))
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        self.cache.set(self._key(prompt, llm_string), return_val)
+
+    def clear(self, **kwargs: Any) -> None:
+        self.cache.clear()
+
+
+def install_langchain_cache():
+    """Route every LangChain chat model call (ChatOpenAI from get_llm) through the shared cache."""
+    if LLM_CACHE_ENABLED:
+        from langchain_core.globals import get_llm_cache, set_llm_cache
+        if not isinstance(get_llm_cache(), LangChainLLMCache):
+            set_llm_cache(LangChainLLMCache())
+
+
+def cached_llm_call(model: str, params: Dict[str, Any], messages: List[Dict[str, Any]], call: Callable[[], str]) -> str:
+    """Return the cached text for this (model, params, messages) or run `call()` and cache its result."""
+    if not LLM_CACHE_ENABLED:
+        return call()
+    key = cache_key(model, params, messages)
+    cached = llm_cache.get(key)
+    if cached is not None:
+        print(f"[LLMCache] Hit for {model}")
+        return cached
+    result = call()
+    if result:
+        llm_cache.set(key, result)
+    return result
+
+
+def cached_chat_completion(client, model: str, messages: List[Dict[str, Any]], **params) -> str:
+    """`client.chat.completions.create(...)` returning the message text, served from cache on exact hits."""
+    def call():
+        with track("openai", "chat_completions"):
+            completion = client.chat.completions.create(model=model, messages=messages, **params)
+        record_openai_usage(model, completion)
+        return completion.choices[0].message.content
+    return cached_llm_call(model, params, messages, call)
+
+
+def llm_cache_stats() -> Dict[str, Any]:
+    return llm_cache.stats()
@@ -0,0 +1,475 @@
+import os
+import json
+import time
+import uuid
+import datetime
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from my_agent.utils.memory_schema import MEMORY_COLLECTION, METADATA_KEY
+
+COMPACTION_STATE_PATH = os.getenv(
+    "MEMORY_COMPACTION_STATE",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "memory_compaction_state.json")
+)
+DUPLICATE_THRESHOLD = float(os.getenv("MEMORY_DUPLICATE_THRESHOLD", "0.97"))
+WEB_SEARCH_TTL_DAYS = float(os.getenv("MEMORY_WEB_SEARCH_TTL_DAYS", "30"))
+PAGE_SIZE = int(os.getenv("MEMORY_COMPACTION_PAGE_SIZE", "256"))
+BLOCK_SIZE = int(os.getenv("MEMORY_COMPACTION_BLOCK_SIZE", "2048"))
+
+_compaction_lock = threading.Lock()
+
+
+@contextmanager
+def _run_lock(state_path: str):
+    """Hold the compaction lock for `state_path`, or yield False if a run already holds it.
+
+    The API and the poller each run the scheduler, so besides the in-process lock an
+    exclusive flock on `<state_path>.lock` keeps two processes from compacting at once.
+    The OS releases the flock if the holder dies.
+    """
+    if not _compaction_lock.acquire(blocking=False):
+        yield False
+        return
+    lock_file = None
+    try:
+        try:
+            import fcntl
+        except ImportError:  # No flock on this platform; the in-process lock still applies.
+            fcntl = None
+        if fcntl is not None:
+            lock_file = open(f"{state_path}.lock", "a")
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                yield False
+                return
+        yield True
+    finally:
+        if lock_file is not None:
+            lock_file.close()
+        _compaction_lock.release()
+
+
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime.datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _dense_vector(record) -> Optional[np.ndarray]:
+    vector = record.vector
+    if isinstance(vector, dict):
+        vector = vector.get("") if "" in vector else next(
+            (v for v in vector.values() if isinstance(v, list)), None
+        )
+    if vector is None:
+        return None
+    return np.asarray(vector, dtype=np.float32)
+
+
+def _scroll_key(point_id):
+    """Sort key matching Qdrant's scroll order: integer ids first, then UUIDs."""
+    if isinstance(point_id, int):
+        return "", point_id
+    return str(uuid.UUID(str(point_id))), 0
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def blocked_max_similarity(queries: np.ndarray, corpus: np.ndarray, block_size: int = BLOCK_SIZE, column_mask=None):
+    """Best cosine match in `corpus` for every row of `queries`, computed block by block.
+
+    Both inputs must already be L2-normalized. Only `block_size` corpus rows are
+    multiplied at a time, so peak memory stays at len(queries) * block_size floats
+    regardless of collection size. `column_mask`, if given, is called with the block's
+    (start, stop) corpus rows and returns a boolean array of the pairs allowed to match.
+    """
+    best_sim = np.full(len(queries), -np.inf, dtype=np.float32)
+    best_idx = np.full(len(queries), -1, dtype=np.int64)
+    for start in range(0, len(corpus), block_size):
+        block = corpus[start:start + block_size]
+        sims = queries @ block.T
+        if column_mask is not None:
+            sims = np.where(column_mask(start, start + len(block)), sims, -np.inf)
+        block_best = sims.argmax(axis=1)
+        block_sim = sims[np.arange(len(queries)), block_best]
+        improved = block_sim > best_sim
+        best_sim[improved] = block_sim[improved]
+        best_idx[improved] = block_best[improved] + start
+    return best_sim, best_idx
+
+
+class _KeptSet:
+    """Survivors seen so far in the current pass, stored as one growing normalized matrix."""
+
+    def __init__(self):
+        self.ids: List[Any] = []
+        self.index: Dict[Any, int] = {}
+        self.metadata: List[Dict[str, Any]] = []
+        self.timestamps: List[Optional[datetime.datetime]] = []
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._is_new = np.zeros(0, dtype=bool)
+        self._senders = np.zeros(0, dtype=np.int64)
+        self._sender_codes: Dict[Optional[str], int] = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def matrix(self) -> np.ndarray:
+        return self._vectors[:len(self.ids)]
+
+    @property
+    def is_new(self) -> np.ndarray:
+        return self._is_new[:len(self.ids)]
+
+    @property
+    def senders(self) -> np.ndarray:
+        return self._senders[:len(self.ids)]
+
+    def sender_code(self, metadata: Dict[str, Any]) -> int:
+        """Small integer per sender, so sender equality can be checked on whole blocks."""
+        return self._sender_codes.setdefault(metadata.get("sender"), len(self._sender_codes))
+
+    def add(self, point_id, vector, metadata, timestamp, is_new):
+        size = len(self.ids)
+        if self._vectors.shape[1] != len(vector):
+            self._vectors = np.zeros((PAGE_SIZE, len(vector)), dtype=np.float32)
+            self._is_new = np.zeros(PAGE_SIZE, dtype=bool)
+            self._senders = np.zeros(PAGE_SIZE, dtype=np.int64)
+        elif size == len(self._vectors):
+            self._vectors = np.concatenate([self._vectors, np.zeros_like(self._vectors)])
+            self._is_new = np.concatenate([self._is_new, np.zeros_like(self._is_new)])
+            self._senders = np.concatenate([self._senders, np.zeros_like(self._senders)])
+        self.ids.append(point_id)
+        self.index[point_id] = size
+        self.metadata.append(metadata)
+        self.timestamps.append(timestamp)
+        self._vectors[size] = vector
+        self._is_new[size] = is_new
+        self._senders[size] = self.sender_code(metadata)
+
+    def replace(self, index, point_id, vector, metadata, timestamp, is_new):
+        self.index.pop(self.ids[index], None)
+        self.index[point_id] = index
+        self.ids[index] = point_id
+        self.metadata[index] = metadata
+        self.timestamps[index] = timestamp
+        self._vectors[index] = vector
+        self._is_new[index] = self._is_new[index] or is_new
+        self._senders[index] = self.sender_code(metadata)
+
+    def find_match(self, vector, metadata, is_new, threshold) -> Optional[int]:
+        """Most similar survivor that may absorb this point, scanning every row above `threshold`."""
+        sims = self.matrix @ vector
+        above = np.flatnonzero(sims >= threshold)
+        for index in above[np.argsort(-sims[above])]:
+            if (is_new or self._is_new[index]) and _can_merge(metadata, self.metadata[index]):
+                return int(index)
+        return None
+
+
+def _can_merge(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+    """Only fold memories from the same sender whose claim numbers don't conflict.
+
+    Form replies to different members (or about different claims) embed almost
+    identically, so similarity alone is not enough to call them duplicates.
+    """
+    if a.get("sender") != b.get("sender"):
+        return False
+    claims_a, claims_b = set(a.get("claim_ids") or []), set(b.get("claim_ids") or [])
+    return claims_a <= claims_b or claims_b <= claims_a
+
+
+def _merge_metadata(survivor: Dict[str, Any], duplicate: Dict[str, Any], duplicate_id) -> Dict[str, Any]:
+    merged = dict(survivor)
+    merged["merged_ids"] = list(dict.fromkeys(
+        survivor.get("merged_ids", []) + duplicate.get("merged_ids", []) + [str(duplicate.get("id") or duplicate_id)]
+    ))
+    merged["duplicate_count"] = survivor.get("duplicate_count", 0) + duplicate.get("duplicate_count", 0) + 1
+    claim_ids = list(dict.fromkeys(survivor.get("claim_ids", []) + duplicate.get("claim_ids", [])))
+    if claim_ids:
+        merged["claim_ids"] = claim_ids
+    return merged
+
+
+def load_compaction_state(path: str = COMPACTION_STATE_PATH) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"[Compaction] Could not read compaction state, starting fresh: {e}")
+        return {}
+
+
+def _save_compaction_state(state: Dict[str, Any], path: str = COMPACTION_STATE_PATH):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2, default=str)
+    os.replace(tmp_path, path)
+
+
+def _rebuild_kept(client, collection_name, resume_offset, watermark) -> _KeptSet:
+    """Reload the survivors that precede `resume_offset` after an interrupted pass.
+
+    Compares by scroll order rather than looking for the cursor point itself, which
+    may have been deleted since the cursor was saved.
+    """
+    kept = _KeptSet()
+    stop_key = _scroll_key(resume_offset)
+    offset = None
+    while True:
+        records, next_offset = client.scroll(
+            collection_name=collection_name,
+            limit=PAGE_SIZE,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True
+        )
+        for record in records:
+            if _scroll_key(record.id) >= stop_key:
+                return kept
+            vector = _dense_vector(record)
+            if vector is None:
+                continue
+            metadata = (record.payload or {}).get(METADATA_KEY, {}) or {}
+            timestamp = _parse_timestamp(metadata.get("timestamp"))
+            is_new = watermark is None or timestamp is None or timestamp > watermark
+            kept.add(record.id, _normalize_rows(vector[None, :])[0], metadata, timestamp, is_new)
+        if next_offset is None:
+            return kept
+        offset = next_offset
+
+
+def run_compaction(
+    client=None,
+    collection_name: str = MEMORY_COLLECTION,
+    max_pages: Optional[int] = None,
+    threshold: float = DUPLICATE_THRESHOLD,
+    web_search_ttl_days: float = WEB_SEARCH_TTL_DAYS,
+    state_path: str = COMPACTION_STATE_PATH,
+    dry_run: bool = False,
+) -> Dict[str, Any]:
+    """Run (or resume) one compaction pass over the memory collection.
+
+    The collection is scrolled in pages. Each page first drops `web_search` memories
+    older than the TTL, then compares the remaining vectors against every survivor
+    seen so far with blocked NumPy cosine similarity. Near-duplicates from the same
+    sender whose claim numbers don't conflict are merged into the newer point (ids and
+    claim numbers are folded into its metadata) and the older one is deleted. Pairs
+    where both points predate the previous completed pass were already compared and
+    are skipped, so repeat passes only pay for new memories.
+
+    Progress is checkpointed after every page; `max_pages` bounds a single call and the
+    next call resumes from the saved cursor.
+    """
+    if client is None:
+        from my_agent.utils.memory_service import get_vectorstore
+        vectorstore = get_vectorstore()
+        if not vectorstore:
+            return {"status": "skipped", "reason": "vector store not initialized"}
+        client = vectorstore.client
+
+    with _run_lock(state_path) as acquired:
+        if not acquired:
+            return {"status": "skipped", "reason": "compaction already running"}
+        return _run_compaction(client, collection_name, max_pages, threshold, web_search_ttl_days, state_path, dry_run)
+
+
+def _run_compaction(client, collection_name, max_pages, threshold, web_search_ttl_days, state_path, dry_run) -> Dict[str, Any]:
+    state = load_compaction_state(state_path)
+    watermark = _parse_timestamp(state.get("watermark"))
+    ttl_cutoff = datetime.datetime.now() - datetime.timedelta(days=web_search_ttl_days)
+
+    run = state.get("current_run")
+    if run:
+        print(f"[Compaction] Resuming run {run['run_id']} from offset {run['next_offset']}")
+        kept = _rebuild_kept(client, collection_name, run["next_offset"], watermark)
+    else:
+        run = {
+            "run_id": str(uuid.uuid4()),
+            "started_at": datetime.datetime.now().isoformat(),
+            "next_offset": None,
+            "points_before": client.count(collection_name=collection_name, exact=True).count,
+            "stats": {"pages": 0, "scanned": 0, "expired": 0, "duplicates_removed": 0, "merged": 0}
+        }
+        kept = _KeptSet()
+        print(f"[Compaction] Starting run {run['run_id']} over {run['points_before']} points")
+
+    stats = run["stats"]
+    pages_this_call = 0
+    started = time.perf_counter()
+    complete = False
+
+    while max_pages is None or pages_this_call < max_pages:
+        records, next_offset = client.scroll(
+            collection_name=collection_name,
+            limit=PAGE_SIZE,
+            offset=run["next_offset"],
+            with_payload=True,
+            with_vectors=True
+        )
+
+        to_delete = []
+        to_update: Dict[Any, Dict[str, Any]] = {}
+        candidates = []
+        for record in records:
+            metadata = (record.payload or {}).get(METADATA_KEY, {}) or {}
+            timestamp = _parse_timestamp(metadata.get("timestamp"))
+            if metadata.get("source") == "web_search" and timestamp and timestamp < ttl_cutoff:
+                to_delete.append(record.id)
+                stats["expired"] += 1
+                continue
+            vector = _dense_vector(record)
+            if vector is not None:
+                is_new = watermark is None or timestamp is None or timestamp > watermark
+                candidates.append((record.id, vector, metadata, timestamp, is_new))
+        stats["scanned"] += len(records)
+
+        if candidates:
+            page = _normalize_rows(np.stack([c[1] for c in candidates]))
+            page_is_new = np.array([c[4] for c in candidates])
+            page_senders = np.array([kept.sender_code(c[2]) for c in candidates])
+            kept_sim = np.full(len(candidates), -np.inf, dtype=np.float32)
+            kept_idx = np.full(len(candidates), -1, dtype=np.int64)
+            if len(kept) and kept.matrix.shape[1] == page.shape[1]:
+                kept_is_new, kept_senders = kept.is_new, kept.senders
+                kept_sim, kept_idx = blocked_max_similarity(
+                    page, kept.matrix,
+                    column_mask=lambda lo, hi: (page_is_new[:, None] | kept_is_new[None, lo:hi])
+                    & (page_senders[:, None] == kept_senders[None, lo:hi])
+                )
+            page_sims = page @ page.T
+
+            page_kept_index: Dict[int, int] = {}
+            for i, (point_id, _, metadata, timestamp, is_new) in enumerate(candidates):
+                if point_id in kept.index:
+                    # Already a survivor (never compare a point with itself).
+                    continue
+                target = None
+                if kept_sim[i] >= threshold:
+                    target = int(kept_idx[i])
+                    if not _can_merge(metadata, kept.metadata[target]):
+                        # Best match is about other claims; look for a compatible one further down.
+                        target = kept.find_match(page[i], metadata, is_new, threshold)
+                if target is None:
+                    for j, kept_index in page_kept_index.items():
+                        if ((is_new or candidates[j][4]) and page_sims[i, j] >= threshold
+                                and _can_merge(metadata, kept.metadata[kept_index])):
+                            target = kept_index
+                            break
+
+                if target is None:
+                    kept.add(point_id, page[i], metadata, timestamp, is_new)
+                    page_kept_index[i] = len(kept) - 1
+                    continue
+
+                survivor_ts = kept.timestamps[target]
+                if timestamp and (survivor_ts is None or timestamp > survivor_ts):
+                    old_id, old_metadata = kept.ids[target], kept.metadata[target]
+                    merged = _merge_metadata(metadata, old_metadata, old_id)
+                    kept.replace(target, point_id, page[i], merged, timestamp, is_new)
+                    to_delete.append(old_id)
+                    to_update.pop(old_id, None)
+                    to_update[point_id] = merged
+                else:
+                    merged = _merge_metadata(kept.metadata[target], metadata, point_id)
+                    kept.metadata[target] = merged
+                    to_delete.append(point_id)
+                    to_update[kept.ids[target]] = merged
+                stats["duplicates_removed"] += 1
+
+        if not dry_run:
+            for point_id, merged in to_update.items():
+                client.set_payload(
+                    collection_name=collection_name,
+                    payload={METADATA_KEY: merged},
+                    points=[point_id]
+                )
+                stats["merged"] += 1
+            if to_delete:
+                client.delete(collection_name=collection_name, points_selector=to_delete)
+            if to_update or to_delete:
+                from my_agent.utils.memory_hot_tier import invalidate_hot_tier
+                invalidate_hot_tier()
+
+        stats["pages"] += 1
+        pages_this_call += 1
+        run["next_offset"] = next_offset
+        if not dry_run:
+            state["current_run"] = run
+            _save_compaction_state(state, state_path)
+
+        if next_offset is None:
+            complete = True
+            break
+
+    report = {
+        "status": "complete" if complete else "partial",
+        "run_id": run["run_id"],
+        "pages_this_call": pages_this_call,
+        "elapsed_seconds": round(time.perf_counter() - started, 3),
+        "dry_run": dry_run,
+        **stats,
+        "reclaimed_points": stats["expired"] + stats["duplicates_removed"],
+        "points_before": run["points_before"],
+    }
+
+    if complete:
+        report["points_after"] = client.count(collection_name=collection_name, exact=True).count
+        if not dry_run:
+            state.pop("current_run", None)
+            state["watermark"] = run["started_at"]
+            state["last_report"] = report
+            _save_compaction_state(state, state_path)
+
+    print(f"[Compaction] {report['status']}: scanned {stats['scanned']}, expired {stats['expired']}, "
+          f"removed {stats['duplicates_removed']} duplicates, reclaimed {report['reclaimed_points']} points")
+    return report
+
+
+def start_compaction_scheduler(interval_seconds: float, max_pages_per_tick: Optional[int] = None) -> threading.Thread:
+    """Run compaction in a daemon thread every `interval_seconds`, a bounded number of pages at a time."""
+    def loop():
+        while True:
+            time.sleep(interval_seconds)
+            try:
+                run_compaction(max_pages=max_pages_per_tick)
+            except Exception as e:
+                print(f"[Compaction] Scheduled compaction failed: {e}")
+
+    thread = threading.Thread(target=loop, name="memory-compaction", daemon=True)
+    thread.start()
+    print(f"[Compaction] Scheduled every {interval_seconds}s")
+    return thread
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compact the insurance_research memory collection")
+    parser.add_argument("--max-pages", type=int, default=None, help="Stop after this many pages (resume on next run)")
+    parser.add_argument("--threshold", type=float, default=DUPLICATE_THRESHOLD, help="Cosine similarity treated as duplicate")
+    parser.add_argument("--ttl-days", type=float, default=WEB_SEARCH_TTL_DAYS, help="Expire web_search memories older than this")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would be reclaimed without modifying the collection")
+    args = parser.parse_args()
+
+    print(json.dumps(run_compaction(
+        max_pages=args.max_pages,
+        threshold=args.threshold,
+        web_search_ttl_days=args.ttl_days,
+        dry_run=args.dry_run
+    ), indent=2))
@@ -0,0 +1,101 @@
+import os
+import json
+import base64
+from typing import Any, Dict, Iterator, Optional
+
+from my_agent.utils.memory_schema import MEMORY_COLLECTION
+
+EXPORT_PAGE_SIZE = int(os.getenv("MEMORY_EXPORT_PAGE_SIZE", "256"))
+MAX_PAGE_LIMIT = int(os.getenv("MEMORY_MAX_PAGE_LIMIT", "500"))
+
+
+def encode_cursor(offset) -> Optional[str]:
+    """Opaque cursor for a Qdrant scroll offset (an int or UUID point id); None at the end."""
+    if offset is None:
+        return None
+    return base64.urlsafe_b64encode(json.dumps({"offset": offset}).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]):
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))["offset"]
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}") from None
+
+
+def _vector_json(vector):
+    if vector is None or isinstance(vector, list):
+        return vector
+    if isinstance(vector, dict):
+        return {name: _vector_json(value) for name, value in vector.items()}
+    # Sparse vectors
+    return {"indices": list(vector.indices), "values": list(vector.values)}
+
+
+def _memory_from_record(record, with_vectors: bool = False) -> Dict[str, Any]:
+    payload = record.payload or {}
+    memory = {
+        "content": payload.get("page_content", ""),
+        "metadata": payload.get("metadata", {}) or {},
+        "point_id": str(record.id)
+    }
+    if with_vectors:
+        memory["vector"] = _vector_json(record.vector)
+    return memory
+
+
+def list_memories(client, limit: int = 50, cursor: Optional[str] = None, memory_filter=None, collection_name: str = MEMORY_COLLECTION) -> Dict[str, Any]:
+    """One page of memories in point-id order, plus the cursor for the next page.
+
+    Pages come from Qdrant `scroll`, so each request costs one round trip no matter
+    how deep into the collection the cursor points.
+    """
+    records, next_offset = client.scroll(
+        collection_name=collection_name,
+        scroll_filter=memory_filter,
+        limit=max(1, min(limit, MAX_PAGE_LIMIT)),
+        offset=decode_cursor(cursor),
+        with_payload=True,
+        with_vectors=False
+    )
+    return {
+        "memories": [_memory_from_record(record) for record in records],
+        "next_cursor": encode_cursor(next_offset)
+    }
+
+
+def export_memories_ndjson(client, memory_filter=None, cursor: Optional[str] = None, with_vectors: bool = False) -> Iterator[str]:
+    """NDJSON lines for a streaming export, one memory per line, ending with a summary line.
+
+    Only one scroll page (MEMORY_EXPORT_PAGE_SIZE points) is held at a time, so memory
+    use stays flat however large the collection is. If the export fails partway, the
+    summary carries the error and a cursor for the first page that was not exported,
+    so the export can be resumed from there.
+    """
+    count = 0
+    offset = decode_cursor(cursor)
+    try:
+        while True:
+            records, next_offset = client.scroll(
+                collection_name=MEMORY_COLLECTION,
+                scroll_filter=memory_filter,
+                limit=EXPORT_PAGE_SIZE,
+                offset=offset,
+                with_payload=True,
+                with_vectors=with_vectors
+            )
+            for record in records:
+                yield json.dumps(_memory_from_record(record, with_vectors=with_vectors), default=str) + "\n"
+            count += len(records)
+            offset = next_offset
+            if offset is None:
+                break
+    except Exception as e:
+        print(f"[Export] Memory export failed after {count} memories: {e}")
+        yield json.dumps({"summary": {"exported": count, "complete": False, "error": str(e), "resume_cursor": encode_cursor(offset)}}) + "\n"
+        return
+    print(f"[Export] Exported {count} memories")
+    yield json.dumps({"summary": {"exported": count, "complete": True}}) + "\n"
@@ -0,0 +1,422 @@
+import os
+import json
+import math
+import hashlib
+import time
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+from qdrant_client.http import models as rest
+
+from my_agent.utils.memory_schema import MEMORY_COLLECTION, METADATA_KEY, collection_vector_size
+from my_agent.utils.sparse_encoder import encode_document, encode_query
+
+HOT_TIER_ENABLED = os.getenv("MEMORY_HOT_TIER", "false").strip().lower() in ("1", "true", "yes", "on")
+HOT_TIER_MAX_POINTS = int(os.getenv("MEMORY_HOT_TIER_MAX_POINTS", "20000"))
+HOT_TIER_DTYPE = os.getenv("MEMORY_HOT_TIER_DTYPE", "float32").strip().lower()
+HOT_TIER_REFRESH_SECONDS = float(os.getenv("MEMORY_HOT_TIER_REFRESH_SECONDS", "60"))
+HOT_TIER_PATH = os.getenv(
+    "MEMORY_HOT_TIER_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "memory_hot_tier")
+)
+BLOCK_ROWS = 8192
+SCROLL_PAGE_SIZE = 512
+RRF_K = 60
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest finite scores, best first, via argpartition."""
+    valid = int(np.isfinite(scores).sum())
+    k = min(k, valid)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    idx = np.argpartition(-scores, k - 1)[:k]
+    return idx[np.argsort(-scores[idx], kind="stable")]
+
+
+def _fingerprint(entries: Iterable) -> str:
+    """Order-independent hash of (point id, metadata) pairs.
+
+    Catches what a point count misses: a delete plus an add, or a payload rewrite
+    (compaction folds merged ids into the survivor's metadata).
+    """
+    digest = hashlib.sha1()
+    for point_id, metadata in sorted((str(point_id), json.dumps(metadata, sort_keys=True, default=str)) for point_id, metadata in entries):
+        digest.update(f"{point_id}\0{metadata}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def collection_fingerprint(client, collection_name: str = MEMORY_COLLECTION) -> str:
+    """Fingerprint of the collection's ids and metadata, scrolled without vectors or text."""
+    entries = []
+    offset = None
+    while True:
+        records, offset = client.scroll(
+            collection_name=collection_name,
+            limit=SCROLL_PAGE_SIZE * 4,
+            offset=offset,
+            with_payload=[METADATA_KEY],
+            with_vectors=False
+        )
+        entries.extend((r.id, (r.payload or {}).get(METADATA_KEY) or {}) for r in records)
+        if offset is None:
+            return _fingerprint(entries)
+
+
+def _as_values(value) -> set:
+    if value is None:
+        return set()
+    if isinstance(value, (list, tuple, set)):
+        return set(value)
+    return {value}
+
+
+class HotMemoryTier:
+    """The whole memory collection held in-process as one contiguous, L2-normalized matrix.
+
+    Dense top-k is a single matmul plus `argpartition`; rows are scored in blocks so a
+    float16 matrix is upcast a block at a time. With hybrid search, BM25 scores come from
+    an in-memory inverted index (IDF computed the same way Qdrant's IDF modifier does) and
+    both rankings are fused with reciprocal-rank fusion, like the Qdrant prefetch path.
+    Filters built by `build_memory_filter` are evaluated against cached metadata masks.
+
+    Snapshots are written next to HOT_TIER_PATH (`.npy` + `.json`) and loaded with
+    `mmap_mode="r"`, so a restart does not have to scroll the collection again.
+    """
+
+    def __init__(self, dtype: str = HOT_TIER_DTYPE, hybrid: bool = False, path: Optional[str] = HOT_TIER_PATH):
+        self.dtype = np.dtype(dtype)
+        self.hybrid = hybrid
+        self.path = path
+        self.ids: List[str] = []
+        self.payloads: List[Dict[str, Any]] = []
+        self.matrix = np.zeros((0, 0), dtype=self.dtype)
+        self.size = 0
+        self._row_of: Dict[str, int] = {}
+        self._mask_cache: Dict[Any, np.ndarray] = {}
+        self._postings: Dict[int, List] = {}
+        self._posting_arrays: Optional[Dict[int, tuple]] = None
+        self._lock = threading.RLock()
+        self._fingerprint: Optional[str] = None
+        self.loaded_at = 0.0
+
+    def fingerprint(self) -> str:
+        """Same hash as collection_fingerprint, over the rows held in the tier."""
+        with self._lock:
+            if self._fingerprint is None:
+                self._fingerprint = _fingerprint(
+                    (point_id, payload.get(METADATA_KEY) or {})
+                    for point_id, payload in zip(self.ids[:self.size], self.payloads[:self.size])
+                )
+            return self._fingerprint
+
+    def _ensure_capacity(self, rows: int, dim: int):
+        capacity = self.matrix.shape[0] if self.matrix.ndim == 2 else 0
+        if isinstance(self.matrix, np.memmap) or capacity < rows or self.matrix.shape[1] != dim:
+            grown = np.empty((max(rows, capacity * 2, 64), dim), dtype=self.dtype)
+            if self.size:
+                grown[:self.size] = self.matrix[:self.size]
+            self.matrix = grown
+
+    def _index_sparse(self, row: int, text: str):
+        sparse = encode_document(text)
+        for index, value in zip(sparse.indices, sparse.values):
+            self._postings.setdefault(index, []).append((row, value))
+        self._posting_arrays = None
+
+    def _reindex_sparse(self):
+        self._postings = {}
+        for row, payload in enumerate(self.payloads[:self.size]):
+            self._index_sparse(row, payload.get("page_content", ""))
+
+    def add_many(self, ids: Iterable, vectors: np.ndarray, payloads: Iterable[Dict[str, Any]]):
+        """Append points (or replace rows for ids already present)."""
+        vectors = _normalize_rows(np.asarray(vectors, dtype=np.float32))
+        with self._lock:
+            replaced = False
+            for point_id, vector, payload in zip(ids, vectors, payloads):
+                point_id = str(point_id)
+                row = self._row_of.get(point_id)
+                if row is None:
+                    self._ensure_capacity(self.size + 1, len(vector))
+                    row = self.size
+                    self.size += 1
+                    self.ids.append(point_id)
+                    self.payloads.append(payload)
+                    self._row_of[point_id] = row
+                    if self.hybrid:
+                        self._index_sparse(row, payload.get("page_content", ""))
+                else:
+                    if isinstance(self.matrix, np.memmap):
+                        self._ensure_capacity(self.size, len(vector))
+                    self.payloads[row] = payload
+                    replaced = True
+                self.matrix[row] = vector
+            if replaced and self.hybrid:
+                self._reindex_sparse()
+            self._mask_cache = {}
+            self._fingerprint = None
+
+    def load_from_collection(self, client, collection_name: str = MEMORY_COLLECTION, expected_fingerprint: Optional[str] = None):
+        """Fill the tier from a snapshot if its fingerprint matches the collection's, else by scrolling Qdrant."""
+        if expected_fingerprint is not None and self._load_snapshot(expected_fingerprint, collection_vector_size(client, collection_name)):
+            print(f"[HotTier] Loaded {self.size} memories from snapshot {self.path}.npy (mmap)")
+        else:
+            started = time.perf_counter()
+            offset = None
+            while True:
+                records, offset = client.scroll(
+                    collection_name=collection_name,
+                    limit=SCROLL_PAGE_SIZE,
+                    offset=offset,
+                    with_payload=True,
+                    with_vectors=True
+                )
+                records = [r for r in records if r.vector is not None]
+                if records:
+                    self.add_many(
+                        [r.id for r in records],
+                        np.stack([np.asarray(r.vector.get("") if isinstance(r.vector, dict) else r.vector, dtype=np.float32) for r in records]),
+                        [r.payload or {} for r in records]
+                    )
+                if offset is None:
+                    break
+            print(f"[HotTier] Loaded {self.size} memories from Qdrant in {time.perf_counter() - started:.2f}s")
+            self.save_snapshot()
+        self.loaded_at = time.time()
+        return self
+
+    def save_snapshot(self):
+        if not self.path or not self.size:
+            return
+        try:
+            np.save(f"{self.path}.npy", np.ascontiguousarray(self.matrix[:self.size]))
+            with open(f"{self.path}.json", "w") as f:
+                json.dump({"ids": self.ids, "payloads": self.payloads, "dtype": self.dtype.name, "fingerprint": self.fingerprint()}, f)
+        except Exception as e:
+            print(f"[HotTier] Warning: could not write snapshot: {e}")
+
+    def _load_snapshot(self, expected_fingerprint: str, expected_dim: Optional[int]) -> bool:
+        if not self.path or not os.path.exists(f"{self.path}.npy") or not os.path.exists(f"{self.path}.json"):
+            return False
+        try:
+            with open(f"{self.path}.json") as f:
+                meta = json.load(f)
+            if meta.get("dtype") != self.dtype.name or meta.get("fingerprint") != expected_fingerprint:
+                return False
+            matrix = np.load(f"{self.path}.npy", mmap_mode="r")
+            if matrix.ndim != 2 or matrix.shape[0] != len(meta["ids"]) or (expected_dim and matrix.shape[1] != expected_dim):
+                return False
+        except Exception as e:
+            print(f"[HotTier] Ignoring unreadable snapshot: {e}")
+            return False
+        with self._lock:
+            self.matrix = matrix
+            self.size = matrix.shape[0]
+            self.ids = meta["ids"]
+            self.payloads = meta["payloads"]
+            self._row_of = {point_id: row for row, point_id in enumerate(self.ids)}
+            self._mask_cache = {}
+            self._fingerprint = expected_fingerprint
+            if self.hybrid:
+                self._reindex_sparse()
+        return True
+
+    def _field_mask(self, key: str, values: set) -> np.ndarray:
+        cache_key = (key, frozenset(values))
+        mask = self._mask_cache.get(cache_key)
+        if mask is None:
+            field = key[len(METADATA_KEY) + 1:]
+            mask = np.fromiter(
+                (bool(_as_values((payload.get(METADATA_KEY) or {}).get(field)) & values) for payload in self.payloads[:self.size]),
+                dtype=bool,
+                count=self.size
+            )
+            self._mask_cache[cache_key] = mask
+        return mask
+
+    def _filter_mask(self, memory_filter) -> Optional[np.ndarray]:
+        """Row mask for a `build_memory_filter` filter; raises ValueError for anything else."""
+        if memory_filter is None:
+            return None
+        if memory_filter.should or memory_filter.must_not or getattr(memory_filter, "min_should", None):
+            raise ValueError("only `must` filters are evaluated in the hot tier")
+        mask = np.ones(self.size, dtype=bool)
+        for condition in memory_filter.must or []:
+            if not isinstance(condition, rest.FieldCondition) or not condition.key.startswith(f"{METADATA_KEY}."):
+                raise ValueError(f"unsupported condition {condition!r}")
+            if isinstance(condition.match, rest.MatchValue):
+                values = {condition.match.value}
+            elif isinstance(condition.match, rest.MatchAny):
+                values = set(condition.match.any)
+            else:
+                raise ValueError(f"unsupported match {condition.match!r}")
+            mask &= self._field_mask(condition.key, values)
+        return mask
+
+    def _sparse_scores(self, text: str) -> np.ndarray:
+        if self._posting_arrays is None:
+            self._posting_arrays = {
+                index: (np.array([row for row, _ in postings], dtype=np.int64),
+                        np.array([value for _, value in postings], dtype=np.float32))
+                for index, postings in self._postings.items()
+            }
+        scores = np.zeros(self.size, dtype=np.float32)
+        for index in encode_query(text).indices:
+            posting = self._posting_arrays.get(index)
+            if posting is None:
+                continue
+            rows, weights = posting
+            idf = math.log(1 + (self.size - len(rows) + 0.5) / (len(rows) + 0.5))
+            np.add.at(scores, rows, idf * weights)
+        return scores
+
+    def _memory(self, row: int, score: float) -> Dict[str, Any]:
+        payload = self.payloads[row]
+        return {
+            "content": payload.get("page_content", ""),
+            "metadata": payload.get(METADATA_KEY, {}) or {},
+            "relevance_score": float(score),
+            "point_id": self.ids[row]
+        }
+
+    def search_batch(self, query_vectors, queries: List[str], limit: int, memory_filters: List = None) -> List[List[Dict]]:
+        """Top-`limit` memories per query, in the same shape as the Qdrant path returns."""
+        memory_filters = memory_filters or [None] * len(queries)
+        with self._lock:
+            if not self.size or not queries:
+                return [[] for _ in queries]
+            masks = [self._filter_mask(memory_filter) for memory_filter in memory_filters]
+            q = _normalize_rows(np.asarray(query_vectors, dtype=np.float32))
+            dense = np.empty((len(q), self.size), dtype=np.float32)
+            for start in range(0, self.size, BLOCK_ROWS):
+                stop = min(start + BLOCK_ROWS, self.size)
+                dense[:, start:stop] = q @ np.asarray(self.matrix[start:stop], dtype=np.float32).T
+
+            results = []
+            for i, (query, mask) in enumerate(zip(queries, masks)):
+                scores = dense[i]
+                if mask is not None:
+                    scores[~mask] = -np.inf
+                if not self.hybrid:
+                    results.append([self._memory(row, scores[row]) for row in _top_k(scores, limit)])
+                    continue
+                candidates = max(limit * 4, 20)
+                sparse = self._sparse_scores(query)
+                sparse[sparse <= 0] = -np.inf
+                if mask is not None:
+                    sparse[~mask] = -np.inf
+                fused: Dict[int, float] = {}
+                for ranking in (_top_k(scores, candidates), _top_k(sparse, candidates)):
+                    for rank, row in enumerate(ranking):
+                        fused[int(row)] = fused.get(int(row), 0.0) + 1.0 / (RRF_K + rank + 1)
+                best = sorted(fused.items(), key=lambda item: -item[1])[:limit]
+                results.append([self._memory(row, score) for row, score in best])
+            return results
+
+    def memory_bytes(self) -> int:
+        return 0 if isinstance(self.matrix, np.memmap) else self.size * (self.matrix.shape[1] if self.size else 0) * self.dtype.itemsize
+
+
+_tier: Optional[HotMemoryTier] = None
+_tier_lock = threading.Lock()
+_last_count: Optional[int] = None
+_refresher: Optional[threading.Thread] = None
+_refresher_lock = threading.Lock()
+_refresh_requested = threading.Event()
+
+
+def refresh_hot_tier() -> Optional[HotMemoryTier]:
+    """Load the tier, or reload it if the collection changed since it was loaded.
+
+    The collection's fingerprint (ids and metadata, see collection_fingerprint) is
+    compared with the tier's, so points added, deleted or rewritten by another process
+    trigger a reload. Above MEMORY_HOT_TIER_MAX_POINTS the tier is dropped and searches
+    go to Qdrant. The new tier is built aside and swapped in with one assignment.
+    """
+    global _tier, _last_count
+    from my_agent.utils.memory_service import get_vectorstore, hybrid_search_enabled
+    vectorstore = get_vectorstore()
+    if vectorstore is None:
+        return None
+
+    with _tier_lock:
+        try:
+            count = vectorstore.client.count(collection_name=MEMORY_COLLECTION, exact=True).count
+            if count > HOT_TIER_MAX_POINTS:
+                if _last_count is None or _last_count <= HOT_TIER_MAX_POINTS:
+                    print(f"[HotTier] {count} memories exceeds MEMORY_HOT_TIER_MAX_POINTS={HOT_TIER_MAX_POINTS}, using Qdrant")
+                _tier = None
+            else:
+                fingerprint = collection_fingerprint(vectorstore.client)
+                if _tier is None or _tier.fingerprint() != fingerprint:
+                    _tier = HotMemoryTier(hybrid=hybrid_search_enabled(), path=HOT_TIER_PATH).load_from_collection(
+                        vectorstore.client, expected_fingerprint=fingerprint
+                    )
+            _last_count = count
+        except Exception as e:
+            print(f"[HotTier] Warning: could not load hot tier, using Qdrant: {e}")
+            _tier = None
+    return _tier
+
+
+def _refresh_loop():
+    while True:
+        refresh_hot_tier()
+        _refresh_requested.wait(HOT_TIER_REFRESH_SECONDS)
+        _refresh_requested.clear()
+
+
+def _start_refresher():
+    global _refresher
+    with _refresher_lock:
+        if _refresher is None:
+            _refresher = threading.Thread(target=_refresh_loop, name="hot-tier-refresh", daemon=True)
+            _refresher.start()
+
+
+def get_hot_tier() -> Optional[HotMemoryTier]:
+    """The in-process tier when MEMORY_HOT_TIER is on and loaded, else None (use Qdrant).
+
+    Only reads the current tier: loading and the staleness check run in a background
+    thread every MEMORY_HOT_TIER_REFRESH_SECONDS (see refresh_hot_tier), started on
+    first use, so searches never wait on a collection scroll.
+    """
+    if not HOT_TIER_ENABLED:
+        return None
+    if _refresher is None:
+        _start_refresher()
+    return _tier
+
+
+def hot_tier_add(point_id, vector, payload: Dict[str, Any]):
+    """Mirror an upsert into the loaded tier so it stays in sync without a reload."""
+    if _tier is not None:
+        _tier.add_many([point_id], np.asarray([vector], dtype=np.float32), [payload])
+        _remove_snapshot()
+
+
+def invalidate_hot_tier():
+    """Drop the tier after deletes or payload rewrites and have the refresher reload it."""
+    global _tier
+    with _tier_lock:
+        _tier = None
+        _remove_snapshot()
+    _refresh_requested.set()
+
+
+def _remove_snapshot():
+    for suffix in (".npy", ".json"):
+        try:
+            os.remove(f"{HOT_TIER_PATH}{suffix}")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"[HotTier] Warning: could not remove stale snapshot: {e}")
@@ -0,0 +1,68 @@
+import os
+from typing import Any, Dict, List, Optional
+
+from my_agent.utils.job_queue import DurableJobQueue
+
+
+def _run_memory_extraction(payload: Dict[str, Any]) -> Dict[str, Any]:
+    from my_agent.utils.tools import extract_and_store_memory
+
+    memory_id = extract_and_store_memory(
+        email_content=payload["email_content"],
+        search_results=payload.get("search_results", []),
+        response=payload["response"],
+        sender=payload.get("sender"),
+        thread_id=payload.get("thread_id")
+    )
+    if not memory_id:
+        raise RuntimeError("Memory extraction did not store a memory")
+    return {"memory_id": memory_id}
+
+
+memory_queue = DurableJobQueue(
+    name="memory_extraction",
+    handler=_run_memory_extraction,
+    max_workers=int(os.getenv("MEMORY_WORKERS", "2")),
+    max_attempts=int(os.getenv("MEMORY_MAX_ATTEMPTS", "3")),
+    backoff_seconds=float(os.getenv("MEMORY_RETRY_BACKOFF_SECONDS", "5")),
+)
+
+
+def enqueue_memory_extraction(
+    email_content: str,
+    search_results: List[Dict],
+    response: str,
+    sender: Optional[str] = None,
+    thread_id: Optional[str] = None
+) -> str:
+    memory_queue.start()
+    job_id = memory_queue.enqueue({
+        "email_content": email_content,
+        "search_results": search_results,
+        "response": response,
+        "sender": sender,
+        "thread_id": thread_id
+    })
+    print(f"[Memory] Queued memory extraction job {job_id}")
+    return job_id
+
+
+def get_memory_job(job_id: str) -> Optional[Dict[str, Any]]:
+    return memory_queue.get(job_id)
+
+
+def get_memory_queue_status(limit: int = 20) -> Dict[str, Any]:
+    status = memory_queue.stats()
+    status["recent_jobs"] = [
+        {
+            "id": job["id"],
+            "status": job["status"],
+            "attempts": job["attempts"],
+            "result": job["result"],
+            "last_error": job["last_error"].splitlines()[0] if job["last_error"] else None,
+            "created_at": job["created_at"],
+            "updated_at": job["updated_at"]
+        }
+        for job in memory_queue.recent(limit=limit)
+    ]
+    return status
@@ -0,0 +1,184 @@
+import time
+import hashlib
+from typing import Any, Dict, Optional
+
+from qdrant_client.http import models as rest
+
+from my_agent.utils.embeddings import get_embeddings, get_embedding_dimension, embedding_identity, EMBEDDING_BATCH_SIZE
+from my_agent.utils.memory_schema import MEMORY_COLLECTION, create_memory_collection, collection_vector_size, collection_has_sparse
+from my_agent.utils.memory_schema import collection_embedding_identity, record_embedding_identity
+from my_agent.utils.sparse_encoder import SPARSE_VECTOR_NAME, encode_document
+from my_agent.utils.memory_hot_tier import invalidate_hot_tier
+
+CONTENT_KEY = "page_content"
+
+
+def _dense(vector):
+    return vector.get("") if isinstance(vector, dict) else vector
+
+
+def _copy_points(client, source: str, target: str, page_size: int, reembed=None, text_key: str = CONTENT_KEY) -> int:
+    """Copy every point from `source` to `target`, re-embedding `text_key` when `reembed` is given.
+
+    BM25 sparse vectors are (re)computed from the text whenever the target collection
+    is configured for hybrid search.
+    """
+    with_sparse = collection_has_sparse(client, target)
+    copied = 0
+    offset = None
+    while True:
+        records, offset = client.scroll(
+            collection_name=source,
+            limit=page_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=reembed is None
+        )
+        if records:
+            texts = [(record.payload or {}).get(text_key, "") for record in records]
+            if reembed is None:
+                vectors = [_dense(record.vector) for record in records]
+            else:
+                vectors = reembed(texts)
+            if with_sparse:
+                vectors = [
+                    {"": vector, SPARSE_VECTOR_NAME: encode_document(text)}
+                    for vector, text in zip(vectors, texts)
+                ]
+            client.upsert(
+                collection_name=target,
+                points=[
+                    rest.PointStruct(id=record.id, vector=vector, payload=record.payload)
+                    for record, vector in zip(records, vectors)
+                ],
+                wait=True
+            )
+            copied += len(records)
+            print(f"[Migration] {source} -> {target}: {copied} points")
+        if offset is None:
+            return copied
+
+
+def _migrate_collection(client, collection_name: str, create, text_key: str, embeddings,
+                        batch_size: int, keep_staging: bool, force_reembed: bool) -> Dict[str, Any]:
+    """Rebuild one collection through a staging copy; see reembed_collection."""
+    dimension = get_embedding_dimension(embeddings)
+    identity = embedding_identity(embeddings)
+    # Keyed by the embedding identity, so a staging copy is only reused for the same model.
+    staging = f"{collection_name}__reembed_{hashlib.sha1(identity.encode('utf-8')).hexdigest()[:8]}"
+    started = time.perf_counter()
+
+    existing = {c.name for c in client.get_collections().collections}
+    source_count = client.count(collection_name=collection_name, exact=True).count if collection_name in existing else 0
+    previous_identity = collection_embedding_identity(client, collection_name) if collection_name in existing else None
+
+    if staging in existing and client.count(collection_name=staging, exact=True).count >= source_count:
+        print(f"[Migration] Reusing populated staging collection '{staging}'")
+    else:
+        if collection_name not in existing:
+            return {"status": "skipped", "reason": f"collection '{collection_name}' does not exist"}
+        if staging in existing:
+            client.delete_collection(staging)
+        create(client, staging, dimension)
+        same_space = collection_vector_size(client, collection_name) == dimension and previous_identity == identity
+        if same_space and not force_reembed:
+            print(f"[Migration] Embedding model unchanged ({identity}), copying {source_count} points into '{staging}'")
+            _copy_points(client, collection_name, staging, batch_size, text_key=text_key)
+        else:
+            print(f"[Migration] Re-embedding {source_count} points from {previous_identity or 'an unrecorded model'} "
+                  f"with {identity} into '{staging}' ({dimension} dims)")
+            _copy_points(client, collection_name, staging, batch_size, reembed=embeddings.embed_documents, text_key=text_key)
+
+    previous_dimension = collection_vector_size(client, collection_name) if collection_name in existing else None
+    if collection_name in existing:
+        client.delete_collection(collection_name)
+    create(client, collection_name, dimension)
+    copied = _copy_points(client, staging, collection_name, batch_size, text_key=text_key)
+    record_embedding_identity(client, identity, collection_name)
+
+    if not keep_staging:
+        client.delete_collection(staging)
+
+    return {
+        "status": "complete",
+        "collection": collection_name,
+        "previous_dimension": previous_dimension,
+        "dimension": dimension,
+        "previous_embedding": previous_identity,
+        "embedding": identity,
+        "points": copied,
+        "elapsed_seconds": round(time.perf_counter() - started, 2)
+    }
+
+
+def reembed_collection(
+    client,
+    backend: Optional[str] = None,
+    collection_name: str = MEMORY_COLLECTION,
+    batch_size: int = EMBEDDING_BATCH_SIZE,
+    keep_staging: bool = False,
+    force_reembed: bool = False,
+    include_drafts: bool = True,
+) -> Dict[str, Any]:
+    """Re-embed every memory with `backend` and swap it in under the same collection name.
+
+    1. Scroll the existing collection (payloads only), embed `page_content` in batches with
+       the new backend, and upsert into a staging collection sized for the new dimension.
+    2. Recreate `collection_name` with the new dimension and copy the staged vectors back.
+
+    The collection is recreated with the current settings, so this is also how an existing
+    collection picks up BM25 sparse vectors for hybrid search. Each collection records the
+    embedding backend and model that filled it; the stored dense vectors are only copied
+    instead of re-embedded when that model is unchanged (a collection with no record is
+    re-embedded), unless `force_reembed` is set.
+
+    With `include_drafts`, the approved-draft collection used for draft reuse is migrated
+    in the same pass (re-embedding its `email_content`), so it keeps matching new queries.
+
+    Step 1 is the slow part and leaves the live collection untouched. If step 2 is
+    interrupted, rerunning finds the staging collection already populated and only
+    repeats the copy.
+    """
+    from my_agent.utils.draft_reuse import DRAFT_COLLECTION, create_draft_collection, invalidate_draft_collection
+
+    embeddings = get_embeddings(backend)
+    report = _migrate_collection(
+        client, collection_name,
+        lambda c, name, dimension: create_memory_collection(c, name, vector_size=dimension),
+        CONTENT_KEY, embeddings, batch_size, keep_staging, force_reembed
+    )
+    invalidate_hot_tier()
+    if include_drafts and report["status"] == "complete":
+        report["drafts"] = _migrate_collection(
+            client, DRAFT_COLLECTION,
+            lambda c, name, dimension: create_draft_collection(c, dimension, name),
+            "email_content",
+            embeddings, batch_size, keep_staging, force_reembed
+        )
+        invalidate_draft_collection()
+    print(f"[Migration] {report}")
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    from my_agent.utils.memory_service import get_qdrant_client
+
+    parser = argparse.ArgumentParser(description="Re-embed or rebuild the memory collection (backend change, hybrid search). "
+                                                 "Connects via QDRANT_URL / QDRANT_PATH like the agent.")
+    parser.add_argument("--backend", choices=["openai", "local"], default=None, help="Defaults to MEMORY_EMBEDDING_BACKEND")
+    parser.add_argument("--batch-size", type=int, default=EMBEDDING_BATCH_SIZE)
+    parser.add_argument("--keep-staging", action="store_true")
+    parser.add_argument("--force-reembed", action="store_true", help="Re-embed even if the embedding model is unchanged")
+    parser.add_argument("--skip-drafts", action="store_true", help="Leave the approved-draft collection as it is")
+    args = parser.parse_args()
+
+    print(json.dumps(reembed_collection(
+        get_qdrant_client(),
+        backend=args.backend,
+        batch_size=args.batch_size,
+        keep_staging=args.keep_staging,
+        force_reembed=args.force_reembed,
+        include_drafts=not args.skip_drafts
+    ), indent=2))
@@ -0,0 +1,319 @@
+import os
+import re
+import uuid
+import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from qdrant_client.http import models as rest
+
+from my_agent.utils.sparse_encoder import SPARSE_VECTOR_NAME, sparse_vector_config
+
+MEMORY_COLLECTION = "insurance_research"
+METADATA_KEY = "metadata"
+DEFAULT_VECTOR_SIZE = 1536
+# One point per vector collection recording the embedding model that filled it
+# (this qdrant-client has no collection-level metadata).
+EMBEDDING_IDENTITY_COLLECTION = "embedding_identity"
+
+MEMORY_INDEXED_FIELDS = {
+    "source": rest.PayloadSchemaType.KEYWORD,
+    "sender": rest.PayloadSchemaType.KEYWORD,
+    "thread_id": rest.PayloadSchemaType.KEYWORD,
+    "insurer": rest.PayloadSchemaType.KEYWORD,
+    "claim_ids": rest.PayloadSchemaType.KEYWORD,
+    "timestamp": rest.PayloadSchemaType.DATETIME,
+}
+
+KNOWN_INSURERS = {
+    "aetna": "Aetna",
+    "anthem": "Anthem",
+    "blue cross": "Blue Cross Blue Shield",
+    "blue shield": "Blue Cross Blue Shield",
+    "bcbs": "Blue Cross Blue Shield",
+    "cigna": "Cigna",
+    "unitedhealthcare": "UnitedHealthcare",
+    "united healthcare": "UnitedHealthcare",
+    "uhc": "UnitedHealthcare",
+    "humana": "Humana",
+    "kaiser": "Kaiser Permanente",
+    "molina": "Molina Healthcare",
+    "centene": "Centene",
+    "ambetter": "Ambetter",
+    "oscar health": "Oscar Health",
+    "highmark": "Highmark",
+    "medicare": "Medicare",
+    "medicaid": "Medicaid",
+    "medi-cal": "Medi-Cal",
+    "tricare": "TRICARE",
+}
+
+_EMAIL_ADDRESS_RE = re.compile(r'<?([\w._%+-]+@[\w.-]+\.[a-zA-Z]{2,})>?')
+_CLAIM_ID_RE = re.compile(
+    r'\b(?:claim|reference|ref|case|appeal|authorization|auth)\s*(?:#|no\.?|number|id)?\s*[:#]?\s*([A-Z0-9][A-Z0-9-]{4,})\b',
+    re.IGNORECASE
+)
+_INSURER_RE = re.compile(
+    r'\b(' + '|'.join(re.escape(name) for name in sorted(KNOWN_INSURERS, key=len, reverse=True)) + r')\b',
+    re.IGNORECASE
+)
+
+
+def normalize_sender(sender: Optional[str]) -> Optional[str]:
+    if not sender:
+        return None
+    match = _EMAIL_ADDRESS_RE.search(sender)
+    return match.group(1).lower() if match else sender.strip().lower()
+
+
+def extract_claim_ids(text: str) -> List[str]:
+    claim_ids = []
+    for match in _CLAIM_ID_RE.finditer(text or ""):
+        claim_id = match.group(1).upper()
+        if any(ch.isdigit() for ch in claim_id) and claim_id not in claim_ids:
+            claim_ids.append(claim_id)
+    return claim_ids
+
+
+def extract_insurer(text: str) -> Optional[str]:
+    match = _INSURER_RE.search(text or "")
+    return KNOWN_INSURERS[match.group(1).lower()] if match else None
+
+
+def extract_memory_tags(text: str, sender: Optional[str] = None, thread_id: Optional[str] = None) -> Dict[str, Any]:
+    """Derive the indexed metadata fields (sender, thread, insurer, claim ids) for a memory."""
+    tags: Dict[str, Any] = {}
+    normalized_sender = normalize_sender(sender)
+    if normalized_sender:
+        tags["sender"] = normalized_sender
+    if thread_id:
+        tags["thread_id"] = thread_id
+    insurer = extract_insurer(text)
+    if insurer:
+        tags["insurer"] = insurer
+    claim_ids = extract_claim_ids(text)
+    if claim_ids:
+        tags["claim_ids"] = claim_ids
+    return tags
+
+
+def _env_flag(name: str, default: str = "false") -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_int(name: str) -> Optional[int]:
+    value = os.getenv(name)
+    return int(value) if value else None
+
+
+def memory_collection_settings(**overrides) -> Dict[str, Any]:
+    """Storage and index settings for the memory collection, read from the environment.
+
+    MEMORY_QUANTIZATION: none | scalar | binary
+    MEMORY_ON_DISK: keep original float32 vectors on disk (quantized copies stay in RAM)
+    MEMORY_HNSW_M / MEMORY_HNSW_EF_CONSTRUCT / MEMORY_HNSW_ON_DISK: HNSW graph build settings
+    MEMORY_SEARCH_EF / MEMORY_RESCORE / MEMORY_OVERSAMPLING: query-time settings
+    MEMORY_HYBRID_SEARCH: add a BM25 sparse vector next to the dense one and fuse both at query time
+    """
+    settings = {
+        "quantization": os.getenv("MEMORY_QUANTIZATION", "none").strip().lower(),
+        "quantization_always_ram": _env_flag("MEMORY_QUANTIZATION_ALWAYS_RAM", "true"),
+        "on_disk": _env_flag("MEMORY_ON_DISK"),
+        "hnsw_m": _env_int("MEMORY_HNSW_M"),
+        "hnsw_ef_construct": _env_int("MEMORY_HNSW_EF_CONSTRUCT"),
+        "hnsw_on_disk": _env_flag("MEMORY_HNSW_ON_DISK"),
+        "search_ef": _env_int("MEMORY_SEARCH_EF"),
+        "rescore": _env_flag("MEMORY_RESCORE", "true"),
+        "oversampling": float(os.getenv("MEMORY_OVERSAMPLING", "2.0")),
+        "hybrid": _env_flag("MEMORY_HYBRID_SEARCH", "true"),
+    }
+    settings.update({key: value for key, value in overrides.items() if value is not None})
+    if settings["quantization"] not in ("none", "scalar", "binary"):
+        raise ValueError(f"Unsupported MEMORY_QUANTIZATION value: {settings['quantization']}")
+    return settings
+
+
+def _quantization_config(settings: Dict[str, Any]):
+    if settings["quantization"] == "scalar":
+        return rest.ScalarQuantization(
+            scalar=rest.ScalarQuantizationConfig(
+                type=rest.ScalarType.INT8,
+                quantile=0.99,
+                always_ram=settings["quantization_always_ram"]
+            )
+        )
+    if settings["quantization"] == "binary":
+        return rest.BinaryQuantization(
+            binary=rest.BinaryQuantizationConfig(always_ram=settings["quantization_always_ram"])
+        )
+    return None
+
+
+def create_memory_collection(
+    client,
+    collection_name: str = MEMORY_COLLECTION,
+    vector_size: int = DEFAULT_VECTOR_SIZE,
+    settings: Optional[Dict[str, Any]] = None,
+):
+    """Create the memory collection with the configured quantization, HNSW and on-disk settings."""
+    settings = settings or memory_collection_settings()
+    hnsw_config = None
+    if settings["hnsw_m"] or settings["hnsw_ef_construct"] or settings["hnsw_on_disk"]:
+        hnsw_config = rest.HnswConfigDiff(
+            m=settings["hnsw_m"],
+            ef_construct=settings["hnsw_ef_construct"],
+            on_disk=settings["hnsw_on_disk"] or None
+        )
+    client.create_collection(
+        collection_name=collection_name,
+        vectors_config=rest.VectorParams(
+            size=vector_size,
+            distance=rest.Distance.COSINE,
+            on_disk=settings["on_disk"] or None
+        ),
+        sparse_vectors_config=sparse_vector_config() if settings["hybrid"] else None,
+        hnsw_config=hnsw_config,
+        quantization_config=_quantization_config(settings)
+    )
+    print(f"Created '{collection_name}' (size={vector_size}, quantization={settings['quantization']}, "
+          f"on_disk={settings['on_disk']}, m={settings['hnsw_m']}, ef_construct={settings['hnsw_ef_construct']}, "
+          f"hybrid={settings['hybrid']})")
+    ensure_memory_indexes(client, collection_name)
+
+
+def collection_vector_size(client, collection_name: str = MEMORY_COLLECTION) -> Optional[int]:
+    vectors = client.get_collection(collection_name).config.params.vectors
+    if isinstance(vectors, dict):
+        vectors = vectors.get("") or next(iter(vectors.values()), None)
+    return vectors.size if vectors else None
+
+
+def collection_has_sparse(client, collection_name: str = MEMORY_COLLECTION) -> bool:
+    sparse_vectors = client.get_collection(collection_name).config.params.sparse_vectors or {}
+    return SPARSE_VECTOR_NAME in sparse_vectors
+
+
+def check_collection_dimension(client, expected_size: int, collection_name: str = MEMORY_COLLECTION) -> bool:
+    """Warn when the stored vectors were produced by a different embedding backend."""
+    try:
+        actual_size = collection_vector_size(client, collection_name)
+    except Exception as e:
+        print(f"Could not read vector size for '{collection_name}': {e}")
+        return True
+    if actual_size and actual_size != expected_size:
+        print(f"Warning: '{collection_name}' stores {actual_size}-dim vectors but the embedding backend produces "
+              f"{expected_size}-dim vectors. Run `python -m my_agent.utils.memory_migration` to re-embed.")
+        return False
+    return True
+
+
+def _identity_point_id(collection_name: str) -> str:
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{EMBEDDING_IDENTITY_COLLECTION}:{collection_name}"))
+
+
+def collection_embedding_identity(client, collection_name: str = MEMORY_COLLECTION) -> Optional[str]:
+    """The embedding_identity recorded for `collection_name`, or None if never recorded."""
+    if not client.collection_exists(EMBEDDING_IDENTITY_COLLECTION):
+        return None
+    points = client.retrieve(EMBEDDING_IDENTITY_COLLECTION, [_identity_point_id(collection_name)], with_payload=True)
+    return (points[0].payload or {}).get("identity") if points else None
+
+
+def record_embedding_identity(client, identity: str, collection_name: str = MEMORY_COLLECTION):
+    if not client.collection_exists(EMBEDDING_IDENTITY_COLLECTION):
+        client.create_collection(
+            collection_name=EMBEDDING_IDENTITY_COLLECTION,
+            vectors_config=rest.VectorParams(size=1, distance=rest.Distance.COSINE)
+        )
+    client.upsert(EMBEDDING_IDENTITY_COLLECTION, [rest.PointStruct(
+        id=_identity_point_id(collection_name),
+        vector=[1.0],
+        payload={"collection": collection_name, "identity": identity, "timestamp": datetime.datetime.now().isoformat()}
+    )])
+
+
+def check_collection_embedding(client, identity: str, collection_name: str = MEMORY_COLLECTION) -> bool:
+    """Warn when the stored vectors came from a different embedding model, even at the same size."""
+    try:
+        stored = collection_embedding_identity(client, collection_name)
+    except Exception as e:
+        print(f"Could not read embedding identity for '{collection_name}': {e}")
+        return True
+    if stored and stored != identity:
+        print(f"Warning: '{collection_name}' was embedded with {stored} but the embedding backend is {identity}. "
+              f"Run `python -m my_agent.utils.memory_migration` to re-embed.")
+        return False
+    return True
+
+
+def memory_search_params(settings: Optional[Dict[str, Any]] = None) -> Optional[rest.SearchParams]:
+    """Query-time HNSW ef and quantization rescoring matching the collection settings."""
+    settings = settings or memory_collection_settings()
+    quantization = None
+    if settings["quantization"] != "none":
+        quantization = rest.QuantizationSearchParams(
+            rescore=settings["rescore"],
+            oversampling=settings["oversampling"] if settings["rescore"] else None
+        )
+    if settings["search_ef"] is None and quantization is None:
+        return None
+    return rest.SearchParams(hnsw_ef=settings["search_ef"], quantization=quantization)
+
+
+def ensure_memory_indexes(client, collection_name: str = MEMORY_COLLECTION):
+    """Create keyword payload indexes on the metadata fields used for filtered retrieval."""
+    try:
+        existing = client.get_collection(collection_name).payload_schema or {}
+    except Exception as e:
+        print(f"Could not read payload schema for '{collection_name}': {e}")
+        return
+    for field, schema in MEMORY_INDEXED_FIELDS.items():
+        field_name = f"{METADATA_KEY}.{field}"
+        if field_name in existing:
+            continue
+        try:
+            client.create_payload_index(
+                collection_name=collection_name,
+                field_name=field_name,
+                field_schema=schema
+            )
+            print(f"Created payload index on '{field_name}'")
+        except Exception as e:
+            print(f"Warning: Could not create payload index on '{field_name}': {e}")
+
+
+def _parse_datetime(value: Optional[str]) -> Optional[datetime.datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid ISO-8601 timestamp: {value}") from None
+
+
+def build_memory_filter(
+    sender: Optional[str] = None,
+    thread_id: Optional[str] = None,
+    insurer: Optional[str] = None,
+    claim_ids: Optional[Iterable[str]] = None,
+    source: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+) -> Optional[rest.Filter]:
+    must = []
+    if sender:
+        must.append(rest.FieldCondition(key=f"{METADATA_KEY}.sender", match=rest.MatchValue(value=normalize_sender(sender))))
+    if thread_id:
+        must.append(rest.FieldCondition(key=f"{METADATA_KEY}.thread_id", match=rest.MatchValue(value=thread_id)))
+    if insurer:
+        must.append(rest.FieldCondition(key=f"{METADATA_KEY}.insurer", match=rest.MatchValue(value=insurer)))
+    if claim_ids:
+        must.append(rest.FieldCondition(key=f"{METADATA_KEY}.claim_ids", match=rest.MatchAny(any=list(claim_ids))))
+    if source:
+        must.append(rest.FieldCondition(key=f"{METADATA_KEY}.source", match=rest.MatchValue(value=source)))
+    if since or until:
+        # ISO-8601 strings; `since` is inclusive, `until` exclusive.
+        must.append(rest.FieldCondition(
+            key=f"{METADATA_KEY}.timestamp",
+            range=rest.DatetimeRange(gte=_parse_datetime(since), lt=_parse_datetime(until))
+        ))
+    return rest.Filter(must=must) if must else None
@@ -0,0 +1,170 @@
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+from qdrant_client import QdrantClient
+from langchain_community.vectorstores import Qdrant
+
+from my_agent.utils.embeddings import get_embeddings, get_embedding_dimension, embedding_identity, embeddings_available, EMBEDDING_BACKEND
+from my_agent.utils.memory_schema import MEMORY_COLLECTION, create_memory_collection, ensure_memory_indexes
+from my_agent.utils.memory_schema import check_collection_dimension, collection_has_sparse, memory_collection_settings
+from my_agent.utils.memory_schema import check_collection_embedding, record_embedding_identity
+
+load_dotenv()
+
+DEFAULT_LOCAL_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "qdrant_db")
+
+_lock = threading.RLock()
+_client: Optional[QdrantClient] = None
+_vectorstore: Optional[Qdrant] = None
+_hybrid_enabled = False
+_last_error: Optional[str] = None
+_compaction_thread = None
+
+
+def _env_flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+def connection_settings() -> Dict[str, Any]:
+    """Where the memory store lives, read from the environment at connect time.
+
+    With QDRANT_URL set every process (API workers, the Gmail poller, graph workers)
+    talks to the same Qdrant server; gRPC is preferred by default. Without it the
+    store falls back to embedded mode at QDRANT_PATH, which holds a file lock and
+    can only be opened by one process at a time.
+    """
+    url = os.getenv("QDRANT_URL")
+    return {
+        "mode": "server" if url else "local",
+        "url": url,
+        "path": os.getenv("QDRANT_PATH", DEFAULT_LOCAL_PATH),
+        "api_key": os.getenv("QDRANT_API_KEY"),
+        "prefer_grpc": _env_flag("QDRANT_PREFER_GRPC", "true"),
+        "grpc_port": int(os.getenv("QDRANT_GRPC_PORT", "6334")),
+        "timeout": int(os.getenv("QDRANT_TIMEOUT_SECONDS", "10")),
+    }
+
+
+def get_qdrant_client() -> QdrantClient:
+    """The process-wide Qdrant client, created on first use.
+
+    A single client keeps one HTTP connection pool / gRPC channel open, so every
+    search and upsert in the process reuses it instead of reconnecting.
+    """
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                settings = connection_settings()
+                if settings["url"]:
+                    _client = QdrantClient(
+                        url=settings["url"],
+                        api_key=settings["api_key"],
+                        prefer_grpc=settings["prefer_grpc"],
+                        grpc_port=settings["grpc_port"],
+                        timeout=settings["timeout"]
+                    )
+                    print(f"Connected to Qdrant server at {settings['url']} (prefer_grpc={settings['prefer_grpc']})")
+                else:
+                    _client = QdrantClient(path=settings["path"])
+                    print(f"Connected to local Qdrant database at {settings['path']}")
+    return _client
+
+
+def _start_compaction_scheduler():
+    global _compaction_thread
+    compaction_interval = float(os.getenv("MEMORY_COMPACTION_INTERVAL_SECONDS", "0"))
+    if compaction_interval > 0 and _compaction_thread is None:
+        from my_agent.utils.memory_compaction import start_compaction_scheduler
+        _compaction_thread = start_compaction_scheduler(
+            compaction_interval,
+            max_pages_per_tick=int(os.getenv("MEMORY_COMPACTION_PAGES_PER_TICK", "20"))
+        )
+
+
+def get_vectorstore() -> Optional[Qdrant]:
+    """Shared memory vectorstore (client + embeddings), or None if memory is unavailable.
+
+    The first call creates the collection if needed, checks its indexes and vector
+    size, and decides whether hybrid search can be used. A failed initialization is
+    retried on the next call.
+    """
+    global _vectorstore, _hybrid_enabled, _last_error
+    if _vectorstore is not None:
+        return _vectorstore
+    if not embeddings_available():
+        _last_error = "no OPENAI_API_KEY and MEMORY_EMBEDDING_BACKEND is not 'local'"
+        return None
+
+    with _lock:
+        if _vectorstore is not None:
+            return _vectorstore
+        try:
+            embeddings = get_embeddings()
+            print(f"Using '{EMBEDDING_BACKEND}' embedding backend for memory")
+            dimension = get_embedding_dimension(embeddings)
+            client = get_qdrant_client()
+            settings = memory_collection_settings()
+
+            if any(c.name == MEMORY_COLLECTION for c in client.get_collections().collections):
+                ensure_memory_indexes(client)
+                check_collection_dimension(client, dimension)
+                check_collection_embedding(client, embedding_identity(embeddings))
+                _hybrid_enabled = settings["hybrid"] and collection_has_sparse(client)
+                if settings["hybrid"] and not _hybrid_enabled:
+                    print(f"Warning: '{MEMORY_COLLECTION}' has no sparse vectors, using dense-only search. "
+                          "Run `python -m my_agent.utils.memory_migration` to enable hybrid search.")
+            else:
+                print(f"Creating '{MEMORY_COLLECTION}' collection")
+                create_memory_collection(client, vector_size=dimension, settings=settings)
+                record_embedding_identity(client, embedding_identity(embeddings))
+                _hybrid_enabled = settings["hybrid"]
+
+            _vectorstore = Qdrant(
+                client=client,
+                collection_name=MEMORY_COLLECTION,
+                embeddings=embeddings,
+            )
+            _last_error = None
+            print("Qdrant vector store initialized successfully")
+        except Exception as e:
+            _last_error = str(e)
+            print(f"Warning: Could not initialize Qdrant vector store: {e}")
+            return None
+
+    _start_compaction_scheduler()
+    return _vectorstore
+
+
+def hybrid_search_enabled() -> bool:
+    return get_vectorstore() is not None and _hybrid_enabled
+
+
+def memory_service_status() -> Dict[str, Any]:
+    settings = connection_settings()
+    vectorstore = get_vectorstore()
+    return {
+        "available": vectorstore is not None,
+        "mode": settings["mode"],
+        "location": settings["url"] or settings["path"],
+        "prefer_grpc": settings["prefer_grpc"] if settings["url"] else None,
+        "collection": MEMORY_COLLECTION,
+        "hybrid_search": vectorstore is not None and _hybrid_enabled,
+        "embedding_backend": EMBEDDING_BACKEND,
+        "error": _last_error,
+    }
+
+
+def close_memory_service():
+    """Close the shared client (releases the embedded-mode file lock)."""
+    global _client, _vectorstore
+    with _lock:
+        if _client is not None:
+            try:
+                _client.close()
+            except Exception as e:
+                print(f"Warning: error closing Qdrant client: {e}")
+        _client = None
+        _vectorstore = None
@@ -0,0 +1,340 @@
+import os
+import sys
+import time
+import threading
+import functools
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").strip().lower() in ("1", "true", "yes", "on")
+# Port for the standalone /metrics server started by the polling worker; unset = not started.
+METRICS_PORT = os.getenv("METRICS_PORT")
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, totals = self._values.setdefault(key, ([0] * len(self.buckets), [0.0]))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            totals[0] += value
+
+    def count_and_sum(self, **labels) -> Tuple[int, float]:
+        with self._lock:
+            counts, totals = self._values.get(self._key(labels), ([0], [0.0]))
+            return counts[-1], totals[0]
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, (list(counts), totals[0])) for key, (counts, totals) in self._values.items())
+        lines = self.header()
+        for key, (counts, total) in values:
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', _format_value(bound)))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {counts[-1]}")
+        return lines
+
+
+node_seconds = Histogram(
+    "agent_node_duration_seconds", "Time spent in each graph node.", ("node", "outcome")
+)
+dependency_seconds = Histogram(
+    "agent_dependency_duration_seconds", "Latency of calls to external dependencies.", ("dependency", "operation", "outcome")
+)
+dependency_calls = Counter(
+    "agent_dependency_calls_total", "Calls to external dependencies.", ("dependency", "operation", "outcome")
+)
+llm_tokens = Counter(
+    "agent_llm_tokens_total", "LLM tokens used, by model and direction (prompt/completion).", ("model", "kind")
+)
+
+graph_runs = Counter(
+    "agent_graph_runs_total", "Checkpointed graph runs, fresh or resumed from a checkpoint.", ("mode", "outcome")
+)
+
+draft_reuse_lookups = Counter(
+    "agent_draft_reuse_lookups_total", "Approved-draft reuse lookups, by outcome (hit/miss).", ("outcome",)
+)
+draft_seconds = Histogram(
+    "agent_draft_seconds", "Time to a finished draft: reuse lookup plus adaptation, or the full pipeline.", ("path",)
+)
+
+REGISTRY: List[_Metric] = [
+    node_seconds, dependency_seconds, dependency_calls, llm_tokens, graph_runs, draft_reuse_lookups, draft_seconds
+]
+
+
+def timed_node(name: str):
+    """Record the wrapped graph node's duration in agent_node_duration_seconds under `name`."""
+    def decorator(func: Callable):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not METRICS_ENABLED:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            outcome = "error"
+            try:
+                result = func(*args, **kwargs)
+                outcome = "ok"
+                return result
+            finally:
+                node_seconds.observe(time.perf_counter() - started, node=name, outcome=outcome)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def track(dependency: str, operation: str):
+    """Time one call to an external dependency (openai, embeddings, qdrant, gmail)."""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        if METRICS_ENABLED:
+            elapsed = time.perf_counter() - started
+            dependency_seconds.observe(elapsed, dependency=dependency, operation=operation, outcome=outcome)
+            dependency_calls.inc(dependency=dependency, operation=operation, outcome=outcome)
+
+
+def record_llm_usage(model: str, prompt_tokens: Optional[int], completion_tokens: Optional[int]):
+    if prompt_tokens:
+        llm_tokens.inc(prompt_tokens, model=model, kind="prompt")
+    if completion_tokens:
+        llm_tokens.inc(completion_tokens, model=model, kind="completion")
+
+
+def record_openai_usage(model: str, response):
+    """Token usage from an OpenAI SDK response (chat completions or responses API)."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    record_llm_usage(
+        getattr(response, "model", None) or model,
+        getattr(usage, "prompt_tokens", None) or getattr(usage, "input_tokens", None),
+        getattr(usage, "completion_tokens", None) or getattr(usage, "output_tokens", None)
+    )
+
+
+def llm_metrics_callback():
+    """LangChain callback recording latency and token usage of ChatOpenAI calls made through get_llm."""
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class LLMMetricsCallback(BaseCallbackHandler):
+        def __init__(self):
+            self._started: Dict[Any, Tuple[float, str]] = {}
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+            params = kwargs.get("invocation_params") or {}
+            model = params.get("model_name") or params.get("model", "")
+            self._started[run_id] = (time.perf_counter(), model)
+
+        def _finish(self, run_id, outcome: str):
+            started, model = self._started.pop(run_id, (None, ""))
+            if started is not None and METRICS_ENABLED:
+                dependency_seconds.observe(time.perf_counter() - started, dependency="openai", operation="langchain_chat", outcome=outcome)
+                dependency_calls.inc(dependency="openai", operation="langchain_chat", outcome=outcome)
+            return model
+
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            model = self._finish(run_id, "ok")
+            usage = (response.llm_output or {}).get("token_usage") or {}
+            record_llm_usage(
+                (response.llm_output or {}).get("model_name") or model,
+                usage.get("prompt_tokens"),
+                usage.get("completion_tokens")
+            )
+
+        def on_llm_error(self, error, *, run_id, **kwargs):
+            self._finish(run_id, "error")
+
+    return LLMMetricsCallback()
+
+
+def gmail_request_builder():
+    """googleapiclient HttpRequest subclass that times every Gmail API call by method id."""
+    from googleapiclient.http import HttpRequest
+
+    class MeteredHttpRequest(HttpRequest):
+        def execute(self, *args, **kwargs):
+            with track("gmail", self.methodId or "unknown"):
+                return super().execute(*args, **kwargs)
+
+    return MeteredHttpRequest
+
+
+def _gauge_lines(name: str, documentation: str, labelnames: Tuple[str, ...], samples: List[Tuple[LabelValues, float]]) -> List[str]:
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} gauge"]
+    lines += [f"{name}{_format_labels(labelnames, key)} {_format_value(value)}" for key, value in samples]
+    return lines
+
+
+def _collect_runtime() -> List[str]:
+    """Point-in-time values read at scrape: queue depths, LLM cache and label buffer counters.
+
+    Only modules the process has already imported are read, so a scrape never starts
+    a queue or opens a database on its own.
+    """
+    lines: List[str] = []
+    queues = []
+    for module_name, attr in (
+        ("my_agent.utils.memory_jobs", "memory_queue"),
+        ("my_agent.utils.generation_jobs", "generation_queue"),
+        ("my_agent.utils.outbox", "outbox_queue"),
+    ):
+        module = sys.modules.get(module_name)
+        if module is not None and hasattr(module, attr):
+            queues.append(getattr(module, attr))
+    samples = []
+    for queue in queues:
+        try:
+            for status, count in queue.stats()["counts"].items():
+                samples.append(((queue.name, status), count))
+        except Exception as e:
+            print(f"[Metrics] Could not read queue '{queue.name}': {e}")
+    if samples:
+        lines += _gauge_lines("agent_queue_jobs", "Jobs in each durable queue by status.", ("queue", "status"), samples)
+
+    llm_cache_module = sys.modules.get("my_agent.utils.llm_cache")
+    if llm_cache_module is not None:
+        stats = llm_cache_module.llm_cache_stats()
+        lines += [
+            "# HELP agent_llm_cache_lookups_total LLM response cache lookups by result.",
+            "# TYPE agent_llm_cache_lookups_total counter",
+            f'agent_llm_cache_lookups_total{{result="hit"}} {stats["hits"]}',
+            f'agent_llm_cache_lookups_total{{result="miss"}} {stats["misses"]}',
+        ]
+        lines += _gauge_lines("agent_llm_cache_entries", "Entries in the LLM response cache.", (), [((), stats["entries"])])
+
+    labels_module = sys.modules.get("my_agent.utils.gmail_labels")
+    if labels_module is not None:
+        stats = labels_module.label_buffer.stats()
+        lines += _gauge_lines(
+            "agent_gmail_label_mutations_pending", "Label changes waiting for the next batchModify.", (),
+            [((), stats.get("pending", 0))]
+        )
+    return lines
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    try:
+        lines += _collect_runtime()
+    except Exception as e:
+        print(f"[Metrics] Error collecting runtime metrics: {e}")
+    return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: Optional[str] = METRICS_PORT):
+    """Serve /metrics on `port` from a daemon thread (for the polling worker, which has no API)."""
+    global _server
+    if not port or not METRICS_ENABLED:
+        return None
+    with _server_lock:
+        if _server is not None:
+            return _server
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = render_metrics().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            _server = ThreadingHTTPServer(("0.0.0.0", int(port)), MetricsHandler)
+        except OSError as e:
+            print(f"[Metrics] Could not start metrics server on port {port}: {e}")
+            return None
+        threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+        print(f"[Metrics] Serving /metrics on port {port}")
+        return _server
@@ -0,0 +1,228 @@
+import os
+import re
+import json
+import uuid
+import datetime
+import threading
+from typing import Any, Dict, Optional
+
+from my_agent.utils.memory_schema import extract_claim_ids, extract_insurer
+from my_agent.utils.deadline import remaining_seconds
+
+MODEL_ROUTING_ENABLED = os.getenv("MODEL_ROUTING", "true").strip().lower() in ("1", "true", "yes", "on")
+ROUTING_LATENCY_BUDGET_SECONDS = float(os.getenv("ROUTING_LATENCY_BUDGET_SECONDS", "0") or 0)
+ROUTING_COST_BUDGET_USD = float(os.getenv("ROUTING_COST_BUDGET_USD", "0") or 0)
+ROUTING_THRESHOLDS = [float(x) for x in os.getenv("ROUTING_THRESHOLDS", "0.35,0.65").split(",")]
+ROUTING_LOG_PATH = os.getenv(
+    "ROUTING_LOG_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "model_routing.jsonl")
+)
+
+TIER_ORDER = ["fast", "standard", "strong"]
+
+# Per-tier model and rough serving characteristics used for budget estimates
+# (first-token latency, output tokens/second, USD per 1K input/output tokens).
+MODEL_TIERS = {
+    "fast": {"model": os.getenv("MODEL_TIER_FAST", "gpt-4o-mini"), "first_token_s": 0.4, "tokens_per_s": 80,
+             "cost_in_1k": 0.00015, "cost_out_1k": 0.0006},
+    "standard": {"model": os.getenv("MODEL_TIER_STANDARD", "gpt-4.1-mini"), "first_token_s": 0.5, "tokens_per_s": 70,
+                 "cost_in_1k": 0.0004, "cost_out_1k": 0.0016},
+    "strong": {"model": os.getenv("MODEL_TIER_STRONG", "gpt-4o"), "first_token_s": 0.6, "tokens_per_s": 50,
+               "cost_in_1k": 0.0025, "cost_out_1k": 0.01},
+}
+if os.getenv("MODEL_TIERS_JSON"):
+    for tier_name, overrides in json.loads(os.getenv("MODEL_TIERS_JSON")).items():
+        MODEL_TIERS.setdefault(tier_name, {}).update(overrides)
+
+# max_tokens per tier for each kind of call, and the highest tier the call is worth.
+PURPOSE_PROFILES = {
+    "generate": {"max_tokens": {"fast": 700, "standard": 1000, "strong": 1500}, "max_tier": "strong"},
+    "fallback": {"max_tokens": {"fast": 700, "standard": 1000, "strong": 1000}, "max_tier": "strong"},
+    "web_search": {"max_tokens": {"fast": 800, "standard": 1200, "strong": 1500}, "max_tier": "strong"},
+    "memory_extraction": {"max_tokens": {"fast": 400, "standard": 600, "strong": 800}, "max_tier": "strong"},
+    "evaluate": {"max_tokens": {"fast": 200, "standard": 200, "strong": 200}, "max_tier": "standard"},
+    "research_queries": {"max_tokens": {"fast": 200, "standard": 200, "strong": 200}, "max_tier": "standard"},
+}
+
+# Calls whose output is the draft itself. The run's deadline never trims their
+# max_tokens (that would cut the reply off mid-sentence); the deadline is protected
+# by skipping optional steps before generation instead (see deadline.has_time_for).
+DRAFT_PURPOSES = {"generate"}
+
+_MONEY_RE = re.compile(r"\$\s?\d[\d,]*(?:\.\d{2})?")
+_DATE_RE = re.compile(r"\b(?:\d{1,2}/\d{1,2}/\d{2,4}|\d{4}-\d{2}-\d{2}|(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\.? \d{1,2})\b")
+_CODE_RE = re.compile(r"\b(?:\d{5}|[A-TV-Z]\d{2}(?:\.\d{1,4})?)\b")
+# Quoted-reply headers only: every email_content starts with a "From:" header line.
+_QUOTE_RE = re.compile(r"^(?:On .+ wrote:|-----Original Message-----)\s*$", re.MULTILINE)
+_QUOTE_PREFIX_RE = re.compile(r"^((?:> ?)+)", re.MULTILINE)
+
+_log_lock = threading.Lock()
+
+
+def complexity_features(email_content: str, classifier_confidence: Optional[float] = None) -> Dict[str, Any]:
+    text = email_content or ""
+    subject = next((line[len("Subject:"):] for line in text.split("\n") if line.startswith("Subject:")), "")
+    entities = (
+        len(extract_claim_ids(text))
+        + len(_MONEY_RE.findall(text))
+        + len(_DATE_RE.findall(text))
+        + len(set(_CODE_RE.findall(text)))
+        + (1 if extract_insurer(text) else 0)
+    )
+    nesting = max((prefix.count(">") for prefix in _QUOTE_PREFIX_RE.findall(text)), default=0)
+    return {
+        "words": len(text.split()),
+        "entities": entities,
+        "thread_depth": max(len(_QUOTE_RE.findall(text)), nesting) + subject.lower().count("re:"),
+        "classifier_confidence": 1.0 if classifier_confidence is None else float(classifier_confidence),
+    }
+
+
+def complexity_score(features: Dict[str, Any]) -> float:
+    """0-1 score: longer, entity-dense, deeper threads and uncertain classifications score higher."""
+    return round(
+        0.3 * min(features["words"] / 600, 1.0)
+        + 0.3 * min(features["entities"] / 8, 1.0)
+        + 0.2 * min(features["thread_depth"] / 4, 1.0)
+        + 0.2 * (1.0 - max(0.0, min(features["classifier_confidence"], 1.0))),
+        3
+    )
+
+
+def _estimate(tier: str, input_tokens: int, max_tokens: int):
+    spec = MODEL_TIERS[tier]
+    latency = spec["first_token_s"] + max_tokens / spec["tokens_per_s"]
+    cost = input_tokens / 1000 * spec["cost_in_1k"] + max_tokens / 1000 * spec["cost_out_1k"]
+    return latency, cost
+
+
+def _within_budget(latency: float, cost: float, latency_budget: float, cost_budget: float) -> bool:
+    return (not latency_budget or latency <= latency_budget) and (not cost_budget or cost <= cost_budget)
+
+
+def route_for_email(
+    email_content: str,
+    purpose: str,
+    classifier_confidence: Optional[float] = None,
+    email_id: Optional[str] = None,
+    default_model: str = "gpt-4o-mini",
+    latency_budget: Optional[float] = None,
+    cost_budget: Optional[float] = None,
+) -> Dict[str, Any]:
+    """Choose model and max_tokens for one LLM call about this email, and log the decision.
+
+    The complexity score picks a tier (capped by the purpose's max tier). If that tier's
+    estimated latency or cost exceeds the budget, max_tokens is first trimmed (down to
+    half the fast-tier allowance) and then cheaper tiers are tried. With MODEL_ROUTING
+    off, `default_model` is returned unchanged so call sites keep their old behaviour.
+    """
+    latency_budget = ROUTING_LATENCY_BUDGET_SECONDS if latency_budget is None else latency_budget
+    cost_budget = ROUTING_COST_BUDGET_USD if cost_budget is None else cost_budget
+    profile = PURPOSE_PROFILES.get(purpose, PURPOSE_PROFILES["generate"])
+    decision = {
+        "decision_id": str(uuid.uuid4()),
+        "timestamp": datetime.datetime.now().isoformat(),
+        "email_id": email_id,
+        "purpose": purpose,
+    }
+    if not MODEL_ROUTING_ENABLED:
+        decision.update({"tier": None, "model": default_model, "max_tokens": None, "reason": "routing disabled"})
+        return decision
+
+    features = complexity_features(email_content, classifier_confidence)
+    score = complexity_score(features)
+    wanted = sum(score >= threshold for threshold in ROUTING_THRESHOLDS)
+    wanted = min(wanted, TIER_ORDER.index(profile["max_tier"]))
+    input_tokens = len(email_content or "") // 4
+
+    chosen = None
+    for tier in reversed(TIER_ORDER[:wanted + 1]):
+        max_tokens = profile["max_tokens"][tier]
+        latency, cost = _estimate(tier, input_tokens, max_tokens)
+        if _within_budget(latency, cost, latency_budget, cost_budget):
+            chosen = (tier, max_tokens, latency, cost, "within budget" if tier == TIER_ORDER[wanted] else "downgraded for budget")
+            break
+        floor = profile["max_tokens"]["fast"] // 2
+        if latency_budget:
+            spec = MODEL_TIERS[tier]
+            max_tokens = int((latency_budget - spec["first_token_s"]) * spec["tokens_per_s"])
+            if max_tokens >= floor:
+                latency, cost = _estimate(tier, input_tokens, max_tokens)
+                if _within_budget(latency, cost, latency_budget, cost_budget):
+                    chosen = (tier, max_tokens, latency, cost, "max_tokens trimmed for latency budget")
+                    break
+    if chosen is None:
+        max_tokens = profile["max_tokens"]["fast"] // 2
+        latency, cost = _estimate("fast", input_tokens, max_tokens)
+        chosen = ("fast", max_tokens, latency, cost, "budget exceeded at every tier")
+
+    tier, max_tokens, latency, cost, reason = chosen
+    decision.update({
+        "features": features,
+        "score": score,
+        "wanted_tier": TIER_ORDER[wanted],
+        "tier": tier,
+        "model": MODEL_TIERS[tier]["model"],
+        "max_tokens": max_tokens,
+        "est_latency_s": round(latency, 2),
+        "est_cost_usd": round(cost, 5),
+        "latency_budget_s": latency_budget or None,
+        "cost_budget_usd": cost_budget or None,
+        "reason": reason,
+    })
+    _log(decision)
+    return decision
+
+
+def route_model(state, purpose: str, default_model: str = "gpt-4o-mini") -> Dict[str, Any]:
+    """route_for_email for the email in the agent state; the decision is kept in state['debug'].
+
+    The remaining deadline caps the latency budget, except for DRAFT_PURPOSES.
+    """
+    from my_agent.utils.tools import get_email_body
+    email = state.get('new_email') or {}
+    payload = email.get('payload', {})
+    headers = payload.get('headers', [])
+    subject = next((header['value'] for header in headers if header['name'] == 'Subject'), '')
+    sender = next((header['value'] for header in headers if header['name'] == 'From'), '')
+    email_content = f"From: {sender}\nSubject: {subject}\n\n{get_email_body(payload)}"
+    latency_budget = state.get('latency_budget_seconds')
+    remaining = remaining_seconds(state)
+    if remaining is not None and purpose not in DRAFT_PURPOSES:
+        # A single call never gets more than what is left of the run's deadline.
+        latency_budget = max(min(latency_budget or remaining, remaining), 0.1)
+    decision = route_for_email(
+        email_content,
+        purpose,
+        classifier_confidence=state.get('classification_confidence'),
+        email_id=email.get('id'),
+        default_model=default_model,
+        latency_budget=latency_budget,
+    )
+    state.setdefault('debug', {}).setdefault('model_routes', {})[purpose] = {
+        key: decision.get(key) for key in ("tier", "model", "max_tokens", "score", "reason")
+    }
+    return decision
+
+
+def record_route_outcome(decision: Dict[str, Any], latency_seconds: float, output_chars: int = 0):
+    """Log the measured latency next to the decision so thresholds can be tuned offline."""
+    if decision.get("tier") is None:
+        return
+    _log({
+        "decision_id": decision["decision_id"],
+        "timestamp": datetime.datetime.now().isoformat(),
+        "purpose": decision["purpose"],
+        "model": decision["model"],
+        "outcome": {"latency_s": round(latency_seconds, 3), "output_chars": output_chars}
+    })
+
+
+def _log(record: Dict[str, Any]):
+    if not ROUTING_LOG_PATH:
+        return
+    try:
+        with _log_lock, open(ROUTING_LOG_PATH, "a") as f:
+            f.write(json.dumps(record) + "\n")
+    except Exception as e:
+        print(f"[Routing] Warning: could not write routing log: {e}")
@@ -2,7 +2,11 @@ from functools import lru_cache
 from langchain_openai import ChatOpenAI
 from langchain_community.agent_toolkits import GmailToolkit 
 from my_agent.utils.state import AgentState
-from my_agent.utils.tools import send_email, get_email_body, get_or_create_label, WebSearchTool, search_memory
+from my_agent.utils.tools import get_email_body, get_or_create_label, WebSearchTool
+from my_agent.utils.llm_cache import install_langchain_cache, cached_chat_completion
+from my_agent.utils.model_router import route_model, record_route_outcome
+from my_agent.utils.deadline import start_deadline, has_time_for, skip_for_deadline
+from my_agent.utils.metrics import timed_node, llm_metrics_callback, gmail_request_builder, start_metrics_server
 
 import os
 import base64
@@ -10,6 +14,7 @@ import quopri
 import json
 import re
 import tempfile
+from typing import List
 from typing_extensions import TypedDict
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
@@ -19,7 +24,6 @@ from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from pydantic import BaseModel, Field
 from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.memory import MemorySaver
 from openai import OpenAI
 import time
 
@@ -50,7 +54,7 @@ def get_gmail_service():
             from google.auth.transport.requests import Request
             creds.refresh(Request())
             
-        service = build("gmail", "v1", credentials=creds)
+        service = build("gmail", "v1", credentials=creds, requestBuilder=gmail_request_builder())
         return service
     except Exception as e:
         raise RuntimeError(f"Failed to initialize Gmail service: {str(e)}") from e
@@ -73,14 +77,24 @@ except Exception as e:
     print("2. Run the authenticate.py script to generate token.json")
     service = None
 
-def get_llm(temperature=0, model_name="gpt-4o-mini"):
+install_langchain_cache()
+_llm_metrics = llm_metrics_callback()
+
+def get_llm(temperature=0, model_name="gpt-4o-mini", max_tokens=None):
     openai_api_key = os.getenv("OPENAI_API_KEY")
     return ChatOpenAI(
         temperature=temperature, 
         model_name=model_name,
-        openai_api_key=openai_api_key
+        openai_api_key=openai_api_key,
+        max_tokens=max_tokens,
+        callbacks=[_llm_metrics]
     )
 
+def get_routed_llm(state: AgentState, purpose: str, temperature=0):
+    """LLM for `purpose` with the model and max_tokens chosen by the complexity router."""
+    decision = route_model(state, purpose)
+    return get_llm(temperature=temperature, model_name=decision["model"], max_tokens=decision["max_tokens"]), decision
+
 def agent(state: AgentState):
     if "messages" not in state:
         state["messages"] = []
@@ -88,9 +102,11 @@ def agent(state: AgentState):
     if "initialized" not in state:
         state["initialized"] = False
     
+    start_metrics_server()
     print("Agent node initialized the workflow")
     return state
 
+@timed_node("check_emails")
 def check_for_new_emails(state: AgentState):  
     if not state.get('initialized', False):
         state['initialized'] = True
@@ -190,6 +206,7 @@ def check_for_new_emails(state: AgentState):
             
             state['new_email'] = email
             state['continue_polling'] = False
+            start_deadline(state)
             print("New email loaded into state")
             if email_id not in processed_ids:
                 if 'processed_email_ids' not in state:
@@ -218,7 +235,9 @@ def check_for_new_emails(state: AgentState):
 
 class GradeEmail(BaseModel):
     score: str = Field(description="Is the email medical insurance related? If yes -> 'Yes', if not -> 'No'")
+    confidence: float = Field(default=1.0, description="How confident you are in this classification, from 0 to 1")
 
+@timed_node("classify_email")
 def classify_email(state: AgentState):
     email = state.get('new_email')
     if not email:
@@ -248,6 +267,7 @@ Yes - e.g., Insurance Denail Claim."""
                 classifier = grade_prompt | structured_llm
                 result = classifier.invoke({"email_content": email_content})
                 state['email_classification'] = result.score
+                state['classification_confidence'] = result.confidence
             except AttributeError:
                 from langchain.pydantic_v1 import BaseModel, Field
                 from langchain.chains.structured_output import create_structured_output_chain
@@ -264,15 +284,15 @@ Yes - e.g., Insurance Denail Claim."""
             openai_api_key = os.getenv("OPENAI_API_KEY")
             client = OpenAI(api_key=openai_api_key)
             
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
+            state['email_classification'] = cached_chat_completion(
+                client,
+                "gpt-4o-mini",
+                [
                     {"role": "system", "content": "You are an assistant that classifies emails. If the email is medical debt insurance related, answer 'Yes', otherwise answer 'No'."},
                     {"role": "user", "content": f"Email content:\n\n{email_content}\n\nIs this an debt insurance related email? Answer only with 'Yes' or 'No'."}
                 ],
                 temperature=0
-            )
-            state['email_classification'] = response.choices[0].message.content.strip()
+            ).strip()
     except Exception as e:
         print(f"Final fallback classification error: {e}")
         if any(term in email_content.lower() for term in ['insurance', 'policy', 'claim', 'coverage', 'premium']):
@@ -300,6 +320,43 @@ def classification_router(state: AgentState):
     else:
         raise ValueError(f"Unexpected classification value: {classification}")
     
+@timed_node("reuse_draft")
+def reuse_approved_draft(state: AgentState):
+    """Adapt a previously approved reply when this email is a near-duplicate of one already answered."""
+    from my_agent.utils.draft_reuse import find_reusable_draft, adapt_draft, record_lookup
+    state['reused_draft'] = None
+    email = state.get('new_email')
+    if not email:
+        return state
+    
+    payload = email.get('payload', {})
+    headers = payload.get('headers', [])
+    subject = next((header['value'] for header in headers if header['name'] == 'Subject'), '')
+    sender = next((header['value'] for header in headers if header['name'] == 'From'), '')
+    body = get_email_body(payload)
+    email_content = f"From: {sender}\nSubject: {subject}\n\n{body}"
+    
+    started = time.perf_counter()
+    try:
+        match = find_reusable_draft(email_content)
+        if match:
+            print(f"[DraftReuse] Reusing approved '{match['email_type']}' draft {match['id']} (similarity {match['score']:.3f})")
+            state['llm_output'] = clean_response(adapt_draft(match, email_content))
+            state['needs_evaluation'] = False
+            state['needs_more_research'] = False
+            state['reused_draft'] = {key: match.get(key) for key in ("id", "score", "email_type", "source")}
+        else:
+            print("[DraftReuse] No close approved draft, running the full pipeline")
+    except Exception as e:
+        print(f"[DraftReuse] Reuse lookup failed, running the full pipeline: {e}")
+    record_lookup(bool(state['reused_draft']), time.perf_counter() - started)
+    state['generation_started_at'] = time.time()
+    return state
+
+def draft_reuse_router(state: AgentState):
+    return 'send_response' if state.get('reused_draft') else 'research'
+
+@timed_node("research")
 def research(state: AgentState):
     email = state.get('new_email')
     if not email:
@@ -314,8 +371,9 @@ def research(state: AgentState):
         if state.get('research_cycles', 0) > 0:
             print(f"RESEARCH CYCLE #{state['research_cycles']}")
         
-        web_search_tool = WebSearchTool()
-        print("[Research] WebSearchTool initialized in research function")
+        search_route = route_model(state, "web_search", default_model="gpt-4o")
+        web_search_tool = WebSearchTool(model=search_route["model"], max_tokens=search_route["max_tokens"])
+        print(f"[Research] WebSearchTool initialized in research function ({search_route['model']})")
         
         payload = email.get('payload', {})
         headers = payload.get('headers', [])
@@ -332,7 +390,7 @@ def research(state: AgentState):
             search_queries = state['additional_queries']
             print(f"[Research] Using additional queries from previous cycle: {search_queries}")
         else:
-            llm = get_llm()
+            llm, _ = get_routed_llm(state, "research_queries")
             query_prompt = ChatPromptTemplate.from_messages([
                 ("system", """Generate up to 3 focused search queries to help research this insurance-related email. 
 Format your response as a JSON list of query strings. 
@@ -361,28 +419,55 @@ Example: ["query 1", "query 2", "query 3"]"""),
         
         print(f"[Research] Final search queries: {search_queries}")
         
+        from my_agent.utils.tools import retrieve_memories_batch, format_memories
+        from my_agent.utils.memory_schema import extract_claim_ids
+        print(f"[Research] Checking memory for {len(search_queries)} queries and email context in one batch")
         memory_results = []
-        for query in search_queries:
-            print(f"[Research] Checking memory for: {query}")
-            try:
-                memory_hits = search_memory(query, limit=2)
-                if memory_hits:
-                    memory_results.append({
-                        "query": query,
-                        "source": "memory",
-                        "results": memory_hits
-                    })
-                    print(f"[Research] Found {len(memory_hits)} relevant memory results for: {query}")
-                else:
-                    print(f"[Research] No memory results for: {query}")
-            except Exception as memory_err:
-                print(f"[Research] Error searching memory for '{query}': {memory_err}")
+        retrieval = {"per_query": [[] for _ in search_queries], "covered": [False] * len(search_queries), "context": []}
+        try:
+            retrieval = retrieve_memories_batch(
+                search_queries,
+                query_limit=2,
+                context_query=f"{subject} {body[:500]}",
+                context_limit=5,
+                sender=sender,
+                thread_id=email.get('threadId'),
+                claim_ids=extract_claim_ids(email_content)
+            )
+            state['prefetched_memory_context'] = format_memories(retrieval["context"])
+        except Exception as memory_err:
+            print(f"[Research] Error searching memory: {memory_err}")
+        
+        for query, memory_hits, covered in zip(search_queries, retrieval["per_query"], retrieval["covered"]):
+            if memory_hits:
+                memory_results.append({
+                    "query": query,
+                    "source": "memory",
+                    "results": memory_hits
+                })
+                print(f"[Research] Found {len(memory_hits)} relevant memory results for: {query}")
+            elif covered:
+                memory_results.append({
+                    "query": query,
+                    "source": "memory",
+                    "results": []
+                })
+                print(f"[Research] Memory results for '{query}' already listed under another query")
+            else:
+                print(f"[Research] No memory results for: {query}")
         
         web_search_results = []
         for i, query in enumerate(search_queries):
             memory_match = any(r["query"] == query for r in memory_results)
             
             if not memory_match or len(memory_results) == 0:
+                # Checked per query: each search eats into the time left for generate.
+                if not has_time_for(state, "web_search", "generate"):
+                    skip_for_deadline(state, "web_search")
+                    skipped_queries = state['debug'].setdefault('deadline_skipped_queries', [])
+                    if query not in skipped_queries:
+                        skipped_queries.append(query)
+                    continue
                 print(f"\n{'*'*40}")
                 print(f"[Research] WEB SEARCH #{i+1}: {query}")
                 print(f"{'*'*40}")
@@ -430,6 +515,8 @@ Example: ["query 1", "query 2", "query 3"]"""),
         combined_results = existing_results.copy() 
         
         for mem_item in memory_results:
+            if not mem_item["results"]:
+                continue
             if not any(item['query'] == mem_item['query'] for item in combined_results):
                 formatted_results = ""
                 for hit in mem_item["results"]:
@@ -467,6 +554,7 @@ Example: ["query 1", "query 2", "query 3"]"""),
     
     return state
 
+@timed_node("memory_injection")
 def memory_injection(state: AgentState):
     email = state.get('new_email')
     if not email:
@@ -484,11 +572,25 @@ def memory_injection(state: AgentState):
         print("RETRIEVING RELEVANT MEMORIES")
         print("="*80)
         
-        search_context = f"{subject} {body[:500]}"
-        print(f"[Memory] Searching memories using context from email")
-        
-        from my_agent.utils.tools import get_relevant_memories
-        memory_context = get_relevant_memories(search_context)
+        if state.get('prefetched_memory_context') is not None:
+            print(f"[Memory] Using memories retrieved in the research batch")
+            memory_context = state['prefetched_memory_context']
+            state['prefetched_memory_context'] = None
+        else:
+            search_context = f"{subject} {body[:500]}"
+            print(f"[Memory] Searching memories using context from email")
+            
+            from my_agent.utils.tools import get_relevant_memories
+            from my_agent.utils.memory_schema import extract_claim_ids
+            claim_ids = extract_claim_ids(email_content)
+            if claim_ids:
+                print(f"[Memory] Prioritizing memories for claim identifiers: {claim_ids}")
+            memory_context = get_relevant_memories(
+                search_context,
+                sender=sender,
+                thread_id=email.get('threadId'),
+                claim_ids=claim_ids
+            )
         
         if memory_context:
             print(f"[Memory] Found relevant memories: \n{'-'*50}\n{memory_context}\n{'-'*50}")
@@ -519,7 +621,32 @@ def memory_injection(state: AgentState):
     
     return state
 
-def generate_response(state: AgentState):
+RESPONSE_SYSTEM_PROMPT = """You are a professional healthcare insurance advocate who specializes in responding to insurance claim denials and rejections. 
+Your responses should be formal, authoritative, and strategic, focusing on:
+
+1. Clearly citing specific policy provisions, medical codes, and legal requirements that support your position
+2. Assertively but professionally challenging any erroneous interpretations of coverage terms
+3. Providing well-structured, factual arguments supported by evidence from the policy documentation
+4. Using persuasive, professional language that emphasizes the medical necessity of treatments
+5. Referencing relevant precedents or regulations when applicable (such as state insurance laws)
+6. Including explicit follow-up steps and appeal procedures with specific timeframes
+7. Maintaining a firm but diplomatic tone throughout the correspondence
+
+IMPORTANT FORMATTING GUIDELINES:
+- Do NOT include the word 'Subject:' in your response - this will be added automatically by the email system
+- Do NOT use asterisks (*) for emphasis or formatting - use plain text only
+- Use numbered and bulleted lists without special formatting characters
+- Format sections with clear headings using ALL CAPS instead of any special formatting
+- For emphasis, use CAPITALIZATION or underscores like_this instead of asterisks
+
+For non-insurance emails, maintain a professional and courteous tone.
+
+Only provide the complete email text. Do not include any explanations, headers, or formatting instructions outside the email itself."""
+
+RESPONSE_HUMAN_PROMPT = "Email content:\n\n{email_content}{research_info}{cycle_info}\n\nWrite a professional response that addresses the insurance claim issues with appropriate negotiation strategies if applicable."
+
+def build_response_prompt(state: AgentState):
+    """Prompt template and inputs for drafting a reply."""
     email = state.get('new_email')
     payload = email.get('payload', {})
     headers = payload.get('headers', [])
@@ -545,40 +672,18 @@ def generate_response(state: AgentState):
     if state.get('research_cycles', 0) > 0:
         cycle_info = f"\n\nThis is research cycle #{state['research_cycles']}. If you need more information to provide a complete response, indicate this in your analysis."
     
-    system_prompt = """You are a professional healthcare insurance advocate who specializes in responding to insurance claim denials and rejections. 
-Your responses should be formal, authoritative, and strategic, focusing on:
-
-1. Clearly citing specific policy provisions, medical codes, and legal requirements that support your position
-2. Assertively but professionally challenging any erroneous interpretations of coverage terms
-3. Providing well-structured, factual arguments supported by evidence from the policy documentation
-4. Using persuasive, professional language that emphasizes the medical necessity of treatments
-5. Referencing relevant precedents or regulations when applicable (such as state insurance laws)
-6. Including explicit follow-up steps and appeal procedures with specific timeframes
-7. Maintaining a firm but diplomatic tone throughout the correspondence
-
-IMPORTANT FORMATTING GUIDELINES:
-- Do NOT include the word 'Subject:' in your response - this will be added automatically by the email system
-- Do NOT use asterisks (*) for emphasis or formatting - use plain text only
-- Use numbered and bulleted lists without special formatting characters
-- Format sections with clear headings using ALL CAPS instead of any special formatting
-- For emphasis, use CAPITALIZATION or underscores like_this instead of asterisks
-
-For non-insurance emails, maintain a professional and courteous tone.
-
-Only provide the complete email text. Do not include any explanations, headers, or formatting instructions outside the email itself."""
-    
     prompt = ChatPromptTemplate.from_messages([
-        ("system", system_prompt),
-        ("human", "Email content:\n\n{email_content}{research_info}{cycle_info}\n\nWrite a professional response that addresses the insurance claim issues with appropriate negotiation strategies if applicable.")
+        ("system", RESPONSE_SYSTEM_PROMPT),
+        ("human", RESPONSE_HUMAN_PROMPT)
     ])
-    
-    llm = get_llm()
-    chain = prompt | llm | StrOutputParser()
-    response = chain.invoke({
+    return prompt, {
         "email_content": email_content,
         "research_info": research_context,
         "cycle_info": cycle_info
-    })
+    }
+
+def clean_response(response: str) -> str:
+    """Strip markdown asterisks and any leading 'Subject:'/'Re:' header the model adds."""
     response = response.replace('*', '')
     if response.lstrip().startswith("Subject:"):
         response = "\n".join(response.split("\n")[1:])
@@ -586,14 +691,107 @@ Only provide the complete email text. Do not include any explanations, headers,
     if lines and lines[0].startswith("Re:"):
         lines[0] = lines[0][3:].lstrip()
         response = "\n".join(lines)
-    
+    return response
+
+def _store_draft(state: AgentState, response: str):
     state['llm_output'] = response
     state['needs_evaluation'] = True
     state['needs_more_research'] = False
+
+SELF_ASSESSMENT = os.getenv("RESPONSE_SELF_ASSESSMENT", "false").strip().lower() in ("1", "true", "yes", "on")
+SELF_ASSESSMENT_CONFIDENCE_THRESHOLD = float(os.getenv("RESPONSE_CONFIDENCE_THRESHOLD", "0.7"))
+
+SELF_ASSESSMENT_PROMPT = """
+
+After writing the reply, assess it yourself:
+- confidence: a number from 0 to 1 for how completely the reply addresses every point in the email using the research and past information provided
+- gap_queries: if specific facts are missing that a web search could supply (policy terms, state regulations, billing codes, appeal deadlines), up to 2 focused search queries for them; otherwise an empty list"""
+
+class DraftWithAssessment(BaseModel):
+    draft: str = Field(description="The complete email reply text")
+    confidence: float = Field(description="0-1 confidence that the reply fully addresses the email with the available information")
+    gap_queries: List[str] = Field(default_factory=list, description="Up to 2 search queries for missing information, empty if none are needed")
+
+def _generate_with_self_assessment(state: AgentState) -> bool:
+    """Draft and self-assess in one structured call; returns False if the model could not produce it."""
+    prompt, inputs = build_response_prompt(state)
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", RESPONSE_SYSTEM_PROMPT + SELF_ASSESSMENT_PROMPT),
+        ("human", RESPONSE_HUMAN_PROMPT)
+    ])
+    llm, decision = get_routed_llm(state, "generate")
+    started = time.perf_counter()
+    try:
+        result = (prompt | llm.with_structured_output(DraftWithAssessment)).invoke(inputs)
+        record_route_outcome(decision, time.perf_counter() - started, len(result.draft))
+    except Exception as e:
+        print(f"Self-assessed generation failed, falling back to separate evaluation: {e}")
+        return False
+    
+    _store_draft(state, clean_response(result.draft))
+    state['needs_evaluation'] = False
+    state['self_assessed'] = True
+    state['draft_confidence'] = result.confidence
+    gap_queries = [query for query in result.gap_queries if query.strip()][:2]
+    wants_research = result.confidence < SELF_ASSESSMENT_CONFIDENCE_THRESHOLD and gap_queries and state.get('research_cycles', 0) < 2
+    if wants_research and not has_time_for(state, "research", "generate"):
+        skip_for_deadline(state, "research_cycle")
+        wants_research = False
+    if wants_research:
+        state['research_cycles'] = state.get('research_cycles', 0) + 1
+        state['needs_more_research'] = True
+        state['additional_queries'] = gap_queries
+        print(f"Self-assessment: confidence {result.confidence:.2f}, researching gaps {gap_queries}")
+    else:
+        print(f"Self-assessment: confidence {result.confidence:.2f}, ready to send")
+    return True
+
+# Tags the plain-text drafting call so streaming clients can pick its tokens out of
+# stream_mode="messages" (the structured self-assessment call streams JSON instead).
+DRAFT_TOKENS_TAG = "draft_tokens"
+
+@timed_node("generate_response")
+def generate_response(state: AgentState):
+    state['self_assessed'] = False
+    if not (SELF_ASSESSMENT and _generate_with_self_assessment(state)):
+        prompt, inputs = build_response_prompt(state)
+        llm, decision = get_routed_llm(state, "generate")
+        started = time.perf_counter()
+        chain = prompt | llm | StrOutputParser()
+        _store_draft(state, clean_response(chain.invoke(inputs, config={"tags": [DRAFT_TOKENS_TAG]})))
+        record_route_outcome(decision, time.perf_counter() - started, len(state['llm_output']))
     
     print("Updated state in 'generate_response':", state)
     return state
 
+class DraftStreamCleaner:
+    """Turns raw draft tokens into increments of the cleaned draft.
+
+    Nothing is released until the first two lines are complete, since clean_response may
+    drop a 'Subject:' line or trim 'Re:' from the first line; after that the cleaned
+    text only grows, so each increment is the new suffix.
+    """
+
+    def __init__(self):
+        self.raw = ""
+        self.emitted = ""
+
+    def _release(self, cleaned: str) -> str:
+        if cleaned.startswith(self.emitted) and len(cleaned) > len(self.emitted):
+            delta, self.emitted = cleaned[len(self.emitted):], cleaned
+            return delta
+        return ""
+
+    def feed(self, token: str) -> str:
+        self.raw += token
+        if self.raw.lstrip().count("\n") < 2:
+            return ""
+        return self._release(clean_response(self.raw))
+
+    def finish(self) -> str:
+        return self._release(clean_response(self.raw))
+
+@timed_node("evaluate")
 def evaluate_response_quality(state: AgentState):
     if state.get('research_cycles', 0) >= 2:  
         print("\n" + "="*80)
@@ -604,6 +802,12 @@ def evaluate_response_quality(state: AgentState):
         state['needs_evaluation'] = False 
         return state
     
+    if not has_time_for(state, "evaluate", "research", "generate"):
+        skip_for_deadline(state, "evaluate")
+        state['needs_more_research'] = False
+        state['needs_evaluation'] = False
+        return state
+    
     email = state.get('new_email')
     if not email:
         print("No email to evaluate.")
@@ -631,7 +835,7 @@ def evaluate_response_quality(state: AgentState):
     
     research_results = state.get('research_results', [])
     print(f"Current research results: {len(research_results)}")
-    llm = get_llm()
+    llm, _ = get_routed_llm(state, "evaluate")
     
     evaluation_prompt = ChatPromptTemplate.from_messages([
         ("system", """You are a quality assurance specialist for an insurance advocacy service.
@@ -720,6 +924,7 @@ What specific information is missing? Generate focused search queries to fill th
     
     return state
 
+@timed_node("send_response")
 def send_email_response(state: AgentState):
     email = state.get('new_email')
     if not email:
@@ -751,7 +956,7 @@ def send_email_response(state: AgentState):
         message_id = f"<{email.get('id')}@gmail.com>"
     
     print(f"\n{'='*80}")
-    print(f"SENDING EMAIL RESPONSE")
+    print(f"QUEUEING EMAIL RESPONSE")
     print(f"{'='*80}")
     print(f"To: {sender}")
     print(f"Subject: {reply_subject}")
@@ -761,61 +966,63 @@ def send_email_response(state: AgentState):
     print(f"Message preview: {message_text[:200]}...")
     print(f"{'='*80}\n")
     
-    send_email(
-        service=service, 
-        to=sender, 
-        subject=reply_subject, 
+    from my_agent.utils.outbox import enqueue_reply
+    outbox = enqueue_reply(
+        service,
+        to=sender,
+        subject=reply_subject,
         message_text=message_text,
         thread_id=thread_id,
-        message_id=message_id
+        message_id=message_id,
+        idempotency_key=f"auto-reply-{email['id']}" if email.get('id') else None,
+        source="send_email_response",
+        # Indexed for reuse by the outbox once sent; an adapted draft is already stored.
+        approved_draft=None if state.get('reused_draft') else {"email_content": email_content, "email_id": email.get('id'), "sender": sender}
     )
+    state.setdefault('debug', {})['outbox_id'] = outbox['outbox_id']
+    
+    from my_agent.utils.draft_reuse import record_full_generation
+    if not state.get('reused_draft') and state.get('generation_started_at'):
+        record_full_generation(time.time() - state['generation_started_at'])
     
     print(f"\n{'='*80}")
-    print(f"EXTRACTING AND STORING MEMORY")
+    print(f"QUEUEING MEMORY EXTRACTION")
     print(f"{'='*80}")
     
-    from my_agent.utils.tools import extract_and_store_memory
+    from my_agent.utils.memory_jobs import enqueue_memory_extraction
     
     try:
         research_results = state.get('research_results', [])
         
-        memory_id = extract_and_store_memory(
+        job_id = enqueue_memory_extraction(
             email_content=email_content, 
             search_results=research_results, 
-            response=message_text
+            response=message_text,
+            sender=sender,
+            thread_id=thread_id
         )
         
-        if memory_id:
-            print(f"[Memory] Successfully stored conversation memory with ID: {memory_id}")
-            if 'debug' not in state:
-                state['debug'] = {}
-            state['debug']['memory_stored'] = True
-            state['debug']['memory_id'] = memory_id
-            
-            if 'stored_memories' not in state:
-                state['stored_memories'] = []
-            state['stored_memories'].append(memory_id)
-        else:
-            print("[Memory] Failed to store conversation memory")
-            if 'debug' not in state:
-                state['debug'] = {}
-            state['debug']['memory_stored'] = False
+        print(f"[Memory] Memory extraction will run in the background as job {job_id}")
+        if 'debug' not in state:
+            state['debug'] = {}
+        state['debug']['memory_job_id'] = job_id
+        
+        if 'memory_jobs' not in state:
+            state['memory_jobs'] = []
+        state['memory_jobs'].append(job_id)
             
     except Exception as e:
         import traceback
-        print(f"[Memory] Error storing memory: {e}")
+        print(f"[Memory] Error queueing memory extraction: {e}")
         print(traceback.format_exc())
         if 'debug' not in state:
             state['debug'] = {}
         state['debug']['memory_error'] = str(e)
     
-    print(f"{'='*80}")
-    print(f"MEMORY EXTRACTION COMPLETE")
-    print(f"{'='*80}\n")
-    
-    print(f"Email sent in response to: {subject}, and state updated.")
+    print(f"Reply to '{subject}' queued in the outbox as {outbox['outbox_id']}, and state updated.")
     return state
         
+@timed_node("flag_email")
 def flag_email(state: AgentState):
     email = state.get('new_email')
     if not email:
@@ -849,31 +1056,13 @@ def flag_email(state: AgentState):
         print(f"Email {email_id} processed without Gmail API interaction. State updated.")
         return state
     
+    from my_agent.utils.gmail_labels import label_buffer
     try:
         label_id = get_or_create_label(service, label_name)
-        service.users().messages().modify(
-            userId='me',
-            id=email_id,
-            body={
-                'addLabelIds': [label_id],
-                'removeLabelIds': []
-            }
-        ).execute()
-        print(f"Email labeled as '{label_name}'")
+        label_buffer.queue(service, email_id, add=[label_id], remove=['UNREAD'])
+        print(f"Queued '{label_name}' label and read marker ({label_buffer.pending()} messages pending)")
     except Exception as e:
-        print(f"Error adding label to email: {e}")
-    
-    try:
-        service.users().messages().modify(
-            userId='me',
-            id=email_id,
-            body={
-                'removeLabelIds': ['UNREAD']
-            }
-        ).execute()
-        print(f"Email marked as read (UNREAD label removed)")
-    except Exception as e:
-        print(f"Error marking email as read: {e}")
+        print(f"Error labeling email: {e}")
     
     state['new_email'] = None
     if 'processed_email_ids' not in state:
@@ -883,7 +1072,7 @@ def flag_email(state: AgentState):
         state['processed_email_ids'].append(email_id)
         print(f"Added email ID {email_id} to processed list")
     
-    print(f"Email {email_id} flagged and marked as read. State updated.")
+    print(f"Email {email_id} queued for labeling and marking as read. State updated.")
     return state
 
 def response_evaluation_router(state: AgentState):
@@ -893,6 +1082,13 @@ def response_evaluation_router(state: AgentState):
         state['needs_evaluation'] = False  
         return 'send_response'
     
+    if state.get('needs_more_research') and not has_time_for(state, "research", "generate"):
+        skip_for_deadline(state, "research_cycle")
+        state['needs_more_research'] = False
+        return 'send_response'
+
+    if state.get('self_assessed'):
+        return 'research' if state.get('needs_more_research') else 'send_response'
 
     routing_from_generate_response = state.get('needs_evaluation', False)
     routing_from_evaluate = not state.get('needs_evaluation', True) and state.get('needs_more_research') is not None
@@ -918,6 +1114,8 @@ def email_polling_router(state: AgentState):
         return 'check_emails'
     
     print("Email polling complete, no new emails found")
+    from my_agent.utils.gmail_labels import label_buffer
+    label_buffer.flush()
     return '__end__'
 
 def send_confirmed_email(draft_data):
@@ -942,18 +1140,27 @@ def send_confirmed_email(draft_data):
                 "error": "Gmail service not initialized"
             }
         
-        send_email(
-            service=service, 
-            to=to, 
-            subject=subject, 
+        from my_agent.utils.outbox import enqueue_reply
+        outbox = enqueue_reply(
+            service,
+            to=to,
+            subject=subject,
             message_text=message_text,
             thread_id=thread_id,
-            message_id=message_id
+            message_id=message_id,
+            idempotency_key=draft_data.get('idempotency_key'),
+            source="send_confirmed_email",
+            approved_draft={
+                "email_content": f"From: {to}\nSubject: {draft_data.get('original_subject', subject)}\n\n{draft_data['original_body']}",
+                "email_id": draft_data.get('email_id'),
+                "sender": to
+            } if draft_data.get('original_body') and not draft_data.get('reused_draft') else None
         )
         
         return {
             "success": True,
-            "message": f"Email sent successfully to {to}"
+            "message": f"Email to {to} queued for sending" if outbox['created'] else f"Email to {to} was already queued",
+            "outbox_id": outbox['outbox_id']
         }
         
     except Exception as e:
@@ -0,0 +1,160 @@
+import os
+import time
+import hashlib
+import threading
+from typing import Any, Dict, Optional
+
+from my_agent.utils.job_queue import DurableJobQueue
+
+OUTBOX_SENDS_PER_MINUTE = float(os.getenv("OUTBOX_SENDS_PER_MINUTE", "20"))
+OUTBOX_MESSAGE_ID_DOMAIN = os.getenv("OUTBOX_MESSAGE_ID_DOMAIN", "insurance-agent.local")
+
+_service = None
+
+
+class RateLimiter:
+    """Spaces calls at least 60/per_minute seconds apart across all worker threads."""
+
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.time()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+_rate_limiter = RateLimiter(OUTBOX_SENDS_PER_MINUTE)
+
+
+def reply_idempotency_key(to: str, message_text: str, thread_id: Optional[str] = None, message_id: Optional[str] = None) -> str:
+    raw = "\x1f".join([(to or "").strip().lower(), message_id or thread_id or "", (message_text or "").strip()])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def _index_sent_reply(payload: Dict[str, Any]):
+    # Only replies Gmail has accepted become reusable drafts; an indexing failure must
+    # not fail (and re-send) the job.
+    try:
+        from my_agent.utils.draft_reuse import store_sent_draft
+        store_sent_draft(payload)
+    except Exception as e:
+        print(f"[Outbox] Could not index sent reply {payload['idempotency_key']}: {e}")
+
+
+def _send_reply(payload: Dict[str, Any]) -> Dict[str, Any]:
+    from my_agent.utils.tools import send_email, find_sent_message
+
+    if _service is None:
+        raise RuntimeError("Gmail service not registered with the outbox")
+    key = payload["idempotency_key"]
+    # Checked before every send, not only on retries: a crash after send() but before the
+    # job was marked done leaves the row looking like a first attempt.
+    sent_id = find_sent_message(_service, payload["outgoing_message_id"])
+    if sent_id:
+        print(f"[Outbox] Reply {key} already in Sent as {sent_id}, not resending")
+        _index_sent_reply(payload)
+        return {"gmail_message_id": sent_id, "deduplicated": True}
+    _rate_limiter.wait()
+    sent = send_email(
+        service=_service,
+        to=payload["to"],
+        subject=payload["subject"],
+        message_text=payload["message_text"],
+        thread_id=payload.get("thread_id"),
+        message_id=payload.get("message_id"),
+        outgoing_message_id=payload["outgoing_message_id"]
+    )
+    _index_sent_reply(payload)
+    return {"gmail_message_id": sent.get("id"), "thread_id": sent.get("threadId"), "deduplicated": False}
+
+
+outbox_queue = DurableJobQueue(
+    name="outbox",
+    handler=_send_reply,
+    max_workers=int(os.getenv("OUTBOX_WORKERS", "1")),
+    max_attempts=int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5")),
+    backoff_seconds=float(os.getenv("OUTBOX_RETRY_BACKOFF_SECONDS", "10")),
+)
+
+
+def start_outbox(service):
+    """Register the Gmail service used by the sender worker and start draining the outbox."""
+    global _service
+    if service is not None:
+        _service = service
+    outbox_queue.start()
+
+
+def drain_outbox(timeout: float = float(os.getenv("OUTBOX_DRAIN_SECONDS", "60"))) -> bool:
+    """Block until queued replies are sent (or have failed), for processes about to exit.
+
+    A no-op in a process that never started the outbox (it has no Gmail service to send with).
+    """
+    if _service is None or not outbox_queue.stats()["running"]:
+        return True
+    return outbox_queue.drain(timeout)
+
+
+def enqueue_reply(
+    service,
+    to: str,
+    subject: str,
+    message_text: str,
+    thread_id: Optional[str] = None,
+    message_id: Optional[str] = None,
+    idempotency_key: Optional[str] = None,
+    source: Optional[str] = None,
+    approved_draft: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """Durably queue a reply; the same idempotency key is only ever sent once.
+
+    Without an explicit key, the key is derived from recipient, the message being
+    replied to and the text, so re-running the same step does not double-send.
+    `approved_draft` ({"email_content", "email_id", "sender"} of the email being
+    answered) has the reply indexed for draft reuse after it is sent.
+    """
+    start_outbox(service)
+    key = idempotency_key or reply_idempotency_key(to, message_text, thread_id, message_id)
+    created = outbox_queue.enqueue_unique({
+        "idempotency_key": key,
+        "outgoing_message_id": f"<{key}@{OUTBOX_MESSAGE_ID_DOMAIN}>",
+        "to": to,
+        "subject": subject,
+        "message_text": message_text,
+        "thread_id": thread_id,
+        "message_id": message_id,
+        "source": source,
+        "approved_draft": approved_draft
+    }, key)
+    if created:
+        print(f"[Outbox] Queued reply {key} to {to}")
+    else:
+        print(f"[Outbox] Reply {key} already queued or sent, skipping duplicate")
+    return {"outbox_id": key, "created": created}
+
+
+def get_outbox_status(limit: int = 20) -> Dict[str, Any]:
+    status = outbox_queue.stats()
+    status["sends_per_minute"] = OUTBOX_SENDS_PER_MINUTE
+    status["recent"] = [
+        {
+            "id": job["id"],
+            "status": job["status"],
+            "to": job["payload"].get("to"),
+            "subject": job["payload"].get("subject"),
+            "source": job["payload"].get("source"),
+            "attempts": job["attempts"],
+            "result": job["result"],
+            "last_error": job["last_error"].splitlines()[0] if job["last_error"] else None,
+            "created_at": job["created_at"],
+            "updated_at": job["updated_at"]
+        }
+        for job in outbox_queue.recent(limit=limit)
+    ]
+    return status
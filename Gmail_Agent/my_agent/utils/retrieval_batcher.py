@@ -0,0 +1,93 @@
+import os
+import threading
+from contextlib import contextmanager
+from typing import Callable, List, Optional
+
+RETRIEVAL_BATCH_WINDOW_MS = float(os.getenv("RETRIEVAL_BATCH_WINDOW_MS", "25"))
+RETRIEVAL_BATCH_MAX_QUERIES = int(os.getenv("RETRIEVAL_BATCH_MAX_QUERIES", "64"))
+
+_context = threading.local()
+
+
+class _Request:
+    def __init__(self, queries, limit, memory_filters):
+        self.queries = queries
+        self.limit = limit
+        self.memory_filters = memory_filters
+        self.done = threading.Event()
+        self.results = None
+        self.error = None
+
+
+class RetrievalBatcher:
+    """Merges memory searches from concurrent pipeline threads into shared batches.
+
+    The first caller in a window waits up to RETRIEVAL_BATCH_WINDOW_MS (or until
+    RETRIEVAL_BATCH_MAX_QUERIES are pending), then runs every pending request as one
+    `search_fn` call (one embedding call, one Qdrant round trip) and hands each caller
+    its own slice. Results are fetched without cross-query dedup and trimmed to each
+    request's limit, so callers get what an unbatched search would return.
+    """
+
+    def __init__(self, search_fn: Callable, window_ms: float = RETRIEVAL_BATCH_WINDOW_MS, max_queries: int = RETRIEVAL_BATCH_MAX_QUERIES):
+        self.search_fn = search_fn
+        self.window_seconds = window_ms / 1000.0
+        self.max_queries = max_queries
+        self._pending: List[_Request] = []
+        self._lock = threading.Lock()
+        self._full = threading.Event()
+        self.batches = 0
+        self.requests = 0
+
+    def search(self, queries: List[str], limit: int, memory_filters: Optional[List] = None) -> List[List]:
+        request = _Request(list(queries), limit, list(memory_filters or [None] * len(queries)))
+        with self._lock:
+            self._pending.append(request)
+            self.requests += 1
+            leader = len(self._pending) == 1
+            if sum(len(r.queries) for r in self._pending) >= self.max_queries:
+                self._full.set()
+        if leader:
+            self._full.wait(self.window_seconds)
+            self._run_batch()
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.results
+
+    def _run_batch(self):
+        with self._lock:
+            batch, self._pending = self._pending, []
+            self._full.clear()
+            self.batches += 1
+        queries = [query for request in batch for query in request.queries]
+        filters = [memory_filter for request in batch for memory_filter in request.memory_filters]
+        try:
+            results = self.search_fn(queries, max(request.limit for request in batch), filters)
+            offset = 0
+            for request in batch:
+                request.results = [hits[:request.limit] for hits in results[offset:offset + len(request.queries)]]
+                offset += len(request.queries)
+        except Exception as e:
+            for request in batch:
+                request.error = e
+        for request in batch:
+            request.done.set()
+
+    def stats(self):
+        return {"requests": self.requests, "batches": self.batches}
+
+
+def active_batcher() -> Optional[RetrievalBatcher]:
+    return getattr(_context, "batcher", None)
+
+
+@contextmanager
+def batched_retrieval(batcher: RetrievalBatcher):
+    """Route this thread's memory searches through `batcher` for the duration of the block."""
+    previous = active_batcher()
+    _context.batcher = batcher
+    try:
+        yield batcher
+    finally:
+        _context.batcher = previous
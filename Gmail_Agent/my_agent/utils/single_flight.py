@@ -0,0 +1,80 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict
+
+SINGLE_FLIGHT_RESULT_TTL_SECONDS = float(os.getenv("SINGLE_FLIGHT_RESULT_TTL_SECONDS", "30"))
+SINGLE_FLIGHT_MAX_RESULTS = int(os.getenv("SINGLE_FLIGHT_MAX_RESULTS", "256"))
+
+
+def email_request_key(email: Dict[str, Any]) -> str:
+    """Email id plus a hash of the whole payload, so an edited email with the same id is a new request."""
+    digest = hashlib.sha256(json.dumps(email, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+    return f"{email.get('id', '')}:{digest[:32]}"
+
+
+class SingleFlight:
+    """Coalesces concurrent async calls with the same key onto one in-flight task.
+
+    Callers that arrive while a task for their key is running await that task; its
+    result is then served to later callers for `ttl_seconds`. Failures are shared
+    with the callers already waiting but never cached. Must be used from a single
+    event loop (the API's), so no locking is needed.
+    """
+
+    def __init__(self, ttl_seconds: float = SINGLE_FLIGHT_RESULT_TTL_SECONDS, max_results: int = SINGLE_FLIGHT_MAX_RESULTS):
+        self.ttl_seconds = ttl_seconds
+        self.max_results = max_results
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._results: "OrderedDict[str, tuple]" = OrderedDict()
+        self.leaders = 0
+        self.coalesced = 0
+        self.cached_hits = 0
+
+    def _cached(self, key: str):
+        entry = self._results.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.time():
+            del self._results[key]
+            return None
+        return value
+
+    def _finish(self, key: str, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        if task.cancelled() or task.exception() is not None or self.ttl_seconds <= 0:
+            return
+        self._results[key] = (time.time() + self.ttl_seconds, task.result())
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_results:
+            self._results.popitem(last=False)
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        cached = self._cached(key)
+        if cached is not None:
+            self.cached_hits += 1
+            return cached
+        task = self._inflight.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done, key=key: self._finish(key, done))
+        else:
+            self.coalesced += 1
+        # A caller that disconnects must not cancel the run other callers are waiting on.
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._inflight),
+            "cached_results": len(self._results),
+            "ttl_seconds": self.ttl_seconds,
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "cached_hits": self.cached_hits
+        }
@@ -0,0 +1,82 @@
+import os
+import re
+import zlib
+from collections import Counter
+from typing import List
+
+from qdrant_client.http import models as rest
+
+SPARSE_VECTOR_NAME = "text-sparse"
+BM25_K1 = float(os.getenv("MEMORY_BM25_K1", "1.2"))
+BM25_B = float(os.getenv("MEMORY_BM25_B", "0.75"))
+BM25_AVG_DOC_LENGTH = float(os.getenv("MEMORY_BM25_AVG_DOC_LENGTH", "200"))
+
+_TOKEN_RE = re.compile(r"[A-Za-z0-9]+(?:[.\-/][A-Za-z0-9]+)*")
+_SEPARATOR_RE = re.compile(r"[.\-/]")
+
+STOPWORDS = frozenset("""
+a an and are as at be been but by can could did do does for from had has have he her his i if in into is it its
+me my no not of on or our she so that the their them then there these they this to too us was we were what when
+which who will with would you your re fw fwd please thank thanks regards dear hi hello
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into BM25 terms, keeping identifiers intact.
+
+    Tokens containing digits (claim and policy numbers, CPT/ICD codes such as 99213 or
+    J45.909, NPIs) are kept whole, lowercased, and also indexed without separators and
+    as their separated parts, so "99-88771", "9988771" and "J45" all match. Plain words
+    are split on separators and stopwords are dropped.
+    """
+    tokens = []
+    for raw in _TOKEN_RE.findall(text or ""):
+        token = raw.lower()
+        if any(ch.isdigit() for ch in token):
+            tokens.append(token)
+            parts = _SEPARATOR_RE.split(token)
+            if len(parts) > 1:
+                tokens.append("".join(parts))
+                tokens.extend(part for part in parts if len(part) >= 3)
+        else:
+            tokens.extend(
+                part for part in _SEPARATOR_RE.split(token)
+                if len(part) > 1 and part not in STOPWORDS
+            )
+    return tokens
+
+
+def _term_index(term: str) -> int:
+    return zlib.crc32(term.encode("utf-8")) & 0x7FFFFFFF
+
+
+def _to_sparse(weights) -> rest.SparseVector:
+    indices, values = [], []
+    for index, value in sorted(weights.items()):
+        indices.append(index)
+        values.append(float(value))
+    return rest.SparseVector(indices=indices, values=values)
+
+
+def encode_document(text: str) -> rest.SparseVector:
+    """BM25 term-frequency weights for a stored memory.
+
+    IDF is applied by Qdrant at query time (the sparse vector is configured with the
+    IDF modifier), so the stored weights only carry the saturated, length-normalized tf.
+    """
+    tokens = tokenize(text)
+    counts = Counter(tokens)
+    length_norm = 1 - BM25_B + BM25_B * (len(tokens) / BM25_AVG_DOC_LENGTH)
+    weights = {}
+    for term, tf in counts.items():
+        index = _term_index(term)
+        weights[index] = weights.get(index, 0.0) + tf * (BM25_K1 + 1) / (tf + BM25_K1 * length_norm)
+    return _to_sparse(weights)
+
+
+def encode_query(text: str) -> rest.SparseVector:
+    return _to_sparse({_term_index(term): 1.0 for term in set(tokenize(text))})
+
+
+def sparse_vector_config() -> dict:
+    return {SPARSE_VECTOR_NAME: rest.SparseVectorParams(modifier=rest.Modifier.IDF)}
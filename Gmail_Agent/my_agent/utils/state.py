@@ -5,17 +5,26 @@ class AgentState(TypedDict, total=False):
     initialized: bool
     new_email: Optional[Dict[str, Any]]
     email_classification: str
+    classification_confidence: Optional[float]
+    latency_budget_seconds: Optional[float]
+    deadline: Optional[float]
     llm_output: str
     processed_email_ids: List[str]
     error: str
     messages: List[Dict[str, Any]]
     research_results: List[Dict[str, Any]]
     memory_context: str
+    prefetched_memory_context: Optional[str]
     stored_memories: List[str]
+    memory_jobs: List[str]
     debug: Dict[str, Any] 
     research_cycles: int 
     needs_evaluation: bool
     needs_more_research: bool 
     additional_queries: List[str]
+    draft_confidence: Optional[float]
+    self_assessed: bool
+    reused_draft: Optional[Dict[str, Any]]
+    generation_started_at: float
     polling_cycle: int 
     continue_polling: bool 
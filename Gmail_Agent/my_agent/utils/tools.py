@@ -5,7 +5,7 @@ import re
 import uuid
 import datetime
 import json
-from typing import List, Dict
+from typing import List, Dict, Optional
 from dotenv import load_dotenv
 from langchain_community.agent_toolkits import GmailToolkit
 from langchain_community.tools.gmail.utils import build_resource_service, get_gmail_credentials
@@ -14,9 +14,15 @@ from langchain_core.documents import Document
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from openai import OpenAI
-from langchain_community.vectorstores import Qdrant
-from langchain_openai import OpenAIEmbeddings
-from qdrant_client import QdrantClient
+from qdrant_client.http import models as rest
+from my_agent.utils.memory_schema import MEMORY_COLLECTION, extract_memory_tags, build_memory_filter, memory_search_params
+from my_agent.utils.sparse_encoder import SPARSE_VECTOR_NAME, encode_document, encode_query
+from my_agent.utils.memory_service import get_vectorstore, hybrid_search_enabled
+from my_agent.utils.memory_hot_tier import get_hot_tier, hot_tier_add
+from my_agent.utils.llm_cache import cached_chat_completion, cached_llm_call
+from my_agent.utils.model_router import route_for_email
+from my_agent.utils.retrieval_batcher import active_batcher
+from my_agent.utils.metrics import track, record_openai_usage
 
 load_dotenv()
 
@@ -27,36 +33,17 @@ else:
     print(f"Using OpenAI API key")
 
 openai_client = None
-embeddings = None
-vectorstore = None
 
 if openai_api_key:
     openai_client = OpenAI(api_key=openai_api_key)
-    embeddings = OpenAIEmbeddings(api_key=openai_api_key)
-    
-    try:
-        qdrant_url = os.getenv("QDRANT_URL")
-        qdrant_api_key = os.getenv("QDRANT_API_KEY")
-        
-        if qdrant_url:
-            client = QdrantClient(url=qdrant_url, api_key=qdrant_api_key)
-            print(f"Connected to Qdrant cloud at {qdrant_url}")
-        else:
-            client = QdrantClient(path="./qdrant_db")
-            print("Connected to local Qdrant database")
-        
-        vectorstore = Qdrant(
-            client=client,
-            collection_name="insurance_research",
-            embeddings=embeddings,
-        )
-        print("Qdrant vector store initialized successfully")
-    except Exception as e:
-        print(f"Warning: Could not initialize Qdrant vector store: {e}")
-else:
-    print("Warning: Cannot initialize OpenAI client and vector store without an API key")
 
-def send_email(service, to, subject, message_text, user_id="me", thread_id=None, message_id=None):
+def send_email(service, to, subject, message_text, user_id="me", thread_id=None, message_id=None, outgoing_message_id=None):
+    """Send one message; errors propagate so the caller (the outbox) can retry with backoff.
+
+    `outgoing_message_id` sets the Message-ID header so a retry can find an earlier
+    attempt in Sent. If Gmail rejects `thread_id`, the send is repeated once without it;
+    In-Reply-To/References are kept so clients still thread the reply.
+    """
     email_match = re.search(r'<?([\w._%+-]+@[\w.-]+\.[a-zA-Z]{2,})>?', to)
     
     if email_match:
@@ -69,6 +56,8 @@ def send_email(service, to, subject, message_text, user_id="me", thread_id=None,
     message = MIMEMultipart()
     message["to"] = to_email
     message["subject"] = subject
+    if outgoing_message_id:
+        message["Message-ID"] = outgoing_message_id
     
     if message_id:
         message["In-Reply-To"] = message_id
@@ -85,15 +74,25 @@ def send_email(service, to, subject, message_text, user_id="me", thread_id=None,
     
     try:
         sent_message = service.users().messages().send(userId=user_id, body=message_body).execute()
-        print(f"Email sent: ID {sent_message['id']}" + (f" in thread: {thread_id}" if thread_id else ""))
-        return sent_message
     except Exception as e:
-        print(f"Error sending email: {str(e)}")
-        if thread_id or message_id:
-            print("Retrying without threading information...")
-            return send_email(service, to, subject, message_text, user_id)
-        else:
+        status = getattr(getattr(e, "resp", None), "status", None)
+        if not thread_id or status not in (400, 404) or "thread" not in str(e).lower():
             raise
+        print(f"Gmail rejected thread ID {thread_id}, sending with reply headers only: {e}")
+        sent_message = service.users().messages().send(userId=user_id, body={"raw": raw}).execute()
+    print(f"Email sent: ID {sent_message['id']}" + (f" in thread: {sent_message.get('threadId')}" if sent_message.get('threadId') else ""))
+    return sent_message
+
+
+def find_sent_message(service, outgoing_message_id, user_id="me"):
+    """Id of a message in Sent with this Message-ID header, or None."""
+    results = service.users().messages().list(
+        userId=user_id,
+        q=f"in:sent rfc822msgid:{outgoing_message_id.strip('<>')}",
+        maxResults=1
+    ).execute()
+    messages = results.get('messages', [])
+    return messages[0]['id'] if messages else None
 
 
 def get_email_body(payload):
@@ -118,22 +117,13 @@ def get_email_body(payload):
 
 
 def get_or_create_label(service, label_name):
-    labels = service.users().labels().list(userId='me').execute().get('labels', [])
-    label = next((label for label in labels if label['name'] == label_name), None)
-    if label:
-        return label['id']
-    else:
-        label_body = {
-            'name': label_name,
-            'labellistVisibility': 'labelShow',
-            'messagelistVisibility': 'show',
-            'type': 'user'
-        }
-        label = service.users().labels().create(userId='me', body=label_body).execute()
-        return label['id']
+    from my_agent.utils.gmail_labels import get_label_id
+    return get_label_id(service, label_name)
 
 class WebSearchTool(BaseTool):
     name: str = "web_search"
+    model: str = "gpt-4o"
+    max_tokens: Optional[int] = None
     description: str = """Search the internet for up-to-date information. Use this tool when:
 1. You need to find current facts, news, or information not in your knowledge base
 2. You need current date, time, weather, or other time-sensitive information
@@ -152,15 +142,17 @@ class WebSearchTool(BaseTool):
         local_client = OpenAI(api_key=api_key)
         print(f"[WebSearchTool] Created local OpenAI client with API key: {api_key[:4]}...{api_key[-4:]}")
         
+        limits = {"max_tokens": self.max_tokens} if self.max_tokens else {}
         try:
             print(f"[WebSearchTool] Performing search for: '{query}'")
             
             try:
                 if "insurance" in query.lower() or "policy" in query.lower() or "claim" in query.lower() or "appeal" in query.lower():
                     print("[WebSearchTool] Using specialized insurance research approach")
-                    completion = local_client.chat.completions.create(
-                        model="gpt-4o",
-                        messages=[
+                    search_result = cached_chat_completion(
+                        local_client,
+                        self.model,
+                        [
                             {"role": "system", "content": """You are a specialized insurance researcher with access to the latest insurance regulations and practices. 
                             
 For each query, provide a detailed, up-to-date answer that includes:
@@ -174,9 +166,9 @@ IMPORTANT: If information might be outdated (pre-2025), explicitly note this and
 Format your response with clear headings and bullet points for easy reading."""},
                             {"role": "user", "content": query}
                         ],
-                        temperature=0.2
+                        temperature=0.2,
+                        **limits
                     )
-                    search_result = completion.choices[0].message.content
                     
                     search_result += "\n\n[NOTE: For the most current and authoritative information, please verify with your state's insurance department or the relevant federal agency as regulations may have changed recently.]"
                 else:
@@ -186,26 +178,38 @@ Format your response with clear headings and bullet points for easy reading."""}
                     if has_responses_api:
                         print("[WebSearchTool] Using OpenAI responses API with web search")
                         try:
-                            response = local_client.responses.create(
-                                model="gpt-4o",
-                                tools=[{"type": "web_search_preview"}],
-                                input=query
-                            )
-                            print("[WebSearchTool] Successfully called responses.create API")
+                            def web_search():
+                                with track("openai", "responses_web_search"):
+                                    response = local_client.responses.create(
+                                        model=self.model,
+                                        tools=[{"type": "web_search_preview"}],
+                                        input=query,
+                                        **({"max_output_tokens": self.max_tokens} if self.max_tokens else {})
+                                    )
+                                record_openai_usage(self.model, response)
+                                print("[WebSearchTool] Successfully called responses.create API")
+                                
+                                result = ""
+                                if hasattr(response, 'output') and response.output:
+                                    for output_item in response.output:
+                                        if hasattr(output_item, 'content') and output_item.content:
+                                            for content_item in output_item.content:
+                                                if hasattr(content_item, 'text'):
+                                                    result = content_item.text
+                                                    break
+                            
+                                if not result and hasattr(response, 'text'):
+                                    result = response.text
+                                if not result:
+                                    result = str(response)
+                                return result
                             
-                            search_result = ""
-                            if hasattr(response, 'output') and response.output:
-                                for output_item in response.output:
-                                    if hasattr(output_item, 'content') and output_item.content:
-                                        for content_item in output_item.content:
-                                            if hasattr(content_item, 'text'):
-                                                search_result = content_item.text
-                                                break
-                        
-                            if not search_result and hasattr(response, 'text'):
-                                search_result = response.text
-                            if not search_result:
-                                search_result = str(response)
+                            search_result = cached_llm_call(
+                                self.model,
+                                {"tools": ["web_search_preview"], **limits},
+                                [{"role": "user", "content": query}],
+                                web_search
+                            )
                         except Exception as e:
                             print(f"[WebSearchTool] Error with responses API: {e}. Falling back to standard completions.")
                             raise RuntimeError("Failed to use responses API") from e
@@ -214,9 +218,10 @@ Format your response with clear headings and bullet points for easy reading."""}
                         raise AttributeError("responses API not available")
             except Exception as api_error:
                 print(f"[WebSearchTool] Falling back to standard completions due to: {str(api_error)}")
-                completion = local_client.chat.completions.create(
-                    model="gpt-4o",
-                    messages=[
+                search_result = cached_chat_completion(
+                    local_client,
+                    self.model,
+                    [
                         {"role": "system", "content": """You are a helpful web search assistant. When responding:
 1. Provide comprehensive, factual information based on your knowledge
 2. Clearly indicate when information might be outdated (your training only includes data until 2023)
@@ -227,9 +232,9 @@ Format your response with clear headings and bullet points for easy reading."""}
 When answering questions about current events, policies, or time-sensitive information, recommend verifying with up-to-date sources."""},
                         {"role": "user", "content": f"Search query: {query}\n\nPlease provide comprehensive information about this topic, including recent developments you're aware of. Note your knowledge limitations where appropriate."}
                     ],
-                    temperature=0.2
+                    temperature=0.2,
+                    **limits
                 )
-                search_result = completion.choices[0].message.content
             
             print("[WebSearchTool] Successfully received search results")
             
@@ -240,7 +245,7 @@ When answering questions about current events, policies, or time-sensitive infor
             print(f"[WebSearchTool] Result preview:\n{preview}")
             
             try:
-                if vectorstore:
+                if get_vectorstore():
                     doc_id = str(uuid.uuid4())
                     document = Document(
                         page_content=f"Web search for '{query}': {search_result}",
@@ -248,10 +253,11 @@ When answering questions about current events, policies, or time-sensitive infor
                             "source": "web_search", 
                             "query": query, 
                             "id": doc_id, 
-                            "timestamp": datetime.datetime.now().isoformat()
+                            "timestamp": datetime.datetime.now().isoformat(),
+                            **extract_memory_tags(query)
                         }
                     )
-                    vectorstore.add_documents([document])
+                    add_memory_document(document)
                     print(f"[WebSearchTool] Saved search result to Qdrant memory with ID: {doc_id}")
             except Exception as e:
                 print(f"[WebSearchTool] Warning: Could not save search result to vector store: {e}")
@@ -268,84 +274,262 @@ When answering questions about current events, policies, or time-sensitive infor
         raise NotImplementedError("This tool does not support async")
 
 
-def search_memory(query: str, limit: int = 3) -> List[Dict]:
-    if not vectorstore:
-        return []
+def add_memory_document(document: Document) -> str:
+    """Embed and upsert one memory, with its BM25 sparse vector when hybrid search is on.
+
+    The payload keeps LangChain's page_content/metadata layout so the Qdrant
+    vectorstore wrapper can still read these points.
+    """
+    vectorstore = get_vectorstore()
+    doc_id = document.metadata.get("id") or str(uuid.uuid4())
+    with track("embeddings", "embed_documents"):
+        dense = vectorstore.embeddings.embed_documents([document.page_content])[0]
+    vector = {"": dense, SPARSE_VECTOR_NAME: encode_document(document.page_content)} if hybrid_search_enabled() else dense
+    payload = {"page_content": document.page_content, "metadata": document.metadata}
+    with track("qdrant", "upsert"):
+        vectorstore.client.upsert(
+            collection_name=MEMORY_COLLECTION,
+            points=[rest.PointStruct(id=doc_id, vector=vector, payload=payload)]
+        )
+    hot_tier_add(doc_id, dense, payload)
+    return doc_id
+
+def search_memory(query: str, limit: int = 3, memory_filter=None) -> List[Dict]:
+    return search_memory_batch([query], limit=limit, memory_filters=[memory_filter], dedup=False)[0]
+
+def _memory_query_request(dense, query: str, memory_filter, limit: int, search_params) -> rest.QueryRequest:
+    if not hybrid_search_enabled():
+        return rest.QueryRequest(
+            query=dense,
+            filter=memory_filter,
+            limit=limit,
+            params=search_params,
+            with_payload=True
+        )
+    prefetch_limit = max(limit * 4, 20)
+    return rest.QueryRequest(
+        prefetch=[
+            rest.Prefetch(query=dense, filter=memory_filter, limit=prefetch_limit, params=search_params),
+            rest.Prefetch(query=encode_query(query), using=SPARSE_VECTOR_NAME, filter=memory_filter, limit=prefetch_limit)
+        ],
+        query=rest.FusionQuery(fusion=rest.Fusion.RRF),
+        limit=limit,
+        with_payload=True
+    )
+
+def _memory_key(memory: Dict) -> str:
+    return memory.get('metadata', {}).get('id') or memory.get('point_id') or memory['content']
+
+def _memory_from_point(point) -> Dict:
+    payload = point.payload or {}
+    return {
+        "content": payload.get("page_content", ""),
+        "metadata": payload.get("metadata", {}) or {},
+        "relevance_score": float(point.score),
+        "point_id": str(point.id)
+    }
+
+def dedupe_across_queries(results: List[List[Dict]]) -> List[List[Dict]]:
+    """Keep each memory only under the query it scored highest for (first query wins ties)."""
+    best = {}
+    for query_index, memories in enumerate(results):
+        for memory in memories:
+            key = _memory_key(memory)
+            if key not in best or memory['relevance_score'] > best[key][1]:
+                best[key] = (query_index, memory['relevance_score'])
+    return [
+        [memory for memory in memories if best[_memory_key(memory)][0] == query_index]
+        for query_index, memories in enumerate(results)
+    ]
+
+def search_memory_batch(queries: List[str], limit: int = 3, memory_filters: List = None, dedup: bool = True) -> List[List[Dict]]:
+    """Search several queries with one embedding call and one Qdrant round trip.
+
+    Unique query texts are embedded together with `embed_documents`, then every
+    (query, filter) pair is sent as a single `query_batch_points` request. With hybrid
+    search each request prefetches dense and BM25 sparse candidates and fuses them with
+    reciprocal-rank fusion, so exact claim numbers and billing codes rank alongside
+    semantic matches. When the in-process hot tier is loaded (MEMORY_HOT_TIER), the
+    search runs there instead and skips the Qdrant round trip. Returns one result list
+    per query; with `dedup`, a memory appears only under its best query.
     
+    Inside `batched_retrieval` (bulk generation), the search is merged with those of
+    other concurrent pipelines into one shared batch.
+    """
+    vectorstore = get_vectorstore()
+    if not vectorstore or not queries:
+        return [[] for _ in queries]
+    memory_filters = memory_filters or [None] * len(queries)
+    
+    batcher = active_batcher()
+    if batcher is not None:
+        try:
+            results = batcher.search(queries, limit, memory_filters)
+            return dedupe_across_queries(results) if dedup else results
+        except Exception as e:
+            print(f"Error in shared memory search batch: {e}")
+            return [[] for _ in queries]
+    return _search_memory_batch(queries, limit, memory_filters, dedup)
+
+def _search_memory_batch(queries: List[str], limit: int, memory_filters: List, dedup: bool = False) -> List[List[Dict]]:
+    vectorstore = get_vectorstore()
     try:
-        results = vectorstore.similarity_search_with_score(query, k=limit)
-        memory_results = []
-        for doc, score in results:
-            memory_results.append({
-                "content": doc.page_content,
-                "metadata": doc.metadata,
-                "relevance_score": float(score)
-            })
-        
-        return memory_results
+        unique_queries = list(dict.fromkeys(queries))
+        with track("embeddings", "embed_documents"):
+            vectors = dict(zip(unique_queries, vectorstore.embeddings.embed_documents(unique_queries)))
+        hot_tier = get_hot_tier()
+        if hot_tier is not None:
+            try:
+                results = hot_tier.search_batch([vectors[query] for query in queries], queries, limit, memory_filters)
+                return dedupe_across_queries(results) if dedup else results
+            except ValueError as e:
+                print(f"Hot tier cannot serve this search, using Qdrant: {e}")
+        search_params = memory_search_params()
+        with track("qdrant", "query_batch_points"):
+            responses = vectorstore.client.query_batch_points(
+                collection_name=MEMORY_COLLECTION,
+                requests=[
+                    _memory_query_request(vectors[query], query, memory_filter, limit, search_params)
+                    for query, memory_filter in zip(queries, memory_filters)
+                ]
+            )
+        results = [[_memory_from_point(point) for point in response.points] for response in responses]
+        return dedupe_across_queries(results) if dedup else results
     except Exception as e:
-        print(f"Error searching memory: {e}")
-        return []
+        print(f"Error in batched memory search: {e}")
+        return [[] for _ in queries]
+
+def merge_scoped_results(scopes: List, results: List[List[Dict]], limit: int, exclude: set = None) -> List[Dict]:
+    collected = []
+    seen = set(exclude or ())
+    for (scope_name, _), memories in zip(scopes, results):
+        for memory in memories:
+            if len(collected) >= limit:
+                return collected
+            key = _memory_key(memory)
+            if key in seen:
+                continue
+            seen.add(key)
+            memory['scope'] = scope_name
+            collected.append(memory)
+    return collected
+
+def search_memory_scoped(query: str, limit: int = 5, scopes: List = None) -> List[Dict]:
+    """Search each (name, filter) scope in order and fill up to `limit` with unique hits.
+
+    Filters are evaluated server-side by Qdrant, so a narrow scope such as the
+    sender's claim is answered from the payload index before falling back to the
+    wider scopes; a scope with a None filter searches the whole collection. All
+    scopes go out in a single batched request.
+    """
+    scopes = scopes or [("global", None)]
+    results = search_memory_batch(
+        [query] * len(scopes), limit=limit, memory_filters=[f for _, f in scopes], dedup=False
+    )
+    return merge_scoped_results(scopes, results, limit)
+
+def retrieve_memories_batch(
+    queries: List[str],
+    query_limit: int = 2,
+    context_query: str = None,
+    context_limit: int = 5,
+    sender: str = None,
+    thread_id: str = None,
+    claim_ids: List[str] = None
+) -> Dict:
+    """One-round-trip retrieval for a whole research phase.
+
+    Sends the research queries and every scope of the email-context search as one
+    batch. Returns per-query hits (deduplicated across queries), whether each query
+    matched anything before dedup, and the scoped context memories with anything
+    already listed under a query removed.
+    """
+    scopes = build_memory_scopes(sender=sender, thread_id=thread_id, claim_ids=claim_ids) if context_query else []
+    all_queries = list(queries) + [context_query] * len(scopes)
+    all_filters = [None] * len(queries) + [f for _, f in scopes]
+    raw = search_memory_batch(all_queries, limit=max(query_limit, context_limit), memory_filters=all_filters, dedup=False)
+    
+    query_results = [hits[:query_limit] for hits in raw[:len(queries)]]
+    per_query = dedupe_across_queries(query_results)
+    shown = {_memory_key(m) for hits in per_query for m in hits}
+    context = merge_scoped_results(scopes, raw[len(queries):], context_limit, exclude=shown)
+    return {
+        "per_query": per_query,
+        "covered": [bool(hits) for hits in query_results],
+        "context": context
+    }
+
+MEMORY_SCOPE_LABELS = {
+    "sender_claim": "this sender's claim",
+    "thread": "this email thread",
+    "sender": "this sender",
+    "claim": "this claim"
+}
+
+def build_memory_scopes(sender: str = None, thread_id: str = None, claim_ids: List[str] = None) -> List:
+    scopes = []
+    if sender and claim_ids:
+        scopes.append(("sender_claim", build_memory_filter(sender=sender, claim_ids=claim_ids)))
+    if thread_id:
+        scopes.append(("thread", build_memory_filter(thread_id=thread_id)))
+    if sender:
+        scopes.append(("sender", build_memory_filter(sender=sender)))
+    if claim_ids:
+        scopes.append(("claim", build_memory_filter(claim_ids=claim_ids)))
+    scopes.append(("global", None))
+    return scopes
+
+MEMORY_EXTRACTION_SYSTEM_PROMPT = """You are a helpful assistant that extracts and summarizes key insurance information from emails.
 
-def extract_and_store_memory(email_content: str, search_results: List[Dict], response: str) -> str:
-    if not vectorstore or not openai_client:
+Extract the most important facts from the insurance-related email exchange you are given.
+Focus on:
+1. Insurance policy details (policy numbers, coverage limits, terms)
+2. Medical conditions, treatments, and codes mentioned
+3. Claim details and reasons for denial
+4. Laws, regulations, or precedents referenced
+5. Key dates and deadlines
+6. Action items or next steps
+
+Summarize the most important information in a concise format."""
+
+def extract_and_store_memory(email_content: str, search_results: List[Dict], response: str, sender: str = None, thread_id: str = None) -> str:
+    if not get_vectorstore() or not openai_client:
         print("Cannot extract memory: vector store or OpenAI client not initialized")
         return None
     
     try:
-        extraction_prompt = f"""
-        Extract the most important facts from this insurance-related email exchange.
-        Focus on:
-        1. Insurance policy details (policy numbers, coverage limits, terms)
-        2. Medical conditions, treatments, and codes mentioned
-        3. Claim details and reasons for denial
-        4. Laws, regulations, or precedents referenced
-        5. Key dates and deadlines
-        6. Action items or next steps
-        
-        EMAIL CONTENT:
-        {email_content}
-        
-        RESEARCH INFORMATION:
-        {json.dumps([r.get('result', '') for r in search_results], indent=2)}
-        
-        AGENT RESPONSE:
-        {response}
-        
-        Summarize the most important information in a concise format:
-        """
+        extraction_input = f"""EMAIL CONTENT:
+{email_content}
+
+RESEARCH INFORMATION:
+{json.dumps([r.get('result', '') for r in search_results], indent=2)}
+
+AGENT RESPONSE:
+{response}"""
         
-        completion = openai_client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that extracts and summarizes key insurance information from emails."},
-                {"role": "user", "content": extraction_prompt}
+        route = route_for_email(email_content, "memory_extraction", default_model="gpt-4o")
+        memory_content = cached_chat_completion(
+            openai_client,
+            route["model"],
+            [
+                {"role": "system", "content": MEMORY_EXTRACTION_SYSTEM_PROMPT},
+                {"role": "user", "content": extraction_input}
             ],
             temperature=0.2,
+            **({"max_tokens": route["max_tokens"]} if route["max_tokens"] else {})
         )
-        
-        memory_content = completion.choices[0].message.content
         doc_id = str(uuid.uuid4())
         document = Document(
             page_content=memory_content,
             metadata={
                 "source": "email_exchange", 
                 "timestamp": datetime.datetime.now().isoformat(),
-                "id": doc_id
+                "id": doc_id,
+                **extract_memory_tags(email_content, sender=sender, thread_id=thread_id)
             }
         )
         
-        try:
-            collections = vectorstore.client.get_collections()
-            if not any(c.name == "insurance_research" for c in collections.collections):
-                print("Creating 'insurance_research' collection")
-                vectorstore.client.recreate_collection(
-                    collection_name="insurance_research",
-                    vectors_config={"size": 1536, "distance": "Cosine"}
-                )
-        except Exception as collection_err:
-            print(f"Error checking/creating collection: {collection_err}")
-        vectorstore.add_documents([document])
+        add_memory_document(document)
         
         print(f"Stored memory with ID: {doc_id}")
         print(f"Memory content: {memory_content[:200]}...")
@@ -358,15 +542,19 @@ def extract_and_store_memory(email_content: str, search_results: List[Dict], res
         print(traceback.format_exc())
         return None
 
-def get_relevant_memories(query: str, limit: int = 5) -> str:
-    memories = search_memory(query, limit=limit)
-    
+def get_relevant_memories(query: str, limit: int = 5, sender: str = None, thread_id: str = None, claim_ids: List[str] = None) -> str:
+    scopes = build_memory_scopes(sender=sender, thread_id=thread_id, claim_ids=claim_ids)
+    return format_memories(search_memory_scoped(query, limit=limit, scopes=scopes))
+
+def format_memories(memories: List[Dict]) -> str:
     if not memories:
         return ""
     
     formatted_memories = "RELEVANT PAST INFORMATION:\n\n"
     for i, memory in enumerate(memories, 1):
         formatted_memories += f"{i}. {memory['content']}\n"
+        if memory.get('scope') in MEMORY_SCOPE_LABELS:
+            formatted_memories += f"   (Related to {MEMORY_SCOPE_LABELS[memory['scope']]})\n"
         if memory.get('metadata', {}).get('timestamp'):
             try:
                 timestamp = datetime.datetime.fromisoformat(memory['metadata']['timestamp'])
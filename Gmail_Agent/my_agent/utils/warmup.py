@@ -0,0 +1,134 @@
+import os
+import time
+import threading
+from typing import Any, Callable, Dict
+
+WARMUP_PINGS = os.getenv("WARMUP_PINGS", "true").strip().lower() in ("1", "true", "yes", "on")
+# OpenAI-compatible endpoint to send the warm-up LLM/embedding pings to instead of the
+# real models (a local stub in CI or staging). Unset = ping through the real clients,
+# which is what actually warms their connection pools.
+WARMUP_STUB_URL = os.getenv("WARMUP_STUB_URL")
+WARMUP_LLM_MODEL = os.getenv("WARMUP_LLM_MODEL", "gpt-4o-mini")
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "30"))
+
+_lock = threading.Lock()
+_readiness: Dict[str, Any] = {"ready": False, "started_at": None, "completed_at": None, "attempts": 0, "steps": {}}
+_thread = None
+
+
+def _import_pipeline():
+    import my_agent.utils.nodes as nodes
+    import my_agent.utils.tools  # noqa: F401  (OpenAI client, web search tool)
+    import my_agent.agent  # noqa: F401  (compiled draft graph, SQLite checkpointer)
+    return {"gmail_service": nodes.service is not None}
+
+
+def _vector_store():
+    from my_agent.utils.memory_service import get_vectorstore, memory_service_status
+    if not get_vectorstore():
+        raise RuntimeError(memory_service_status().get("error") or "vector store unavailable")
+    return {"mode": memory_service_status().get("mode")}
+
+
+def _stub_client():
+    from openai import OpenAI
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY") or "stub", base_url=WARMUP_STUB_URL)
+
+
+def _embedding_ping():
+    from my_agent.utils.embeddings import EMBEDDING_BACKEND, OPENAI_EMBEDDING_MODEL
+    # Local embeddings make no network call, so they are always warmed for real (model load).
+    if WARMUP_STUB_URL and EMBEDDING_BACKEND != "local":
+        _stub_client().embeddings.create(model=OPENAI_EMBEDDING_MODEL, input="warm-up")
+        return {"target": WARMUP_STUB_URL}
+    from my_agent.utils.memory_service import get_vectorstore
+    vector = get_vectorstore().embeddings.embed_query("warm-up")
+    return {"dimension": len(vector)}
+
+
+def _llm_ping():
+    if WARMUP_STUB_URL:
+        _stub_client().chat.completions.create(
+            model=WARMUP_LLM_MODEL, messages=[{"role": "user", "content": "ping"}], max_tokens=1
+        )
+        return {"target": WARMUP_STUB_URL}
+    from my_agent.utils.nodes import get_llm
+    get_llm(model_name=WARMUP_LLM_MODEL, max_tokens=1).invoke("ping")
+    return {"model": WARMUP_LLM_MODEL}
+
+
+def _background_queues():
+    from my_agent.utils.nodes import service
+    from my_agent.utils.memory_jobs import memory_queue
+    from my_agent.utils.outbox import start_outbox
+    from my_agent.utils.generation_jobs import generation_queue
+    memory_queue.start()
+    generation_queue.start()
+    start_outbox(service)
+    return {}
+
+
+# (name, function, needed for /ready). The Gmail service is optional for the API, which
+# only drafts; the queues recover jobs left by a previous process.
+WARMUP_STEPS = [
+    ("pipeline_imports", _import_pipeline, True),
+    ("vector_store", _vector_store, True),
+    ("embedding_ping", _embedding_ping, True),
+    ("llm_ping", _llm_ping, True),
+    ("background_queues", _background_queues, False),
+]
+
+
+def _run_step(name: str, step: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+    started = time.perf_counter()
+    try:
+        details = step() or {}
+        result = {"ok": True, **details}
+    except Exception as e:
+        result = {"ok": False, "error": str(e)}
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    print(f"[Warmup] {name}: {'ok' if result['ok'] else 'failed: ' + result['error']} ({result['seconds']}s)")
+    return result
+
+
+def run_warmup() -> bool:
+    """Initialize and ping every client once; returns True when all required steps succeeded."""
+    with _lock:
+        _readiness["attempts"] += 1
+        _readiness["started_at"] = _readiness["started_at"] or time.time()
+    ready = True
+    for name, step, required in WARMUP_STEPS:
+        if name in ("embedding_ping", "llm_ping") and not WARMUP_PINGS:
+            continue
+        result = _run_step(name, step)
+        with _lock:
+            _readiness["steps"][name] = {**result, "required": required}
+        ready = ready and (result["ok"] or not required)
+    with _lock:
+        _readiness["ready"] = ready
+        if ready:
+            _readiness["completed_at"] = time.time()
+    return ready
+
+
+def start_warmup():
+    """Run warm-up on a background thread, retrying every WARMUP_RETRY_SECONDS until ready."""
+    global _thread
+
+    def loop():
+        while not run_warmup():
+            print(f"[Warmup] Not ready, retrying in {WARMUP_RETRY_SECONDS:.0f}s")
+            time.sleep(WARMUP_RETRY_SECONDS)
+        print("[Warmup] Ready")
+
+    with _lock:
+        if _thread is not None:
+            return _thread
+        _thread = threading.Thread(target=loop, name="warmup", daemon=True)
+        _thread.start()
+        return _thread
+
+
+def readiness() -> Dict[str, Any]:
+    with _lock:
+        return {**_readiness, "steps": {name: dict(step) for name, step in _readiness["steps"].items()}}
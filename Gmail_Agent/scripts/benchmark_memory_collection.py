@@ -0,0 +1,152 @@
+# scripts/benchmark_memory_collection.py
+#
+# Compares memory-collection storage settings (float32, int8 scalar quantization,
+# binary quantization, on-disk originals, HNSW m/ef) on a synthetic corpus and
+# reports estimated RAM footprint, recall@k against exact search, and p50/p99 latency.
+#
+# Quantization and HNSW settings only take effect on a Qdrant server, so point this at
+# one with --url or QDRANT_URL. Local (embedded) mode is brute force and is only useful
+# as a smoke test of the script itself.
+#
+#   python scripts/benchmark_memory_collection.py --url http://localhost:6333 --points 20000
+
+import os
+import sys
+import time
+import uuid
+import argparse
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as rest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from my_agent.utils.memory_schema import create_memory_collection, memory_collection_settings, memory_search_params
+
+SETTINGS_MATRIX = {
+    "float32": dict(quantization="none"),
+    "float32_m32_ef128": dict(quantization="none", hnsw_m=32, hnsw_ef_construct=200, search_ef=128),
+    "int8_rescore": dict(quantization="scalar", rescore=True, oversampling=2.0),
+    "int8_on_disk_rescore": dict(quantization="scalar", on_disk=True, rescore=True, oversampling=2.0),
+    "int8_no_rescore": dict(quantization="scalar", rescore=False),
+    "binary_rescore": dict(quantization="binary", on_disk=True, rescore=True, oversampling=3.0),
+}
+
+
+def synthetic_corpus(points, dim, clusters, seed):
+    """Clustered unit vectors, closer to real embedding distributions than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    assignments = rng.integers(0, clusters, size=points)
+    corpus = centers[assignments] + 0.35 * rng.normal(size=(points, dim)).astype(np.float32)
+    corpus /= np.linalg.norm(corpus, axis=1, keepdims=True)
+    return corpus
+
+
+def estimate_ram_bytes(settings, points, dim):
+    m = settings["hnsw_m"] or 16
+    ram = 0 if settings["on_disk"] else points * dim * 4
+    if settings["quantization"] == "scalar":
+        ram += points * dim
+    elif settings["quantization"] == "binary":
+        ram += points * dim // 8
+    if not settings["hnsw_on_disk"]:
+        ram += points * m * 2 * 4
+    return ram
+
+
+def wait_for_indexing(client, collection_name, timeout=600):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        info = client.get_collection(collection_name)
+        if info.status == rest.CollectionStatus.GREEN:
+            return info
+        time.sleep(1)
+    return client.get_collection(collection_name)
+
+
+def run_setting(client, name, overrides, corpus, queries, truth, k, batch_size):
+    collection_name = f"bench_{name}_{uuid.uuid4().hex[:6]}"
+    settings = memory_collection_settings(**overrides)
+    create_memory_collection(client, collection_name, vector_size=corpus.shape[1], settings=settings)
+    try:
+        start = time.perf_counter()
+        for offset in range(0, len(corpus), batch_size):
+            batch = corpus[offset:offset + batch_size]
+            client.upsert(
+                collection_name=collection_name,
+                points=[
+                    rest.PointStruct(id=offset + i, vector=vector.tolist(), payload={"metadata": {}})
+                    for i, vector in enumerate(batch)
+                ],
+                wait=True
+            )
+        info = wait_for_indexing(client, collection_name)
+        ingest_seconds = time.perf_counter() - start
+
+        search_params = memory_search_params(settings)
+        latencies, hits = [], 0
+        for query, expected in zip(queries, truth):
+            start = time.perf_counter()
+            result = client.query_points(
+                collection_name=collection_name,
+                query=query.tolist(),
+                limit=k,
+                search_params=search_params
+            ).points
+            latencies.append((time.perf_counter() - start) * 1000)
+            hits += len({point.id for point in result} & set(expected.tolist()))
+
+        latencies = np.array(latencies)
+        return {
+            "setting": name,
+            "est_ram_mb": estimate_ram_bytes(settings, len(corpus), corpus.shape[1]) / 2**20,
+            "recall": hits / (len(queries) * k),
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p99_ms": float(np.percentile(latencies, 99)),
+            "ingest_s": ingest_seconds,
+            "indexed": getattr(info, "indexed_vectors_count", None),
+        }
+    finally:
+        client.delete_collection(collection_name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark memory collection quantization/HNSW settings")
+    parser.add_argument("--url", default=os.getenv("QDRANT_URL"), help="Qdrant server URL")
+    parser.add_argument("--api-key", default=os.getenv("QDRANT_API_KEY"))
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--settings", nargs="*", default=list(SETTINGS_MATRIX), choices=list(SETTINGS_MATRIX))
+    args = parser.parse_args()
+
+    if args.url:
+        client = QdrantClient(url=args.url, api_key=args.api_key)
+    else:
+        print("WARNING: no --url/QDRANT_URL given, using in-memory local mode. "
+              "Quantization and HNSW are ignored there, so only the footprint estimate is meaningful.")
+        client = QdrantClient(":memory:")
+
+    corpus = synthetic_corpus(args.points, args.dim, args.clusters, args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+    query_rows = rng.choice(len(corpus), size=args.queries, replace=False)
+    queries = corpus[query_rows] + 0.05 * rng.normal(size=(args.queries, args.dim)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    truth = np.argsort(-(queries @ corpus.T), axis=1)[:, :args.k]
+
+    print(f"Corpus: {args.points} x {args.dim}, {args.queries} queries, recall@{args.k}\n")
+    print(f"{'setting':<24}{'est RAM MB':>12}{'recall':>9}{'p50 ms':>9}{'p99 ms':>9}{'ingest s':>10}")
+    for name in args.settings:
+        row = run_setting(client, name, SETTINGS_MATRIX[name], corpus, queries, truth, args.k, args.batch_size)
+        print(f"{row['setting']:<24}{row['est_ram_mb']:>12.1f}{row['recall']:>9.3f}"
+              f"{row['p50_ms']:>9.2f}{row['p99_ms']:>9.2f}{row['ingest_s']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
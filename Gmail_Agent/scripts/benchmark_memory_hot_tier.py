@@ -0,0 +1,137 @@
+# scripts/benchmark_memory_hot_tier.py
+#
+# Compares memory search through Qdrant (query_points / query_batch_points) with the
+# in-process NumPy hot tier (float32 and float16) on the same synthetic corpus.
+# Reports recall@k against exact search, p50/p99 latency per query, batched latency
+# for the research node's typical 3-5 queries, and resident matrix size.
+#
+# Point it at a Qdrant server with --url / QDRANT_URL to measure the real network
+# hop; without one it uses in-memory local mode (no HTTP, so Qdrant looks faster
+# than it will in production).
+#
+#   python scripts/benchmark_memory_hot_tier.py --url http://localhost:6333 --points 5000
+
+import os
+import sys
+import time
+import uuid
+import argparse
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as rest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark_memory_collection import synthetic_corpus
+from my_agent.utils.memory_schema import create_memory_collection, memory_collection_settings
+from my_agent.utils.memory_hot_tier import HotMemoryTier
+
+
+def percentiles(latencies):
+    latencies = np.array(latencies)
+    return float(np.percentile(latencies, 50)), float(np.percentile(latencies, 99))
+
+
+def recall(results, truth, k):
+    hits = sum(len({int(m["point_id"]) for m in found} & set(expected.tolist())) for found, expected in zip(results, truth))
+    return hits / (len(truth) * k)
+
+
+def bench_qdrant(client, corpus, queries, truth, k, batch, batch_size):
+    collection_name = f"bench_hot_{uuid.uuid4().hex[:6]}"
+    settings = memory_collection_settings(quantization="none", hybrid=False)
+    create_memory_collection(client, collection_name, vector_size=corpus.shape[1], settings=settings)
+    try:
+        for offset in range(0, len(corpus), batch_size):
+            client.upsert(
+                collection_name=collection_name,
+                points=[
+                    rest.PointStruct(id=offset + i, vector=vector.tolist(), payload={"page_content": "", "metadata": {}})
+                    for i, vector in enumerate(corpus[offset:offset + batch_size])
+                ],
+                wait=True
+            )
+        latencies, results = [], []
+        for query in queries:
+            start = time.perf_counter()
+            points = client.query_points(collection_name=collection_name, query=query.tolist(), limit=k).points
+            latencies.append((time.perf_counter() - start) * 1000)
+            results.append([{"point_id": str(p.id)} for p in points])
+        batch_latencies = []
+        for offset in range(0, len(queries), batch):
+            start = time.perf_counter()
+            client.query_batch_points(
+                collection_name=collection_name,
+                requests=[rest.QueryRequest(query=q.tolist(), limit=k) for q in queries[offset:offset + batch]]
+            )
+            batch_latencies.append((time.perf_counter() - start) * 1000)
+        return results, latencies, batch_latencies
+    finally:
+        client.delete_collection(collection_name)
+
+
+def bench_hot_tier(dtype, corpus, queries, k, batch):
+    tier = HotMemoryTier(dtype=dtype, hybrid=False, path=None)
+    start = time.perf_counter()
+    tier.add_many(range(len(corpus)), corpus, [{"page_content": "", "metadata": {}}] * len(corpus))
+    load_seconds = time.perf_counter() - start
+    texts = [""] * len(queries)
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.extend(tier.search_batch([query], [""], k))
+        latencies.append((time.perf_counter() - start) * 1000)
+    batch_latencies = []
+    for offset in range(0, len(queries), batch):
+        start = time.perf_counter()
+        tier.search_batch(queries[offset:offset + batch], texts[offset:offset + batch], k)
+        batch_latencies.append((time.perf_counter() - start) * 1000)
+    return results, latencies, batch_latencies, tier.memory_bytes(), load_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the in-process memory hot tier against Qdrant")
+    parser.add_argument("--url", default=os.getenv("QDRANT_URL"), help="Qdrant server URL")
+    parser.add_argument("--api-key", default=os.getenv("QDRANT_API_KEY"))
+    parser.add_argument("--prefer-grpc", action="store_true")
+    parser.add_argument("--points", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--clusters", type=int, default=100)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--batch", type=int, default=4, help="Queries per batched call")
+    parser.add_argument("--batch-size", type=int, default=256, help="Upsert batch size")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    if args.url:
+        client = QdrantClient(url=args.url, api_key=args.api_key, prefer_grpc=args.prefer_grpc)
+    else:
+        print("WARNING: no --url/QDRANT_URL given, comparing against in-memory local mode (no network hop).")
+        client = QdrantClient(":memory:")
+
+    corpus = synthetic_corpus(args.points, args.dim, args.clusters, args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+    query_rows = rng.choice(len(corpus), size=args.queries, replace=False)
+    queries = corpus[query_rows] + 0.05 * rng.normal(size=(args.queries, args.dim)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    truth = np.argsort(-(queries @ corpus.T), axis=1)[:, :args.k]
+
+    print(f"Corpus: {args.points} x {args.dim}, {args.queries} queries, recall@{args.k}, batches of {args.batch}\n")
+    print(f"{'path':<18}{'matrix MB':>10}{'recall':>9}{'p50 ms':>9}{'p99 ms':>9}{'batch p50':>11}{'load s':>8}")
+
+    results, latencies, batch_latencies = bench_qdrant(client, corpus, queries, truth, args.k, args.batch, args.batch_size)
+    p50, p99 = percentiles(latencies)
+    print(f"{'qdrant':<18}{'-':>10}{recall(results, truth, args.k):>9.3f}{p50:>9.2f}{p99:>9.2f}"
+          f"{percentiles(batch_latencies)[0]:>11.2f}{'-':>8}")
+
+    for dtype in ("float32", "float16"):
+        results, latencies, batch_latencies, nbytes, load_seconds = bench_hot_tier(dtype, corpus, queries, args.k, args.batch)
+        p50, p99 = percentiles(latencies)
+        print(f"{'hot_tier_' + dtype:<18}{nbytes / 2**20:>10.1f}{recall(results, truth, args.k):>9.3f}{p50:>9.2f}{p99:>9.2f}"
+              f"{percentiles(batch_latencies)[0]:>11.2f}{load_seconds:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
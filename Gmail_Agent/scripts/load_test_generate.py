@@ -0,0 +1,129 @@
+# scripts/load_test_generate.py
+#
+# Load test for POST /generate-response. For each concurrency level it sends
+# --requests emails with that many in flight, and meanwhile probes /health to
+# show whether the event loop stays responsive. Reports throughput, p50/p95
+# latency, errors (503 = pipeline at capacity) and /health latency.
+#
+# With the pipeline on its thread pool, throughput should grow with concurrency
+# up to PIPELINE_WORKERS and /health should stay in the low milliseconds. Before,
+# requests were serialized and /health waited behind whole pipeline runs.
+#
+#   python scripts/load_test_generate.py --url http://localhost:10000 --requests 16 --concurrency 1,4,8
+#
+# Each email gets a unique id and claim number so LLM and draft-reuse caches
+# do not hide the pipeline cost; pass --repeat to send identical emails.
+
+import json
+import time
+import uuid
+import argparse
+import threading
+import statistics
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+SAMPLE_EMAIL = {
+    "subject": "Claim denied for MRI",
+    "sender": "Jordan Lee <jordan.lee@example.com>",
+    "body": (
+        "Hello, my claim {claim} for an MRI on 03/14 was denied as not medically necessary. "
+        "My doctor submitted the referral and the MRI was in-network. The bill is $2,340. "
+        "How do I appeal this and what documents should I include?"
+    ),
+}
+
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def post_json(url, payload, timeout):
+    request = urllib.request.Request(
+        url, data=json.dumps(payload).encode("utf-8"), headers={"Content-Type": "application/json"}, method="POST"
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.status, response.read()
+
+
+def one_request(base_url, index, repeat, timeout):
+    email = dict(SAMPLE_EMAIL)
+    claim = "CLM-100000" if repeat else f"CLM-{100000 + index}"
+    email["body"] = email["body"].format(claim=claim)
+    email["id"] = "load-test" if repeat else f"load-test-{uuid.uuid4().hex[:8]}"
+    start = time.perf_counter()
+    try:
+        status, _ = post_json(f"{base_url}/generate-response", {"email": email}, timeout)
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except Exception:
+        status = None
+    return status, time.perf_counter() - start
+
+
+def probe_health(base_url, stop, interval, latencies):
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            urllib.request.urlopen(f"{base_url}/health", timeout=30).read()
+            latencies.append((time.perf_counter() - start) * 1000)
+        except Exception:
+            latencies.append(float("inf"))
+        stop.wait(interval)
+
+
+def run_level(base_url, concurrency, requests, repeat, timeout, health_interval):
+    health_latencies = []
+    stop = threading.Event()
+    prober = threading.Thread(target=probe_health, args=(base_url, stop, health_interval, health_latencies), daemon=True)
+    prober.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda i: one_request(base_url, i, repeat, timeout), range(requests)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    prober.join()
+
+    latencies = [seconds for status, seconds in results if status == 200]
+    errors = {}
+    for status, _ in results:
+        if status != 200:
+            errors[str(status)] = errors.get(str(status), 0) + 1
+    return {
+        "concurrency": concurrency,
+        "ok": len(latencies),
+        "errors": errors,
+        "elapsed_s": elapsed,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_s": percentile(latencies, 0.5),
+        "p95_s": percentile(latencies, 0.95),
+        "health_p50_ms": statistics.median(health_latencies) if health_latencies else float("nan"),
+        "health_max_ms": max(health_latencies) if health_latencies else float("nan"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test POST /generate-response")
+    parser.add_argument("--url", default="http://localhost:10000", help="Base URL of the agent API")
+    parser.add_argument("--requests", type=int, default=16, help="Requests per concurrency level")
+    parser.add_argument("--concurrency", default="1,4,8", help="Comma-separated concurrency levels")
+    parser.add_argument("--timeout", type=float, default=180.0, help="Per-request timeout in seconds")
+    parser.add_argument("--health-interval", type=float, default=0.25, help="Seconds between /health probes")
+    parser.add_argument("--repeat", action="store_true", help="Send identical emails (measures cache hits)")
+    args = parser.parse_args()
+
+    base_url = args.url.rstrip("/")
+    print(f"{'conc':>5}{'ok':>5}{'errors':>12}{'elapsed s':>11}{'req/s':>8}{'p50 s':>8}{'p95 s':>8}{'health p50 ms':>15}{'health max ms':>15}")
+    for concurrency in [int(c) for c in args.concurrency.split(",")]:
+        r = run_level(base_url, concurrency, args.requests, args.repeat, args.timeout, args.health_interval)
+        errors = ",".join(f"{k}:{v}" for k, v in r["errors"].items()) or "-"
+        print(f"{r['concurrency']:>5}{r['ok']:>5}{errors:>12}{r['elapsed_s']:>11.1f}{r['throughput_rps']:>8.2f}"
+              f"{r['p50_s']:>8.2f}{r['p95_s']:>8.2f}{r['health_p50_ms']:>15.1f}{r['health_max_ms']:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import sqlite3
+from typing import TypedDict
+
+import pytest
+from langgraph.checkpoint.sqlite import SqliteSaver
+from langgraph.graph import END, StateGraph
+
+from my_agent.utils.checkpoints import run_graph, stream_graph
+
+
+class State(TypedDict, total=False):
+    steps: list
+    deadline: float
+
+
+def make_graph(fail_once):
+    def step(name):
+        def node(state):
+            if name in fail_once:
+                fail_once.remove(name)
+                raise RuntimeError(f"{name} failed")
+            return {"steps": state.get("steps", []) + [name]}
+        return node
+
+    workflow = StateGraph(State)
+    for name in ("first", "second", "third"):
+        workflow.add_node(name, step(name))
+    workflow.set_entry_point("first")
+    workflow.add_edge("first", "second")
+    workflow.add_edge("second", "third")
+    workflow.add_edge("third", END)
+    return workflow.compile(checkpointer=SqliteSaver(sqlite3.connect(":memory:", check_same_thread=False)))
+
+
+def test_failed_run_resumes_from_the_last_completed_node():
+    graph = make_graph(fail_once={"second"})
+    updates = []
+
+    with pytest.raises(RuntimeError):
+        run_graph(graph, "t", {"steps": []}, on_update=lambda node, update: updates.append(node))
+    final = run_graph(graph, "t", {"steps": []}, on_update=lambda node, update: updates.append(node),
+                      on_resume=lambda values: {"deadline": 1.0})
+
+    assert updates == ["first", "second", "third"]
+    assert final == {"steps": ["first", "second", "third"], "deadline": 1.0}
+    # Completed threads are dropped, so the next run starts fresh.
+    assert not graph.get_state({"configurable": {"thread_id": "t"}}).next
+
+
+def test_abandoned_stream_resumes_on_the_same_thread():
+    graph = make_graph(fail_once=set())
+    chunks = stream_graph(graph, "t", {"steps": []}, stream_mode=["updates"])
+    assert next(chunks) == ("updates", {"first": {"steps": ["first"]}})
+    chunks.close()
+
+    resumed = list(stream_graph(graph, "t", {"steps": []}))
+
+    assert [list(chunk) for chunk in resumed] == [["second"], ["third"]]
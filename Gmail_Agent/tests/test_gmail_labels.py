@@ -0,0 +1,101 @@
+import pytest
+
+import my_agent.utils.gmail_labels as gmail_labels
+from my_agent.utils.gmail_labels import LabelMutationBuffer, get_label_id
+
+
+class Call:
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self):
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result() if callable(self.result) else self.result
+
+
+class FakeGmail:
+    """Just enough of users().labels() and users().messages().batchModify for the buffer."""
+
+    def __init__(self, labels):
+        self.labels_by_name = dict(labels)
+        self.batches = []
+        self.created = 0
+
+    def users(self):
+        return self
+
+    def labels(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def list(self, userId):
+        return Call(lambda: {"labels": [{"name": name, "id": label_id} for name, label_id in self.labels_by_name.items()]})
+
+    def create(self, userId, body):
+        self.created += 1
+        label_id = f"Label_new{self.created}"
+        self.labels_by_name[body["name"]] = label_id
+        return Call({"id": label_id})
+
+    def batchModify(self, userId, body):
+        known = set(self.labels_by_name.values())
+        if not set(body["addLabelIds"] + body["removeLabelIds"]) <= known:
+            return Call(Exception("Invalid label: requested label not found"))
+        self.batches.append(body)
+        return Call({})
+
+
+@pytest.fixture(autouse=True)
+def fresh_label_cache():
+    gmail_labels.invalidate_label_cache()
+    gmail_labels._label_names.clear()
+
+
+def make_buffer():
+    return LabelMutationBuffer(batch_size=100, flush_seconds=0)
+
+
+def test_changes_to_one_message_merge_and_identical_changes_share_a_call():
+    service = FakeGmail({"UNREAD": "UNREAD", "Insurance": "Label_1"})
+    buffer = make_buffer()
+    buffer.queue(service, "m1", add=["Label_1"])
+    buffer.queue(service, "m1", remove=["Label_1", "UNREAD"])
+    buffer.queue(service, "m1", add=["Label_1"])
+    buffer.queue(service, "m2", add=["Label_1"], remove=["UNREAD"])
+    buffer.queue(service, "m3", remove=["UNREAD"])
+
+    assert buffer.flush() == 3
+
+    bodies = sorted((b["ids"], b["addLabelIds"], b["removeLabelIds"]) for b in service.batches)
+    assert bodies == [(["m1", "m2"], ["Label_1"], ["UNREAD"]), (["m3"], [], ["UNREAD"])]
+
+
+def test_deleted_label_is_recreated_and_the_batch_is_retried():
+    service = FakeGmail({"UNREAD": "UNREAD", "Insurance": "Label_1"})
+    buffer = make_buffer()
+    label_id = get_label_id(service, "Insurance")
+    buffer.queue(service, "m1", add=[label_id], remove=["UNREAD"])
+    del service.labels_by_name["Insurance"]  # deleted in Gmail after it was cached
+
+    assert buffer.flush() == 0
+    assert buffer.pending() == 1
+    assert buffer.flush() == 1
+
+    assert service.batches == [{"ids": ["m1"], "addLabelIds": ["Label_new1"], "removeLabelIds": ["UNREAD"]}]
+
+
+def test_failing_batch_is_dropped_after_max_retries(monkeypatch):
+    monkeypatch.setattr(gmail_labels, "LABEL_MAX_RETRIES", 2)
+    service = FakeGmail({"UNREAD": "UNREAD"})
+    service.batchModify = lambda userId, body: Call(Exception("backend error"))
+    buffer = make_buffer()
+    buffer.queue(service, "m1", remove=["UNREAD"])
+
+    for _ in range(3):
+        buffer.flush()
+
+    assert buffer.pending() == 0
+    assert buffer.stats()["failed_calls"] == 3
@@ -0,0 +1,155 @@
+import threading
+import time
+
+from my_agent.utils.job_queue import DurableJobQueue
+
+
+def make_queue(tmp_path, handler=lambda payload: {"ok": True}, **kwargs):
+    kwargs.setdefault("poll_interval", 0.05)
+    kwargs.setdefault("backoff_seconds", 0.01)
+    return DurableJobQueue("test", handler, db_path=str(tmp_path / "jobs.db"), **kwargs)
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_only_one_queue_instance_claims_a_job(tmp_path):
+    first, second = make_queue(tmp_path), make_queue(tmp_path)
+    job_id = first.enqueue({"n": 1})
+
+    claimed = [first._claim_next(), second._claim_next()]
+
+    assert [row["id"] for row in claimed if row] == [job_id]
+    assert first.get(job_id)["owner"] == first.owner
+
+
+def test_concurrent_workers_run_each_job_once(tmp_path):
+    runs = []
+    lock = threading.Lock()
+
+    def handler(payload):
+        with lock:
+            runs.append(payload["n"])
+        return {}
+
+    queues = [make_queue(tmp_path, handler, max_workers=4) for _ in range(2)]
+    for n in range(40):
+        queues[0].enqueue({"n": n})
+    for queue in queues:
+        queue.start()
+    try:
+        assert wait_for(lambda: queues[0].stats()["counts"]["done"] == 40)
+    finally:
+        for queue in queues:
+            queue.stop()
+
+    assert sorted(runs) == list(range(40))
+
+
+def test_start_does_not_steal_a_job_with_a_live_lease(tmp_path):
+    owner, other = make_queue(tmp_path, lease_seconds=60), make_queue(tmp_path)
+    job_id = owner.enqueue({"n": 1})
+    assert owner._claim_next()["id"] == job_id
+
+    other.start()
+    try:
+        time.sleep(0.2)
+        job = other.get(job_id)
+        assert job["status"] == "running"
+        assert job["owner"] == owner.owner
+        assert job["attempts"] == 1
+    finally:
+        other.stop()
+
+
+def test_expired_lease_is_taken_over_with_fresh_progress(tmp_path):
+    crashed = make_queue(tmp_path, lease_seconds=0.1)
+    job_id = crashed.enqueue({"n": 1})
+    crashed._claim_next()
+    crashed._current.job_id = job_id
+    crashed.report_progress("classified")
+    assert crashed.get(job_id)["progress"][0]["stage"] == "classified"
+
+    time.sleep(0.15)
+    survivor = make_queue(tmp_path)
+    row = survivor._claim_next()
+
+    assert row["id"] == job_id
+    job = survivor.get(job_id)
+    assert job["owner"] == survivor.owner
+    assert job["attempts"] == 2
+    assert job["progress"] == []
+
+
+def test_stale_owner_cannot_overwrite_a_taken_over_job(tmp_path):
+    crashed = make_queue(tmp_path, lease_seconds=0.1, handler=lambda payload: {"from": "crashed"})
+    job_id = crashed.enqueue({"n": 1})
+    row = crashed._claim_next()
+    time.sleep(0.15)
+    survivor = make_queue(tmp_path, handler=lambda payload: {"from": "survivor"})
+    survivor._run_job(survivor._claim_next())
+
+    crashed._run_job(row)
+
+    assert survivor.get(job_id)["result"] == {"from": "survivor"}
+
+
+def test_heartbeat_keeps_a_long_job_owned(tmp_path):
+    release = threading.Event()
+    worker = make_queue(tmp_path, handler=lambda payload: release.wait(5) and {}, lease_seconds=0.3)
+    job_id = worker.enqueue({"n": 1})
+    worker.start()
+    try:
+        assert wait_for(lambda: worker.get(job_id)["status"] == "running")
+        time.sleep(0.6)
+        assert make_queue(tmp_path)._claim_next() is None
+        release.set()
+        assert wait_for(lambda: worker.get(job_id)["status"] == "done")
+    finally:
+        worker.stop()
+
+
+def test_failed_job_retries_then_fails_permanently(tmp_path):
+    def handler(payload):
+        raise RuntimeError("boom")
+
+    queue = make_queue(tmp_path, handler, max_attempts=2)
+    job_id = queue.enqueue({"n": 1})
+    queue.start()
+    try:
+        assert wait_for(lambda: queue.get(job_id)["status"] == "failed")
+    finally:
+        queue.stop()
+    job = queue.get(job_id)
+    assert job["attempts"] == 2
+    assert job["last_error"].startswith("boom")
+
+
+def test_enqueue_unique_is_idempotent_and_revives_failed_jobs(tmp_path):
+    queue = make_queue(tmp_path)
+    assert queue.enqueue_unique({"n": 1}, "key-1") is True
+    assert queue.enqueue_unique({"n": 1}, "key-1") is False
+
+    with queue._db() as conn:
+        conn.execute("UPDATE jobs SET status = 'failed', attempts = 3 WHERE id = 'key-1'")
+    assert queue.enqueue_unique({"n": 1}, "key-1") is True
+    job = queue.get("key-1")
+    assert (job["status"], job["attempts"]) == ("pending", 0)
+
+
+def test_drain_waits_for_pending_jobs(tmp_path):
+    queue = make_queue(tmp_path, handler=lambda payload: time.sleep(0.05) or {})
+    for n in range(3):
+        queue.enqueue({"n": n})
+    queue.start()
+    try:
+        assert queue.drain(timeout=5) is True
+        assert queue.stats()["counts"]["done"] == 3
+    finally:
+        queue.stop()
@@ -0,0 +1,77 @@
+import fcntl
+
+import numpy as np
+import pytest
+from qdrant_client import QdrantClient, models
+
+import my_agent.utils.memory_compaction as compaction
+
+COLLECTION = "memories"
+
+
+@pytest.fixture
+def client():
+    client = QdrantClient(":memory:")
+    client.create_collection(COLLECTION, vectors_config=models.VectorParams(size=16, distance=models.Distance.COSINE))
+    return client
+
+
+def add_points(client, points):
+    client.upsert(COLLECTION, [
+        models.PointStruct(id=point_id, vector=vector, payload={"page_content": str(point_id), "metadata": metadata})
+        for point_id, vector, metadata in points
+    ])
+
+
+def one_hot(i):
+    vector = np.zeros(16)
+    vector[i] = 1.0
+    return vector.tolist()
+
+
+def ids(client):
+    records, _ = client.scroll(COLLECTION, limit=100)
+    return sorted(record.id for record in records)
+
+
+def compact(client, tmp_path, **kwargs):
+    return compaction.run_compaction(client, collection_name=COLLECTION, state_path=str(tmp_path / "state.json"), **kwargs)
+
+
+def test_resume_after_cursor_point_was_deleted_keeps_everything(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(compaction, "PAGE_SIZE", 4)
+    add_points(client, [(i, one_hot(i), {"timestamp": "2024-01-01T00:00:00"}) for i in range(1, 13)])
+
+    assert compact(client, tmp_path, max_pages=1)["status"] == "partial"
+    client.delete(COLLECTION, points_selector=[5])
+    report = compact(client, tmp_path)
+
+    assert report["status"] == "complete"
+    assert report["duplicates_removed"] == 0
+    assert ids(client) == [i for i in range(1, 13) if i != 5]
+
+
+def test_merges_only_same_sender_with_compatible_claims(client, tmp_path):
+    vector = one_hot(0)
+    add_points(client, [
+        (1, vector, {"sender": "a@x.com", "claim_ids": ["CLM-1"], "timestamp": "2024-01-01T00:00:00"}),
+        (2, vector, {"sender": "b@x.com", "claim_ids": ["CLM-1"], "timestamp": "2024-01-02T00:00:00"}),
+        (3, vector, {"sender": "a@x.com", "claim_ids": ["CLM-2"], "timestamp": "2024-01-03T00:00:00"}),
+        (4, vector, {"sender": "a@x.com", "timestamp": "2024-01-04T00:00:00"}),
+    ])
+
+    report = compact(client, tmp_path)
+
+    assert report["duplicates_removed"] == 1
+    # Point 4 (no claim numbers) is compatible with either of sender a's memories and absorbs one.
+    assert 2 in ids(client) and 4 in ids(client) and len(ids(client)) == 3
+    survivor = client.retrieve(COLLECTION, [4])[0].payload["metadata"]
+    assert survivor["duplicate_count"] == 1
+
+
+def test_second_process_holding_the_lock_skips_the_run(client, tmp_path):
+    state_path = tmp_path / "state.json"
+    with open(f"{state_path}.lock", "a") as held:
+        fcntl.flock(held, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        assert compact(client, tmp_path)["status"] == "skipped"
+    assert compact(client, tmp_path)["status"] == "complete"
@@ -0,0 +1,83 @@
+from types import SimpleNamespace
+
+import numpy as np
+from qdrant_client import QdrantClient, models
+
+import my_agent.utils.memory_hot_tier as hot_tier
+import my_agent.utils.memory_service as memory_service
+from my_agent.utils.memory_hot_tier import HotMemoryTier, collection_fingerprint
+from my_agent.utils.memory_schema import MEMORY_COLLECTION
+
+
+def make_client(point_ids):
+    client = QdrantClient(":memory:")
+    client.create_collection(MEMORY_COLLECTION, vectors_config=models.VectorParams(size=4, distance=models.Distance.COSINE))
+    upsert(client, point_ids)
+    return client
+
+
+def upsert(client, point_ids, metadata=None):
+    client.upsert(MEMORY_COLLECTION, [
+        models.PointStruct(id=i, vector=np.eye(4)[i % 4].tolist(), payload={"page_content": f"memory {i}", "metadata": metadata or {"n": i}})
+        for i in point_ids
+    ])
+
+
+def test_fingerprint_catches_changes_that_keep_the_count(tmp_path):
+    client = make_client([1, 2, 3])
+    tier = HotMemoryTier(path=str(tmp_path / "tier")).load_from_collection(client, expected_fingerprint=collection_fingerprint(client))
+    assert tier.fingerprint() == collection_fingerprint(client)
+
+    client.delete(MEMORY_COLLECTION, points_selector=[3])
+    upsert(client, [4])
+    assert client.count(MEMORY_COLLECTION).count == tier.size
+    assert tier.fingerprint() != collection_fingerprint(client)
+
+    reloaded = HotMemoryTier(path=str(tmp_path / "tier")).load_from_collection(client, expected_fingerprint=collection_fingerprint(client))
+    client.set_payload(MEMORY_COLLECTION, payload={"metadata": {"n": 1, "duplicate_count": 1}}, points=[1])
+    assert reloaded.fingerprint() != collection_fingerprint(client)
+
+
+def test_stale_snapshot_is_not_loaded(tmp_path):
+    client = make_client([1, 2, 3])
+    HotMemoryTier(path=str(tmp_path / "tier")).load_from_collection(client, expected_fingerprint=collection_fingerprint(client))
+    client.delete(MEMORY_COLLECTION, points_selector=[3])
+    upsert(client, [4])
+
+    tier = HotMemoryTier(path=str(tmp_path / "tier")).load_from_collection(client, expected_fingerprint=collection_fingerprint(client))
+
+    assert not isinstance(tier.matrix, np.memmap)
+    assert sorted(tier.ids) == ["1", "2", "4"]
+
+
+def test_local_upserts_keep_the_tier_in_step_with_the_collection(tmp_path):
+    client = make_client([1, 2])
+    tier = HotMemoryTier(path=None).load_from_collection(client)
+
+    upsert(client, [5])
+    tier.add_many([5], [np.eye(4)[1]], [{"page_content": "memory 5", "metadata": {"n": 5}}])
+
+    assert tier.fingerprint() == collection_fingerprint(client)
+
+
+def test_search_path_does_not_scroll_and_refresh_picks_up_changes(monkeypatch, tmp_path):
+    client = make_client([1, 2])
+    monkeypatch.setattr(memory_service, "get_vectorstore", lambda: SimpleNamespace(client=client))
+    monkeypatch.setattr(memory_service, "hybrid_search_enabled", lambda: False)
+    monkeypatch.setattr(hot_tier, "HOT_TIER_ENABLED", True)
+    monkeypatch.setattr(hot_tier, "HOT_TIER_PATH", str(tmp_path / "tier"))
+    monkeypatch.setattr(hot_tier, "_refresher", object())
+    monkeypatch.setattr(hot_tier, "_tier", None)
+    assert hot_tier.get_hot_tier() is None
+
+    hot_tier.refresh_hot_tier()
+    loaded = hot_tier.get_hot_tier()
+    upsert(client, [3])
+    scrolls = []
+    monkeypatch.setattr(client, "scroll", lambda *args, **kwargs: scrolls.append(1) or QdrantClient.scroll(client, *args, **kwargs))
+
+    assert hot_tier.get_hot_tier() is loaded and loaded.size == 2
+    assert scrolls == []
+
+    hot_tier.refresh_hot_tier()
+    assert hot_tier.get_hot_tier().size == 3
@@ -0,0 +1,88 @@
+import hashlib
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+from qdrant_client import QdrantClient, models
+
+import my_agent.utils.memory_migration as migration
+from my_agent.utils.draft_reuse import DRAFT_COLLECTION, create_draft_collection
+from my_agent.utils.memory_schema import MEMORY_COLLECTION, collection_embedding_identity, create_memory_collection, record_embedding_identity
+
+
+class FakeModelEmbeddings(Embeddings):
+    """Same dimension for every model name, different vectors per model."""
+
+    def __init__(self, model, size=8):
+        self.model = model
+        self.size = size
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        seed = int(hashlib.sha1(f"{self.model}:{text}".encode()).hexdigest()[:8], 16)
+        vector = np.random.default_rng(seed).normal(size=self.size)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+
+class NoEmbedding(FakeModelEmbeddings):
+    def embed_documents(self, texts):
+        raise AssertionError("vectors should have been copied, not re-embedded")
+
+
+def make_client(embeddings, record_identity=True):
+    client = QdrantClient(":memory:")
+    create_memory_collection(client, MEMORY_COLLECTION, vector_size=embeddings.size)
+    client.upsert(MEMORY_COLLECTION, [
+        models.PointStruct(id=i, vector=embeddings.embed_query(f"memory {i}"), payload={"page_content": f"memory {i}", "metadata": {}})
+        for i in range(3)
+    ])
+    create_draft_collection(client, embeddings.size)
+    client.upsert(DRAFT_COLLECTION, [models.PointStruct(
+        id=1, vector=embeddings.embed_query("claim denied"), payload={"email_content": "claim denied", "email_type": "claim_denial", "draft": "Dear"}
+    )])
+    if record_identity:
+        record_embedding_identity(client, "openai:fake-embedding-a", MEMORY_COLLECTION)
+        record_embedding_identity(client, "openai:fake-embedding-a", DRAFT_COLLECTION)
+    return client
+
+
+def vector(client, collection, point_id):
+    stored = client.retrieve(collection, [point_id], with_vectors=True)[0].vector
+    return stored[""] if isinstance(stored, dict) else stored
+
+
+def migrate(client, monkeypatch, embeddings):
+    monkeypatch.setattr(migration, "get_embeddings", lambda backend=None: embeddings)
+    return migration.reembed_collection(client)
+
+
+def test_same_dimension_but_different_model_is_reembedded_including_drafts(monkeypatch):
+    client = make_client(FakeModelEmbeddings("fake-embedding-a"))
+    new_model = FakeModelEmbeddings("fake-embedding-b")
+
+    report = migrate(client, monkeypatch, new_model)
+
+    assert report["previous_embedding"] == "openai:fake-embedding-a" and report["embedding"] == "openai:fake-embedding-b"
+    assert report["drafts"]["points"] == 1
+    assert np.allclose(vector(client, MEMORY_COLLECTION, 2), new_model.embed_query("memory 2"), atol=1e-5)
+    assert np.allclose(vector(client, DRAFT_COLLECTION, 1), new_model.embed_query("claim denied"), atol=1e-5)
+    assert collection_embedding_identity(client, DRAFT_COLLECTION) == "openai:fake-embedding-b"
+
+
+def test_unchanged_model_copies_vectors(monkeypatch):
+    client = make_client(FakeModelEmbeddings("fake-embedding-a"))
+    before = vector(client, MEMORY_COLLECTION, 1)
+
+    report = migrate(client, monkeypatch, NoEmbedding("fake-embedding-a"))
+
+    assert report["points"] == 3 and report["drafts"]["points"] == 1
+    assert np.allclose(vector(client, MEMORY_COLLECTION, 1), before, atol=1e-5)
+
+
+def test_collection_without_a_recorded_model_is_reembedded(monkeypatch):
+    client = make_client(FakeModelEmbeddings("fake-embedding-a"), record_identity=False)
+
+    with pytest.raises(AssertionError, match="re-embedded"):
+        migrate(client, monkeypatch, NoEmbedding("fake-embedding-a"))
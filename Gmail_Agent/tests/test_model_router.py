@@ -0,0 +1,43 @@
+import pytest
+
+import my_agent.utils.model_router as model_router
+from my_agent.utils.deadline import start_deadline
+
+
+@pytest.fixture(autouse=True)
+def no_routing_log(monkeypatch):
+    monkeypatch.setattr(model_router, "ROUTING_LOG_PATH", "")
+    monkeypatch.setattr(model_router, "MODEL_ROUTING_ENABLED", True)
+
+
+def short_deadline_state():
+    state = {"new_email": {"id": "1", "payload": {"headers": [{"name": "Subject", "value": "Claim"}], "body": {}}}}
+    return start_deadline(state, 4.0)
+
+
+def test_deadline_does_not_trim_the_draft():
+    state = short_deadline_state()
+
+    decision = model_router.route_model(state, "generate")
+
+    assert decision["max_tokens"] == model_router.PURPOSE_PROFILES["generate"]["max_tokens"][decision["tier"]]
+    assert state["debug"]["model_routes"]["generate"]["reason"] == "within budget"
+
+
+def test_deadline_still_trims_other_calls():
+    decision = model_router.route_model(short_deadline_state(), "web_search")
+
+    assert decision["max_tokens"] < model_router.PURPOSE_PROFILES["web_search"]["max_tokens"]["fast"]
+
+
+def test_from_header_is_not_a_quoted_reply():
+    assert model_router.complexity_features("From: a@b\nSubject: Hi\n\nshort")["thread_depth"] == 0
+
+
+def test_quoted_replies_count_towards_thread_depth():
+    text = "From: a@b\nSubject: Re: Hi\n\nThanks\n\nOn Mon, Jan 6 Bob wrote:\n> earlier\n> > first\n> reply"
+    assert model_router.complexity_features(text)["thread_depth"] == 3
+
+
+def test_tiers_use_different_models():
+    assert len({model_router.MODEL_TIERS[tier]["model"] for tier in model_router.TIER_ORDER}) == len(model_router.TIER_ORDER)
@@ -0,0 +1,73 @@
+import pytest
+
+import my_agent.utils.outbox as outbox
+import my_agent.utils.tools as tools
+
+
+@pytest.fixture
+def sender(monkeypatch):
+    sent = []
+    monkeypatch.setattr(outbox, "_service", object())
+    monkeypatch.setattr(outbox._rate_limiter, "interval", 0.0)
+    monkeypatch.setattr(tools, "send_email", lambda **kwargs: sent.append(kwargs) or {"id": "new-id", "threadId": "t"})
+    return sent
+
+
+def payload():
+    return {
+        "idempotency_key": "abc",
+        "outgoing_message_id": "<abc@insurance-agent.local>",
+        "to": "member@example.com",
+        "subject": "Re: claim",
+        "message_text": "Hello",
+    }
+
+
+def test_first_attempt_does_not_resend_a_reply_already_in_sent(monkeypatch, sender):
+    # A crash after send() but before the job was marked done leaves attempts == 1.
+    monkeypatch.setattr(tools, "find_sent_message", lambda service, message_id: "sent-id")
+
+    result = outbox._send_reply(payload())
+
+    assert result == {"gmail_message_id": "sent-id", "deduplicated": True}
+    assert sender == []
+
+
+def test_reply_not_in_sent_is_sent_with_its_message_id(monkeypatch, sender):
+    monkeypatch.setattr(tools, "find_sent_message", lambda service, message_id: None)
+
+    result = outbox._send_reply(payload())
+
+    assert result["gmail_message_id"] == "new-id"
+    assert sender[0]["outgoing_message_id"] == "<abc@insurance-agent.local>"
+
+
+@pytest.fixture
+def indexed(monkeypatch):
+    import my_agent.utils.draft_reuse as draft_reuse
+    stored = []
+    monkeypatch.setattr(draft_reuse, "store_approved_draft", lambda *args, **kwargs: stored.append((args, kwargs)))
+    return stored
+
+
+def test_approved_draft_is_indexed_only_after_the_send_succeeds(monkeypatch, sender, indexed):
+    monkeypatch.setattr(tools, "find_sent_message", lambda service, message_id: None)
+    monkeypatch.setattr(tools, "send_email", lambda **kwargs: (_ for _ in ()).throw(RuntimeError("gmail down")))
+    job = {**payload(), "source": "send_email_response", "approved_draft": {"email_content": "Subject: claim", "email_id": "m1", "sender": "member@example.com"}}
+
+    with pytest.raises(RuntimeError):
+        outbox._send_reply(job)
+    assert indexed == []
+
+    monkeypatch.setattr(tools, "send_email", lambda **kwargs: {"id": "new-id", "threadId": "t"})
+    outbox._send_reply(job)
+
+    assert indexed == [(("Subject: claim", "Hello", "send_email_response"), {"email_id": "m1", "sender": "member@example.com", "thread_id": None})]
+
+
+def test_reply_without_an_approved_draft_is_not_indexed(monkeypatch, sender, indexed):
+    monkeypatch.setattr(tools, "find_sent_message", lambda service, message_id: None)
+
+    outbox._send_reply({**payload(), "approved_draft": None})
+
+    assert indexed == []
@@ -0,0 +1,45 @@
+import threading
+
+from my_agent.utils.retrieval_batcher import RetrievalBatcher
+
+
+def search_concurrently(batcher, requests):
+    results = [None] * len(requests)
+
+    def worker(i, queries, limit):
+        try:
+            results[i] = batcher.search(queries, limit)
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=worker, args=(i, queries, limit)) for i, (queries, limit) in enumerate(requests)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return results
+
+
+def test_concurrent_searches_share_one_call_and_get_their_own_slice():
+    calls = []
+
+    def search_fn(queries, limit, filters):
+        calls.append((list(queries), limit))
+        return [[f"{query}-{n}" for n in range(limit)] for query in queries]
+
+    batcher = RetrievalBatcher(search_fn, window_ms=200)
+    results = search_concurrently(batcher, [(["a", "b"], 1), (["c"], 3)])
+
+    assert len(calls) == 1 and calls[0][1] == 3
+    assert results == [[["a-0"], ["b-0"]], [["c-0", "c-1", "c-2"]]]
+
+
+def test_batch_error_is_raised_in_every_caller():
+    def search_fn(queries, limit, filters):
+        raise RuntimeError("qdrant down")
+
+    batcher = RetrievalBatcher(search_fn, window_ms=200)
+    results = search_concurrently(batcher, [(["a"], 1), (["b"], 1)])
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert batcher.stats()["batches"] == 1
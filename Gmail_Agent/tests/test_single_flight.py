@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from my_agent.utils.single_flight import SingleFlight, email_request_key
+
+
+def test_concurrent_callers_share_one_run_and_the_result_is_cached():
+    calls = []
+
+    async def factory():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"draft": "hi"}
+
+    async def scenario():
+        flight = SingleFlight(ttl_seconds=30)
+        results = await asyncio.gather(*(flight.run("k", factory) for _ in range(5)))
+        cached = await flight.run("k", factory)
+        return flight, results, cached
+
+    flight, results, cached = asyncio.run(scenario())
+
+    assert len(calls) == 1
+    assert results == [{"draft": "hi"}] * 5 and cached == {"draft": "hi"}
+    assert (flight.leaders, flight.coalesced, flight.cached_hits) == (1, 4, 1)
+
+
+def test_failure_reaches_every_waiter_and_is_not_cached():
+    attempts = []
+
+    async def factory():
+        attempts.append(1)
+        await asyncio.sleep(0.01)
+        if len(attempts) == 1:
+            raise RuntimeError("pipeline failed")
+        return "ok"
+
+    async def scenario():
+        flight = SingleFlight(ttl_seconds=30)
+        first = await asyncio.gather(flight.run("k", factory), flight.run("k", factory), return_exceptions=True)
+        retried = await flight.run("k", factory)
+        return flight, first, retried
+
+    flight, first, retried = asyncio.run(scenario())
+
+    assert [type(result) for result in first] == [RuntimeError, RuntimeError]
+    assert retried == "ok" and len(attempts) == 2
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_run():
+    async def factory():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def scenario():
+        flight = SingleFlight(ttl_seconds=0)
+        leaver = asyncio.ensure_future(flight.run("k", factory))
+        stayer = asyncio.ensure_future(flight.run("k", factory))
+        await asyncio.sleep(0.01)
+        leaver.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leaver
+        return await stayer, flight.stats()
+
+    result, stats = asyncio.run(scenario())
+
+    assert result == "done"
+    assert stats["cached_results"] == 0
+
+
+def test_request_key_changes_with_the_email_content():
+    email = {"id": "m1", "body": "claim denied"}
+
+    assert email_request_key(email) == email_request_key(dict(email))
+    assert email_request_key(email) != email_request_key({**email, "body": "claim approved"})
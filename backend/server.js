@@ -369,6 +369,42 @@ app.post('/api/agent/generate-response', async (req, res) => {
   }
 });
 
+app.post('/api/agent/generate-response/stream', async (req, res) => {
+  const { email } = req.body;
+
+  if (!email) {
+    return res.status(400).json({
+      error: 'Email data is required'
+    });
+  }
+
+  console.log(`Streaming from Python Gmail Agent at ${GMAIL_AGENT_API_URL}/generate-response/stream`);
+  try {
+    const agentResponse = await axios.post(`${GMAIL_AGENT_API_URL}/generate-response/stream`, {
+      email: {
+        subject: email.subject,
+        body: email.body,
+        sender: email.sender,
+        id: email.id,
+        threadId: email.threadId
+      }
+    }, { responseType: 'stream' });
+
+    res.setHeader('Content-Type', 'text/event-stream');
+    res.setHeader('Cache-Control', 'no-cache');
+    res.setHeader('Connection', 'keep-alive');
+    res.flushHeaders();
+    agentResponse.data.pipe(res);
+    req.on('close', () => agentResponse.data.destroy());
+  } catch (err) {
+    console.error('Error streaming from Gmail Agent:', err.message);
+    return res.status(502).json({
+      error: 'Failed to stream response from Gmail Agent',
+      details: err.message
+    });
+  }
+});
+
 app.post('/api/emails/draft-response', async (req, res) => {
   try {
     const { email_id, user_id } = req.body;